@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 class Settings(BaseSettings):
     supabase_url: str
@@ -11,6 +11,33 @@ class Settings(BaseSettings):
     together_api_key: str
     flutterwave_secret_key:str
     flw_secret_hash: str
+    mixtral_tokenizer_path: Optional[str] = None  # Local tokenizer.json for Mixtral
+    llm_context_tokens: int = 32768
+    llm_requests_per_minute: int = 600
+    llm_tokens_per_minute: int = 180000
+    fast_path_plans: str = "free"  # Comma-separated plans served by the rule-based insight generator
+    fast_path_max_rows: int = 200  # Sheets up to this many rows get rule-based insights on /full-analyze
+    job_db_path: str = "jobs.db"  # SQLite file backing the background job queue
+    job_workers: int = 2
+    otel_exporter: Optional[str] = None  # "console" or "file"; needs opentelemetry-sdk
+    otel_file_path: str = "spans.log"
+    metrics_token: Optional[str] = None  # When set, /metrics requires "Authorization: Bearer <token>"
+    profiler_sample_rate: float = 0.0  # Fraction of requests to profile
+    profiler_allow_header: bool = False  # Also profile requests sending "X-Profile: 1"
+    profiler_paths: str = "/full-analyze,/ai-analyze,/export/pdf"  # Comma-separated path prefixes; empty for all
+    profiler_min_duration_ms: float = 0.0  # Only keep profiles of requests at least this slow
+    profiler_interval_ms: float = 5.0
+    profiler_dir: str = "profiles"
+    analysis_cache_max_mb: int = 256  # Decoded analyses kept in memory for /chat, by JSON size
+    answer_cache_max_files: int = 1000  # Files whose chat answers are kept in memory
+    answer_cache_entries_per_file: int = 200
+    answer_cache_similarity: float = 0.0  # Cosine threshold (e.g. 0.9) for serving a near-identical question's answer; 0 for exact matches only
+    chat_context_tokens: int = 3000  # Prompt budget for the insights context and retrieved rows in /chat
+    chat_retrieval_rows: int = 20  # Most relevant sheet rows offered to a chat prompt
+    chat_history_tokens: int = 800  # Latest chat turns quoted verbatim in a prompt
+    chat_summary_tokens: int = 300  # Rolling summary of the turns before those
+    conversation_memory_max: int = 10000  # Conversations whose summary is kept in memory
+    chat_batch_max_questions: int = 10  # Questions accepted by one /chat/batch request
 
     @property
     def allowed_origins_list(self) -> List[str]:
@@ -6,9 +6,19 @@ from fastapi.responses import Response, StreamingResponse, JSONResponse
 from pydantic import BaseModel
 from app.config.settings import settings
 from app.utils.logger import logger
+from app.utils.timing import span, timed
+from app.utils.metrics import metrics, http_request_duration, http_requests_in_flight
+from app.utils.profiler import SamplingProfiler, profile_finish
+from app.services.llm_gateway_service import llm_gateway
 from app.services.supabase_service import SupabaseService
 from app.services.parser_service import ParserService
 from app.services.langgraph_service import LangGraphService
+from app.services.rule_based_insights_service import rule_based_insights_service
+from app.services.job_queue_service import job_queue_service
+from app.services.analysis_cache_service import analysis_cache_service
+from app.services.answer_cache_service import answer_cache_service
+from app.services.retrieval_index_service import retrieval_index_service
+from app.services.conversation_memory_service import conversation_memory_service
 from app.utils.auth import get_current_user
 from app.dependencies import get_supabase_client
 from app.services.hr_chat_service import HRChatService
@@ -28,6 +38,10 @@ import hmac
 import hashlib
 import io
 import json
+import asyncio
+import time
+import random
+import uuid
 
 app = FastAPI(title="AI Analyst Backend", version="1.0.0")
 
@@ -42,6 +56,75 @@ app.add_middleware(
 
 langgraph_service = LangGraphService()
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # Streaming responses are measured until the response starts, not until the stream ends
+    started = time.perf_counter()
+    http_requests_in_flight.inc(method=request.method)
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        http_requests_in_flight.dec(method=request.method)
+        route = request.scope.get("route")
+        # Route templates keep label cardinality bounded; unmatched paths share one label
+        http_request_duration.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status
+        )
+
+PROFILER_PATHS = tuple(p.strip() for p in settings.profiler_paths.split(",") if p.strip())
+
+def _should_profile(request: Request) -> bool:
+    if PROFILER_PATHS and not request.url.path.startswith(PROFILER_PATHS):
+        return False
+    if settings.profiler_allow_header and request.headers.get("X-Profile") == "1":
+        return True
+    return settings.profiler_sample_rate > 0 and random.random() < settings.profiler_sample_rate
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """Sample the stacks of selected requests and save slow ones as folded flamegraph input"""
+    if not _should_profile(request):
+        return await call_next(request)
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    profiler = SamplingProfiler(interval=settings.profiler_interval_ms / 1000).start()
+    try:
+        response = await call_next(request)
+    finally:
+        profile_finish(
+            profiler,
+            settings.profiler_dir,
+            request_id,
+            f"{request.method}_{request.url.path}",
+            settings.profiler_min_duration_ms / 1000
+        )
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+def _queue_depths() -> Dict[tuple, float]:
+    depths = {("jobs",): job_queue_service.queue_depth()}
+    for priority, queued in llm_gateway.queued_counts().items():
+        depths[(f"llm_{priority}",)] = queued
+    return depths
+
+metrics.gauge("executor_queue_depth", "Work waiting in the background job queue and the LLM rate limiter", ("queue",), callback=_queue_depths)
+
+# Strong references to fire-and-forget tasks so they are not garbage collected mid-run
+_background_tasks = set()
+
+@app.on_event("startup")
+async def start_job_queue():
+    await job_queue_service.start()
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue_service.stop()
+
 def get_supabase_service(supabase_client: Client = Depends(get_supabase_client)) -> SupabaseService:
     return SupabaseService(supabase_client)
 
@@ -49,6 +132,10 @@ class ChatRequest(BaseModel):
     file_id: str
     question: str
 
+class ChatBatchRequest(BaseModel):
+    file_id: str
+    questions: List[str]
+
 class AnalyzeRequest(BaseModel):
     spreadsheet_type: str
 
@@ -177,6 +264,7 @@ async def get_file(
         raise HTTPException(status_code=500, detail=str(e))
     
 @app.post("/full-analyze/{file_id}")
+@timed("full_analyze")
 async def full_analyze_file(
     file_id: str,
     request: AnalyzeRequest,
@@ -185,7 +273,8 @@ async def full_analyze_file(
 ):
     try:
         # Get file metadata
-        file = await supabase_service.get_file_by_id(file_id, user_id)
+        with span("full_analyze.load_file"):
+            file = await supabase_service.get_file_by_id(file_id, user_id)
         if file["status"] in ["processing", "fully_analyzed"]:
             raise HTTPException(status_code=400, detail=f"File is already {file['status']}")
 
@@ -231,11 +320,16 @@ async def full_analyze_file(
             raise HTTPException(status_code=400, detail="Invalid or empty JSON data")
 
         ai_insights = None
-        if plan in ['plus', 'pro']:
+        credits_deducted = 0
+        if rule_based_insights_service.should_use(plan, _count_rows(json_data)):
+            # Free plans and small sheets get deterministic insights; no LLM calls, no credits
+            with span("full_analyze.rule_based_insights"):
+                ai_insights = rule_based_insights_service.generate_insights(computed_insights, file["spreadsheet_type"])
+        elif plan in ['plus', 'pro']:
             if credits_left < credits_to_deduct:
                 raise HTTPException(status_code=402, detail=f"Insufficient credits: need {credits_to_deduct}, have {credits_left}")
 
-            ai_insights = await langgraph_service.generate_insights(json_data, description)
+            ai_insights = await langgraph_service.generate_insights(json_data, description, spreadsheet_type=file["spreadsheet_type"], computed_insights=computed_insights)
 
             # Deduct credits atomically from credits_left
             new_credits_left = credits_left - credits_to_deduct
@@ -244,12 +338,21 @@ async def full_analyze_file(
             }).eq('user_id', user_id).execute()
             if not update_response.data:
                 raise HTTPException(status_code=500, detail="Failed to update subscription credits")
+            credits_deducted = credits_to_deduct
             logger.info("Credits deducted", user_id=user_id, file_id=file_id, deducted=credits_to_deduct, remaining=new_credits_left)
 
+        # Row index and rendered insights context for chat, stored with the analysis so chat never rebuilds them
+        with span("full_analyze.build_retrieval_index", sheets=len(json_data)):
+            retrieval_index = retrieval_index_service.build(json_data)
+        chat_context = _render_chat_context(file["spreadsheet_type"], json_data, computed_insights, ai_insights)
+
         # Save analysis results
-        analysis_result = await supabase_service.save_analysis_result(
-            file_id, user_id, json_data, description, computed_insights, ai_insights
-        )
+        with span("full_analyze.save_analysis_result", sheets=len(json_data)):
+            analysis_result = await supabase_service.save_analysis_result(
+                file_id, user_id, json_data, description, computed_insights, ai_insights, retrieval_index, chat_context
+            )
+        analysis_cache_service.invalidate(file_id)
+        answer_cache_service.invalidate(file_id)
 
         # Update file status to fully_analyzed
         await supabase_service.update_file_status(file_id, user_id, "fully_analyzed")
@@ -261,7 +364,7 @@ async def full_analyze_file(
             spreadsheet_type=request.spreadsheet_type,
             sheets=list(json_data.keys()),
             ai_enabled=bool(ai_insights),
-            credits_deducted=credits_to_deduct if ai_insights else 0
+            credits_deducted=credits_deducted
         )
         return {
             "file_id": file_id,
@@ -283,7 +386,132 @@ async def full_analyze_file(
         )
         raise HTTPException(status_code=500, detail=str(e))
 
+def _count_rows(json_data: Any) -> int:
+    if isinstance(json_data, list):
+        return len(json_data)
+    if isinstance(json_data, dict):
+        return sum(len(rows) for rows in json_data.values() if isinstance(rows, list))
+    return 0
+
+async def _load_ai_analysis_inputs(
+    file_id: str,
+    request: AnalyzeRequest,
+    user_id: str,
+    supabase_service: SupabaseService
+) -> Dict[str, Any]:
+    """Validate subscription, file and credits for AI analysis and load the stored analysis rows"""
+    subscription = await supabase_service.get_subscription_by_user_id(user_id)
+    if not subscription or subscription["status"] != "active" or subscription["plan"] == "free":
+        raise HTTPException(status_code=403, detail="Active subscriptions required to analyze with AI.")
+    
+    # Get file metadata
+    file = await supabase_service.get_file_by_id(file_id, user_id)
+    if file["status"] != "fully_analyzed":
+        raise HTTPException(status_code=400, detail="File must be fully analyzed with manual analysis first")
+
+    # Validate spreadsheet_type
+    if file["spreadsheet_type"] != request.spreadsheet_type:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Spreadsheet type mismatch: expected {file['spreadsheet_type']}, got {request.spreadsheet_type}"
+        )
+
+    # Get file size (in bytes) and calculate credits to deduct
+    file_size = file.get("file_size", 0)
+    if file_size <= 0:
+        raise HTTPException(status_code=400, detail="Invalid file size")
+
+    # Credit deduction: same as /full-analyze/{file_id}
+    if file_size < 1024 * 1024:  # < 1 MB
+        credits_to_deduct = max(100, int(file_size / 1024))
+    else:  # >= 1 MB
+        credits_to_deduct = max(1000, int(file_size / 1024 / 2))
+    logger.info("Calculated credits to deduct", file_id=file_id, file_size=file_size, credits=credits_to_deduct)
+
+    # Fetch user subscription
+    subscription_response = supabase_service.client.table('subscriptions').select('*').eq('user_id', user_id).single().execute()
+    if not subscription_response.data:
+        raise HTTPException(status_code=403, detail="No subscription found")
+    subscription = subscription_response.data
+    plan = subscription['plan']
+    credits_left = subscription['credits_left']
+
+    # Check if user is paid
+    if plan not in ['plus', 'pro']:
+        raise HTTPException(status_code=403, detail="AI analysis requires a Plus or Pro subscription")
+
+    # Retrieve existing analysis results
+    analysis_response = supabase_service.client.table('analysis_results').select('*').eq('file_id', file_id).eq('user_id', user_id).single().execute()
+    if not analysis_response.data:
+        raise HTTPException(status_code=404, detail="No analysis results found for this file")
+
+    json_data = analysis_response.data['json_data']
+
+    # Validate json_data
+    if not isinstance(json_data, (dict, list)) or not json_data:
+        raise HTTPException(status_code=400, detail="Invalid or empty JSON data")
+
+    # Only plans configured for the rule-based generator skip the LLM here; the row-count rule is
+    # for /full-analyze, as a paid /ai-analyze request always asks for the LLM
+    use_fast_path = rule_based_insights_service.should_use(plan)
+    if use_fast_path:
+        credits_to_deduct = 0
+
+    # Check credits
+    if credits_left < credits_to_deduct:
+        raise HTTPException(status_code=402, detail=f"Insufficient credits: need {credits_to_deduct}, have {credits_left}")
+
+    return {
+        "file": file,
+        "analysis_id": analysis_response.data['id'],
+        "json_data": json_data,
+        "description": analysis_response.data['description'],
+        "computed_insights": analysis_response.data['computed_insights'],
+        # A re-run keeps the last complete insights until it completes itself
+        "has_complete_insights": _is_complete_insights(analysis_response.data.get('ai_insights')),
+        "use_fast_path": use_fast_path,
+        "credits_left": credits_left,
+        "credits_to_deduct": credits_to_deduct
+    }
+
+def _is_complete_insights(ai_insights: Any) -> bool:
+    return isinstance(ai_insights, dict) and bool(ai_insights) and "_status" not in ai_insights
+
+def _save_partial_ai_insights(supabase_service: SupabaseService, file_id: str, user_id: str, partial: Dict[str, Any], inputs: Dict[str, Any]) -> None:
+    """Stages of an unfinished run, stored only where no complete insights exist; chat context and caches are left alone"""
+    if inputs.get("has_complete_insights"):
+        return
+    supabase_service.client.table('analysis_results').update({
+        'ai_insights': partial
+    }).eq('file_id', file_id).eq('user_id', user_id).execute()
+
+def _save_ai_insights(supabase_service: SupabaseService, file_id: str, user_id: str, ai_insights: Dict[str, Any], inputs: Dict[str, Any]) -> None:
+    # The chat context quotes the AI trends, so it is re-rendered with them
+    chat_context = _render_chat_context(inputs["file"]["spreadsheet_type"], inputs["json_data"], inputs["computed_insights"], ai_insights)
+    update_analysis_response = supabase_service.client.table('analysis_results').update({
+        'ai_insights': ai_insights,
+        'chat_context': chat_context,
+        'updated_at': datetime.now(timezone.utc).isoformat()
+    }).eq('file_id', file_id).eq('user_id', user_id).execute()
+    analysis_cache_service.invalidate(file_id)
+    answer_cache_service.invalidate(file_id)
+    if not update_analysis_response.data:
+        raise HTTPException(status_code=500, detail="Failed to update AI analysis results")
+
+def _deduct_ai_credits(supabase_service: SupabaseService, file_id: str, user_id: str, inputs: Dict[str, Any]) -> None:
+    if inputs["credits_to_deduct"] <= 0:
+        return
+    # Deduct credits atomically
+    new_credits_left = inputs["credits_left"] - inputs["credits_to_deduct"]
+    update_response = supabase_service.client.table('subscriptions').update({
+        'credits_left': new_credits_left
+    }).eq('user_id', user_id).execute()
+    if not update_response.data:
+        raise HTTPException(status_code=500, detail="Failed to update subscription credits")
+    logger.info("Credits deducted", user_id=user_id, file_id=file_id, deducted=inputs["credits_to_deduct"], remaining=new_credits_left)
+
 @app.post("/ai-analyze/{file_id}")
+@timed("ai_analyze")
 async def ai_analyze_file(
     file_id: str,
     request: AnalyzeRequest,
@@ -291,81 +519,19 @@ async def ai_analyze_file(
     supabase_service: SupabaseService = Depends(get_supabase_service)
 ):
     try:
-        subscription = await supabase_service.get_subscription_by_user_id(user_id)
-        if not subscription or subscription["status"] != "active" or subscription["plan"] == "free":
-            raise HTTPException(status_code=403, detail="Active subscriptions required to analyze with AI.")
-        
-        # Get file metadata
-        file = await supabase_service.get_file_by_id(file_id, user_id)
-        if file["status"] != "fully_analyzed":
-            raise HTTPException(status_code=400, detail="File must be fully analyzed with manual analysis first")
-
-        # Validate spreadsheet_type
-        if file["spreadsheet_type"] != request.spreadsheet_type:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Spreadsheet type mismatch: expected {file['spreadsheet_type']}, got {request.spreadsheet_type}"
-            )
-
-        # Get file size (in bytes) and calculate credits to deduct
-        file_size = file.get("file_size", 0)
-        if file_size <= 0:
-            raise HTTPException(status_code=400, detail="Invalid file size")
-
-        # Credit deduction: same as /full-analyze/{file_id}
-        if file_size < 1024 * 1024:  # < 1 MB
-            credits_to_deduct = max(100, int(file_size / 1024))
-        else:  # >= 1 MB
-            credits_to_deduct = max(1000, int(file_size / 1024 / 2))
-        logger.info("Calculated credits to deduct", file_id=file_id, file_size=file_size, credits=credits_to_deduct)
-
-        # Fetch user subscription
-        subscription_response = supabase_service.client.table('subscriptions').select('*').eq('user_id', user_id).single().execute()
-        if not subscription_response.data:
-            raise HTTPException(status_code=403, detail="No subscription found")
-        subscription = subscription_response.data
-        plan = subscription['plan']
-        credits_left = subscription['credits_left']
-
-        # Check if user is paid
-        if plan not in ['plus', 'pro']:
-            raise HTTPException(status_code=403, detail="AI analysis requires a Plus or Pro subscription")
-
-        # Check credits
-        if credits_left < credits_to_deduct:
-            raise HTTPException(status_code=402, detail=f"Insufficient credits: need {credits_to_deduct}, have {credits_left}")
-
-        # Retrieve existing analysis results
-        analysis_response = supabase_service.client.table('analysis_results').select('*').eq('file_id', file_id).eq('user_id', user_id).single().execute()
-        if not analysis_response.data:
-            raise HTTPException(status_code=404, detail="No analysis results found for this file")
-
-        json_data = analysis_response.data['json_data']
-        description = analysis_response.data['description']
-        computed_insights = analysis_response.data['computed_insights']
-
-        # Validate json_data
-        if not isinstance(json_data, (dict, list)) or not json_data:
-            raise HTTPException(status_code=400, detail="Invalid or empty JSON data")
+        inputs = await _load_ai_analysis_inputs(file_id, request, user_id, supabase_service)
+        json_data = inputs["json_data"]
 
         # Run AI analysis
-        ai_insights = await langgraph_service.generate_insights(json_data, description)
+        if inputs["use_fast_path"]:
+            ai_insights = rule_based_insights_service.generate_insights(inputs["computed_insights"], inputs["file"]["spreadsheet_type"])
+        else:
+            ai_insights = await langgraph_service.generate_insights(json_data, inputs["description"], spreadsheet_type=inputs["file"]["spreadsheet_type"], computed_insights=inputs["computed_insights"])
 
-        # Deduct credits atomically
-        new_credits_left = credits_left - credits_to_deduct
-        update_response = supabase_service.client.table('subscriptions').update({
-            'credits_left': new_credits_left
-        }).eq('user_id', user_id).execute()
-        if not update_response.data:
-            raise HTTPException(status_code=500, detail="Failed to update subscription credits")
-        logger.info("Credits deducted", user_id=user_id, file_id=file_id, deducted=credits_to_deduct, remaining=new_credits_left)
+        _deduct_ai_credits(supabase_service, file_id, user_id, inputs)
 
         # Update analysis results with AI insights
-        update_analysis_response = supabase_service.client.table('analysis_results').update({
-            'ai_insights': ai_insights
-        }).eq('file_id', file_id).eq('user_id', user_id).execute()
-        if not update_analysis_response.data:
-            raise HTTPException(status_code=500, detail="Failed to update AI analysis results")
+        _save_ai_insights(supabase_service, file_id, user_id, ai_insights, inputs)
 
         logger.info(
             "AI analysis completed",
@@ -373,11 +539,11 @@ async def ai_analyze_file(
             user_id=user_id,
             spreadsheet_type=request.spreadsheet_type,
             sheets=list(json_data.keys()),
-            credits_deducted=credits_to_deduct
+            credits_deducted=inputs["credits_to_deduct"]
         )
         return {
             "file_id": file_id,
-            "analysis_id": analysis_response.data['id'],
+            "analysis_id": inputs["analysis_id"],
             "status": "fully_analyzed",
             "sheets": list(json_data.keys())
         }
@@ -400,6 +566,203 @@ async def ai_analyze_file(
         )
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _insight_events(inputs: Dict[str, Any]):
+    """Stage events from the LLM workflow, or from the rule-based generator on the fast path"""
+    spreadsheet_type = inputs["file"]["spreadsheet_type"]
+    if not inputs["use_fast_path"]:
+        async for event in langgraph_service.stream_insights(inputs["json_data"], inputs["description"], spreadsheet_type=spreadsheet_type, computed_insights=inputs["computed_insights"]):
+            yield event
+        return
+    insights = rule_based_insights_service.generate_insights(inputs["computed_insights"], spreadsheet_type)
+    yield {"stage": "classification", "data": {"spreadsheet_type": spreadsheet_type, "source": "provided"}}
+    for stage in ("trends", "anomalies", "predictions"):
+        yield {"stage": stage, "data": insights[stage]}
+    yield {"stage": "complete", "data": insights}
+
+def _sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def _run_ai_analysis(
+    inputs: Dict[str, Any],
+    file_id: str,
+    user_id: str,
+    supabase_service: SupabaseService,
+    on_event
+) -> Dict[str, Any]:
+    """
+    Generate insights stage by stage, persisting each stage as it completes. Credits are only
+    deducted once the run completes; a failed run keeps its finished stages marked as failed.
+    Stages are persisted only when the analysis has no complete insights yet, so a re-run
+    that fails leaves the previous result in place.
+    """
+    partial: Dict[str, Any] = {"_status": "in_progress", "_completed_stages": []}
+    try:
+        async for event in _insight_events(inputs):
+            stage, data = event["stage"], event["data"]
+            if stage == "complete":
+                _deduct_ai_credits(supabase_service, file_id, user_id, inputs)
+                _save_ai_insights(supabase_service, file_id, user_id, data, inputs)
+                logger.info("Staged AI analysis completed", file_id=file_id, user_id=user_id, credits_deducted=inputs["credits_to_deduct"])
+            elif stage != "classification":
+                # Classification carries no insight of its own, so there is nothing to store yet
+                partial[stage] = data
+                partial["_completed_stages"].append(stage)
+                _save_partial_ai_insights(supabase_service, file_id, user_id, partial, inputs)
+            await on_event(stage, data)
+        return {
+            "file_id": file_id,
+            "analysis_id": inputs["analysis_id"],
+            "status": "fully_analyzed",
+            "credits_deducted": inputs["credits_to_deduct"]
+        }
+    except Exception as e:
+        logger.error("Error in staged AI analysis", error=str(e), file_id=file_id, user_id=user_id)
+        if partial["_completed_stages"]:
+            # Keep whatever stages finished; no credits are deducted for an incomplete run
+            partial["_status"] = "failed"
+            try:
+                _save_partial_ai_insights(supabase_service, file_id, user_id, partial, inputs)
+            except Exception as save_error:
+                logger.error("Failed to persist partial AI insights", error=str(save_error), file_id=file_id)
+        raise
+
+@app.post("/ai-analyze/{file_id}/stream")
+async def ai_analyze_file_stream(
+    file_id: str,
+    request: AnalyzeRequest,
+    user_id: str = Depends(get_current_user),
+    supabase_service: SupabaseService = Depends(get_supabase_service)
+):
+    """
+    Server-Sent Events variant of /ai-analyze/{file_id}. Each stage (classification, trends,
+    anomalies, predictions) is sent and persisted as soon as it completes. Generation runs in a
+    background task, so a dropped connection does not cancel it: the finished insights and the
+    credit deduction still land, and can be fetched from /analysis/{file_id}.
+    """
+    # Validation errors are returned as regular HTTP errors before the stream opens
+    inputs = await _load_ai_analysis_inputs(file_id, request, user_id, supabase_service)
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def run_analysis():
+        async def forward(stage: str, data: Any) -> None:
+            await events.put((stage, data))
+        try:
+            await _run_ai_analysis(inputs, file_id, user_id, supabase_service, forward)
+        except Exception as e:
+            await events.put(("error", {"detail": str(getattr(e, "detail", None) or e)}))
+        finally:
+            await events.put(None)
+
+    task = asyncio.create_task(run_analysis())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+    async def event_stream():
+        yield _sse_event("started", {"file_id": file_id, "analysis_id": inputs["analysis_id"]})
+        while True:
+            item = await events.get()
+            if item is None:
+                break
+            stage, data = item
+            yield _sse_event(stage, data)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ---------- Background jobs ----------
+# Long analyses run on the in-process job queue; clients poll /jobs/{job_id} for progress.
+AI_STAGE_PROGRESS = {"classification": 0.2, "trends": 0.45, "anomalies": 0.7, "predictions": 0.9, "complete": 1.0}
+
+async def _job_supabase_service() -> SupabaseService:
+    return SupabaseService(await get_supabase_client())
+
+async def _full_analyze_job(job: Dict[str, Any], report) -> Dict[str, Any]:
+    payload, user_id = job["payload"], job["user_id"]
+    supabase_service = await _job_supabase_service()
+    if job["attempts"] > 1:
+        # Resuming after a crash: finish quietly if the previous attempt got through,
+        # otherwise release the file from "processing" so it can be analyzed again
+        file = await supabase_service.get_file_by_id(payload["file_id"], user_id)
+        if file["status"] == "fully_analyzed":
+            return {"file_id": payload["file_id"], "status": "fully_analyzed", "resumed": True}
+        if file["status"] == "processing":
+            await supabase_service.update_file_status(payload["file_id"], user_id, "uploaded")
+    report(0.1, "analyzing")
+    return await full_analyze_file(
+        payload["file_id"],
+        AnalyzeRequest(spreadsheet_type=payload["spreadsheet_type"]),
+        user_id=user_id,
+        supabase_service=supabase_service
+    )
+
+async def _ai_analyze_job(job: Dict[str, Any], report) -> Dict[str, Any]:
+    payload, user_id = job["payload"], job["user_id"]
+    supabase_service = await _job_supabase_service()
+    report(0.05, "loading")
+    inputs = await _load_ai_analysis_inputs(payload["file_id"], AnalyzeRequest(spreadsheet_type=payload["spreadsheet_type"]), user_id, supabase_service)
+
+    async def on_stage(stage: str, data: Any) -> None:
+        report(AI_STAGE_PROGRESS.get(stage, 0.0), stage)
+
+    return await _run_ai_analysis(inputs, payload["file_id"], user_id, supabase_service, on_stage)
+
+job_queue_service.register("full_analyze", _full_analyze_job)
+job_queue_service.register("ai_analyze", _ai_analyze_job)
+
+async def _submit_file_job(kind: str, file_id: str, request: AnalyzeRequest, user_id: str, supabase_service: SupabaseService) -> Dict[str, Any]:
+    # Cheap checks up front so obvious mistakes fail the request, not the job
+    file = await supabase_service.get_file_by_id(file_id, user_id)
+    if file["spreadsheet_type"] != request.spreadsheet_type:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Spreadsheet type mismatch: expected {file['spreadsheet_type']}, got {request.spreadsheet_type}"
+        )
+    job = job_queue_service.submit(kind, user_id, {"file_id": file_id, "spreadsheet_type": request.spreadsheet_type})
+    return {"job_id": job["id"], "status": job["status"], "file_id": file_id}
+
+@app.post("/jobs/full-analyze/{file_id}", status_code=202)
+async def submit_full_analyze_job(
+    file_id: str,
+    request: AnalyzeRequest,
+    user_id: str = Depends(get_current_user),
+    supabase_service: SupabaseService = Depends(get_supabase_service)
+):
+    """Queue /full-analyze/{file_id} and return a job id immediately"""
+    return await _submit_file_job("full_analyze", file_id, request, user_id, supabase_service)
+
+@app.post("/jobs/ai-analyze/{file_id}", status_code=202)
+async def submit_ai_analyze_job(
+    file_id: str,
+    request: AnalyzeRequest,
+    user_id: str = Depends(get_current_user),
+    supabase_service: SupabaseService = Depends(get_supabase_service)
+):
+    """Queue /ai-analyze/{file_id} and return a job id immediately"""
+    return await _submit_file_job("ai_analyze", file_id, request, user_id, supabase_service)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, user_id: str = Depends(get_current_user)):
+    job = job_queue_service.get(job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs")
+async def list_jobs(limit: int = 20, user_id: str = Depends(get_current_user)):
+    return job_queue_service.list(user_id, min(max(limit, 1), 100))
+
+@app.get("/metrics")
+async def get_metrics(request: Request):
+    """Prometheus text exposition of the in-process metrics"""
+    if settings.metrics_token:
+        expected = f"Bearer {settings.metrics_token}"
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), expected):
+            raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/analysis/{file_id}")
 async def get_analysis(
     file_id: str,
@@ -568,69 +931,180 @@ def get_subscription(
         raise HTTPException(status_code=500, detail=f"Failed to retrieve subscription: {str(e)}")
 
 
+def _chat_sheet(json_data: Any) -> Optional[str]:
+    """
+    json_data and computed_insights are keyed by sheet name while the chat services work on one
+    sheet: the one with the most rows. None when json_data is not split into sheets.
+    """
+    if isinstance(json_data, dict) and json_data and all(isinstance(rows, list) for rows in json_data.values()):
+        return max(json_data, key=lambda name: len(json_data[name]))
+    return None
+
+def _chat_insights(computed_insights: Optional[Dict[str, Any]], sheet: Optional[str]) -> Dict[str, Any]:
+    computed_insights = computed_insights or {}
+    return (computed_insights.get(sheet) or {}) if sheet is not None else computed_insights
+
+def _render_chat_context(spreadsheet_type: str, json_data: Any, computed_insights: Optional[Dict[str, Any]], ai_insights: Optional[Dict[str, Any]]) -> Optional[Dict[str, str]]:
+    """Insights context of the chat sheet as the chat service for spreadsheet_type renders it, for saving with the analysis"""
+    chat_service = CHAT_SERVICES.get((spreadsheet_type or "").lower())
+    if chat_service is None:
+        return None
+    try:
+        with span("chat_context.render", spreadsheet_type=spreadsheet_type):
+            return chat_service.render_context(_chat_insights(computed_insights, _chat_sheet(json_data)), ai_insights or {})
+    except Exception as e:
+        # Never fails the analysis; chat renders the context itself on first use
+        logger.error("Failed to render chat context", error=str(e), spreadsheet_type=spreadsheet_type)
+        return None
+
+def _decode_chat_analysis(analysis: Dict[str, Any], file_id: str) -> Dict[str, Any]:
+    """Chat view of an analysis row: the chat sheet's rows, insights, stored context and row index"""
+    raw_data = analysis.get("json_data")
+    if isinstance(raw_data, str):
+        raw_data = json.loads(raw_data)
+    retrieval_index = analysis.get("retrieval_index") or {}
+
+    sheet = _chat_sheet(raw_data)
+    insights = _chat_insights(analysis.get("computed_insights"), sheet)
+    if sheet is not None:
+        raw_data = raw_data[sheet]
+    elif isinstance(raw_data, dict):
+        raw_data = [raw_data]
+
+    if not isinstance(raw_data, list) or not all(isinstance(item, dict) for item in raw_data):
+        logger.error("Invalid raw_data format: expected list of dictionaries", file_id=file_id)
+        raise HTTPException(status_code=400, detail="Invalid raw_data format: expected list of dictionaries")
+
+    return {
+        "analysis": {
+            "id": analysis["id"],
+            "insights": insights,
+            "ai_insights": analysis.get("ai_insights") or {},
+            "description": analysis.get("description"),
+            "chat_context": analysis.get("chat_context"),
+        },
+        "raw_data": raw_data,
+        "sheet": sheet,
+        "retrieval_index": retrieval_index.get(sheet or ""),
+    }
+
+async def _load_chat_analysis(supabase_service: SupabaseService, file_id: str, user_id: str) -> Dict[str, Any]:
+    """Decoded analysis for chat, served from analysis_cache_service while the row's version is unchanged"""
+    try:
+        version = await supabase_service.get_analysis_version(file_id, user_id)
+    except HTTPException:
+        version = None  # Fall through to the full read, which reports the real error
+    if version is not None:
+        cached = analysis_cache_service.get(file_id, version)
+        if cached is not None:
+            return cached
+
+    with span("chat.load_analysis") as attrs:
+        analysis = await supabase_service.get_analysis_by_file_id(file_id, user_id)
+        if not analysis:
+            raise HTTPException(status_code=404, detail="Analysis not found for this file")
+        decoded = _decode_chat_analysis(analysis, file_id)
+        decoded["version"] = version
+        attrs["rows"] = len(decoded["raw_data"])
+
+    if version is not None:
+        analysis_cache_service.put(file_id, version, decoded)
+    return decoded
+
+async def _load_chat_inputs(file_id: str, user_id: str, supabase_service: SupabaseService) -> Dict[str, Any]:
+    """Chat service, decoded analysis and history for a file, shared by /chat and /chat/stream"""
+    # Get file metadata to determine spreadsheet_type
+    file = await supabase_service.get_file_by_id(file_id, user_id)
+    if not file:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    spreadsheet_type = file.get("spreadsheet_type", "").lower()
+    if not spreadsheet_type:
+        raise HTTPException(status_code=400, detail="File has no spreadsheet type")
+
+    # Get chat service based on spreadsheet_type
+    chat_service = CHAT_SERVICES.get(spreadsheet_type)
+    if not chat_service:
+        raise HTTPException(
+            status_code=400,
+            detail=f"No chat service available for spreadsheet type: {spreadsheet_type}"
+        )
+
+    # Decoded analysis and raw rows, from the cache unless the analysis changed
+    chat_data = await _load_chat_analysis(supabase_service, file_id, user_id)
+    # The columnar frame and row index live with the cached entry, so each is decoded or built at most once per version
+    frame = chat_data.get("frame")
+    if frame is None:
+        frame = chat_data["frame"] = chat_service.frame_for(chat_data["raw_data"])
+    row_index = chat_data.get("row_index")
+    if row_index is None:
+        row_index = chat_data["row_index"] = retrieval_index_service.load(chat_data.get("retrieval_index"), chat_data["raw_data"])
+    if chat_data["version"] is not None:
+        # Both count against the cache cap, so the frame is built now rather than on first use;
+        # column caches built by earlier questions are picked up on each load
+        frame.df
+        analysis_cache_service.attach(file_id, chat_data["version"], frame.nbytes() + row_index.nbytes)
+    analysis = chat_data["analysis"]
+    if not chat_service.context_is_current(analysis.get("chat_context")):
+        # Saved before contexts were stored, or by an older template: render once and store it back
+        analysis["chat_context"] = chat_service.render_context(analysis["insights"], analysis["ai_insights"])
+        await supabase_service.save_chat_context(file_id, user_id, analysis["chat_context"])
+
+    # Get chat history
+    chat_history = await supabase_service.get_chat_history(file_id, user_id)
+
+    return {
+        "spreadsheet_type": spreadsheet_type,
+        "chat_service": chat_service,
+        "analysis": chat_data["analysis"],
+        "raw_data": chat_data["raw_data"],
+        "frame": frame,
+        "row_index": row_index,
+        "version": chat_data["version"],
+        "chat_history": chat_history
+    }
+
+def _remember_turn(inputs: Dict[str, Any], file_id: str, user_id: str, saved: List[Dict[str, Any]]) -> None:
+    """Fold the saved turns into the conversation memory in the background, after the answer is out"""
+    task = asyncio.create_task(
+        conversation_memory_service.update(file_id, user_id, inputs["spreadsheet_type"], inputs["chat_history"] + list(saved or []))
+    )
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
 @app.post("/chat")
+@timed("chat")
 async def chat(
     request: ChatRequest,
     user_id: str = Depends(get_current_user),
     supabase_service: SupabaseService = Depends(get_supabase_service)
 ):
     try:
-        # Get file metadata to determine spreadsheet_type
-        file = await supabase_service.get_file_by_id(request.file_id, user_id)
-        if not file:
-            raise HTTPException(status_code=404, detail="File not found")
-
-        spreadsheet_type = file.get("spreadsheet_type", "").lower()
-        if not spreadsheet_type:
-            raise HTTPException(status_code=400, detail="File has no spreadsheet type")
-
-        # Get chat service based on spreadsheet_type
-        chat_service = CHAT_SERVICES.get(spreadsheet_type)
-        if not chat_service:
-            raise HTTPException(
-                status_code=400,
-                detail=f"No chat service available for spreadsheet type: {spreadsheet_type}"
-            )
-
-        # Get analysis data and raw_data
-        analysis = await supabase_service.get_analysis_by_file_id(request.file_id, user_id)
-        if not analysis:
-            raise HTTPException(status_code=404, detail="Analysis not found for this file")
-
-        # Extract raw_data from analysis (json_data)
-        raw_data = analysis.get("json_data")
-
-        if isinstance(raw_data, dict):
-            raw_data = [raw_data]
-
-        if isinstance(raw_data, str):
-            raw_data = json.loads(raw_data)
-
-        if not isinstance(raw_data, list) or not all(isinstance(item, dict) for item in raw_data):
-            logger.error("Invalid raw_data format: expected list of dictionaries", file_id=file_id, user_id=user_id)
-            raise HTTPException(status_code=400, detail="Invalid raw_data format: expected list of dictionaries")
-
-        # Get chat history
-        chat_history = await supabase_service.get_chat_history(request.file_id, user_id)
+        inputs = await _load_chat_inputs(request.file_id, user_id, supabase_service)
+        spreadsheet_type = inputs["spreadsheet_type"]
 
         # Generate answer using the appropriate chat service
-        answer = await chat_service.process_chat(
+        answer = await inputs["chat_service"].process_chat(
             file_id=request.file_id,
             user_id=user_id,
             question=request.question,
-            analysis_data=analysis,
-            raw_data=raw_data,
-            chat_history=chat_history
+            analysis_data=inputs["analysis"],
+            raw_data=inputs["raw_data"],
+            chat_history=inputs["chat_history"],
+            frame=inputs["frame"],
+            analysis_version=inputs["version"],
+            row_index=inputs["row_index"]
         )
 
         # Save chat history
-        await supabase_service.save_chat_history(
+        saved = await supabase_service.save_chat_history(
             file_id=request.file_id,
-            analysis_id=analysis["id"],
+            analysis_id=inputs["analysis"]["id"],
             user_id=user_id,
             question=request.question,
             answer=answer
         )
+        _remember_turn(inputs, request.file_id, user_id, saved)
 
         logger.info("Chat response generated", file_id=request.file_id, user_id=user_id, spreadsheet_type=spreadsheet_type)
         return {"file_id": request.file_id, "question": request.question, "answer": answer}
@@ -653,6 +1127,138 @@ async def chat(
         )
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/batch")
+@timed("chat_batch")
+async def chat_batch(
+    request: ChatBatchRequest,
+    user_id: str = Depends(get_current_user),
+    supabase_service: SupabaseService = Depends(get_supabase_service)
+):
+    """
+    Several questions about one file, as sent by the suggested-questions panel. The file,
+    analysis and history are loaded once; questions the planner, fast paths or answer cache
+    can answer are answered locally and the rest go to Mixtral concurrently. Answers are saved
+    to the history with one insert, in the order asked. A question that fails gets an "error"
+    entry instead of failing the batch.
+    """
+    questions = list(dict.fromkeys(q.strip() for q in request.questions if q and q.strip()))
+    if not questions:
+        raise HTTPException(status_code=400, detail="No questions given")
+    if len(questions) > settings.chat_batch_max_questions:
+        raise HTTPException(status_code=400, detail=f"At most {settings.chat_batch_max_questions} questions per batch")
+
+    inputs = await _load_chat_inputs(request.file_id, user_id, supabase_service)
+    results = await asyncio.gather(*(
+        inputs["chat_service"].process_chat(
+            file_id=request.file_id,
+            user_id=user_id,
+            question=question,
+            analysis_data=inputs["analysis"],
+            raw_data=inputs["raw_data"],
+            chat_history=inputs["chat_history"],
+            frame=inputs["frame"],
+            analysis_version=inputs["version"],
+            row_index=inputs["row_index"]
+        )
+        for question in questions
+    ), return_exceptions=True)
+
+    answers, turns = [], []
+    for question, result in zip(questions, results):
+        if isinstance(result, Exception):
+            detail = str(getattr(result, "detail", None) or result)
+            logger.error("Error processing batched chat question", error=detail, file_id=request.file_id, user_id=user_id)
+            answers.append({"question": question, "error": detail})
+        else:
+            answers.append({"question": question, "answer": result})
+            turns.append((question, result))
+
+    if turns:
+        saved = await supabase_service.save_chat_history_batch(request.file_id, inputs["analysis"]["id"], user_id, turns)
+        _remember_turn(inputs, request.file_id, user_id, saved)
+    logger.info(
+        "Chat batch answered",
+        file_id=request.file_id,
+        user_id=user_id,
+        spreadsheet_type=inputs["spreadsheet_type"],
+        questions=len(questions),
+        failed=len(questions) - len(turns)
+    )
+    return {"file_id": request.file_id, "answers": answers}
+
+@app.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    user_id: str = Depends(get_current_user),
+    supabase_service: SupabaseService = Depends(get_supabase_service)
+):
+    """
+    Server-Sent Events variant of /chat. Answer text is sent as "token" events while Mixtral
+    generates it, followed by "complete" with the full answer once it is saved to the history.
+    As with the analysis stream, generation runs in a background task so the answer is still
+    saved if the client disconnects.
+    """
+    # Validation errors are returned as regular HTTP errors before the stream opens
+    inputs = await _load_chat_inputs(request.file_id, user_id, supabase_service)
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def run_chat():
+        parts: List[str] = []
+        try:
+            with span("chat_stream", spreadsheet_type=inputs["spreadsheet_type"]) as attrs:
+                async for delta in inputs["chat_service"].stream_chat(
+                    file_id=request.file_id,
+                    user_id=user_id,
+                    question=request.question,
+                    analysis_data=inputs["analysis"],
+                    raw_data=inputs["raw_data"],
+                    chat_history=inputs["chat_history"],
+                    frame=inputs["frame"],
+                    analysis_version=inputs["version"],
+                    row_index=inputs["row_index"]
+                ):
+                    parts.append(delta)
+                    await events.put(("token", {"text": delta}))
+                answer = "".join(parts).strip()
+                if not answer:
+                    raise HTTPException(status_code=500, detail="Invalid response from AI model")
+                attrs["answer_chars"] = len(answer)
+
+                saved = await supabase_service.save_chat_history(
+                    file_id=request.file_id,
+                    analysis_id=inputs["analysis"]["id"],
+                    user_id=user_id,
+                    question=request.question,
+                    answer=answer
+                )
+            _remember_turn(inputs, request.file_id, user_id, saved)
+            logger.info("Chat response streamed", file_id=request.file_id, user_id=user_id, spreadsheet_type=inputs["spreadsheet_type"])
+            await events.put(("complete", {"file_id": request.file_id, "question": request.question, "answer": answer}))
+        except Exception as e:
+            logger.error("Error streaming chat", error=str(getattr(e, "detail", None) or e), file_id=request.file_id, user_id=user_id)
+            await events.put(("error", {"detail": str(getattr(e, "detail", None) or e)}))
+        finally:
+            await events.put(None)
+
+    task = asyncio.create_task(run_chat())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+    async def event_stream():
+        yield _sse_event("started", {"file_id": request.file_id, "question": request.question})
+        while True:
+            item = await events.get()
+            if item is None:
+                break
+            event, data = item
+            yield _sse_event(event, data)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/chat/history/{file_id}")
 async def get_chat_history(
     file_id: str,
@@ -670,6 +1276,7 @@ async def get_chat_history(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/export/pdf/{file_id}")
+@timed("export_pdf")
 async def export_pdf_report(
     file_id: str,
     request: ExportPDFRequest = None,  # Make optional
@@ -730,9 +1337,11 @@ async def export_pdf_report(
         logger.info("Final file name determined", file_name=file_name, file_id=file_id)
 
         # Generate PDF using computed_insights
-        pdf_content = exporter.generate_pdf(
-            insights = analysis["computed_insights"].get("Sheet1", analysis["computed_insights"])
-        )
+        with span("export_pdf.generate", spreadsheet_type=spreadsheet_type) as pdf_span:
+            pdf_content = exporter.generate_pdf(
+                insights = analysis["computed_insights"].get("Sheet1", analysis["computed_insights"])
+            )
+            pdf_span["bytes"] = len(pdf_content)
 
         # Create filename for download
         safe_filename = "".join(c for c in file_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
@@ -768,6 +1377,9 @@ async def delete_file(
     supabase_service: SupabaseService = Depends(get_supabase_service)):
     try:
         await supabase_service.delete_file(file_id, user_id)
+        analysis_cache_service.invalidate(file_id)
+        conversation_memory_service.forget(file_id)
+        answer_cache_service.invalidate(file_id)
         logger.info("File deleted successfully", file_id=file_id, user_id=user_id)
         return {"message": "File and associated data deleted successfully"}
     except HTTPException as e:
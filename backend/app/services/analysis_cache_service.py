@@ -0,0 +1,95 @@
+from typing import Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from app.config.settings import settings
+from app.utils.logger import logger
+from app.utils.metrics import metrics, record_cache
+import json
+import threading
+
+
+class AnalysisCacheService:
+    """
+    LRU cache of decoded analysis rows for chat, keyed by (file_id, version) where the
+    version is the row's id and updated_at. A stale version is simply never looked up again;
+    entries for a file are dropped explicitly when it is deleted or re-analyzed, so memory
+    is returned right away rather than when the entry ages out.
+
+    Sizes are measured as the JSON length of the payload, the same figure Supabase sends
+    over the wire, so the cap tracks what the cache saves rather than exact heap usage. The
+    chat frame and row index attached to an entry later are added with attach(), as their
+    in-memory size.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes if max_bytes is not None else settings.analysis_cache_max_mb * 1024 * 1024
+        # (file_id, version) -> (value, payload size, size of what was attached to it)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Dict[str, Any], int, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, file_id: str, version: str) -> Optional[Dict[str, Any]]:
+        key = (file_id, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        record_cache("analysis", entry is not None)
+        return entry[0] if entry is not None else None
+
+    def put(self, file_id: str, version: str, value: Dict[str, Any], size: Optional[int] = None) -> None:
+        if size is None:
+            size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            logger.info("Analysis too large to cache", file_id=file_id, bytes=size, max_bytes=self.max_bytes)
+            return
+        with self._lock:
+            # Older versions of this file can no longer be hit
+            self._remove_file(file_id)
+            self._entries[(file_id, version)] = (value, size, 0)
+            self._bytes += size
+            self._evict()
+
+    def attach(self, file_id: str, version: str, attached_bytes: int) -> None:
+        """Re-count an entry with attached_bytes for the structures built on it since put()"""
+        key = (file_id, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            value, size, attached = entry
+            if size + attached_bytes > self.max_bytes:
+                del self._entries[key]
+                self._bytes -= size + attached
+                logger.info("Analysis too large to keep cached", file_id=file_id, bytes=size + attached_bytes, max_bytes=self.max_bytes)
+                return
+            self._entries[key] = (value, size, attached_bytes)
+            self._bytes += attached_bytes - attached
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._entries:
+            (evicted_file, _), (_, size, attached) = self._entries.popitem(last=False)
+            self._bytes -= size + attached
+            logger.debug("Evicted cached analysis", file_id=evicted_file, bytes=size + attached)
+
+    def invalidate(self, file_id: str) -> None:
+        with self._lock:
+            removed = self._remove_file(file_id)
+        if removed:
+            logger.info("Invalidated cached analysis", file_id=file_id)
+
+    def _remove_file(self, file_id: str) -> int:
+        keys = [key for key in self._entries if key[0] == file_id]
+        for key in keys:
+            _, size, attached = self._entries.pop(key)
+            self._bytes -= size + attached
+        return len(keys)
+
+    def stats(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return {("entries",): len(self._entries), ("bytes",): self._bytes}
+
+
+analysis_cache_service = AnalysisCacheService()
+
+metrics.gauge("analysis_cache_size", "Cached analyses for chat, by unit", ("unit",), callback=analysis_cache_service.stats)
@@ -0,0 +1,218 @@
+import pandas as pd
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+from app.utils.dates import is_date_name, is_epoch_ms, parse_dates
+from app.utils.logger import logger
+
+
+class AnomalyDetectionService:
+    """
+    Vectorized outlier detection over the full rows of a sheet, run before the LLM so the
+    anomaly nodes only have to explain a short, ranked list of findings.
+    """
+
+    def __init__(self):
+        self.robust_z_threshold = 3.5  # Iglewicz-Hoaglin cut-off for the modified z-score
+        self.iqr_multiplier = 3.0  # "Far out" fences
+        self.jump_threshold = 0.5  # 50% month-over-month change
+        self.min_group_size = 5
+        self.max_group_cardinality = 50
+        self.max_numeric_columns = 5
+        self.max_findings = 10
+        self.max_per_kind = 3
+
+    def detect(self, json_data: Any, column_mapper: Any = None) -> List[Dict[str, Any]]:
+        """Findings across all sheets, highest score first"""
+        if isinstance(json_data, list):
+            sheets = {None: json_data}
+        elif isinstance(json_data, dict) and all(isinstance(rows, list) for rows in json_data.values()):
+            sheets = json_data
+        else:
+            return []
+
+        findings: List[Dict[str, Any]] = []
+        for sheet_name, rows in sheets.items():
+            if not rows:
+                continue
+            try:
+                df = pd.DataFrame(rows)
+                for finding in self.detect_frame(df, self._map_columns(df, column_mapper)):
+                    if sheet_name is not None:
+                        finding["sheet"] = sheet_name
+                    findings.append(finding)
+            except Exception as e:
+                logger.warning("Anomaly detection failed for sheet", sheet=sheet_name, error=str(e))
+
+        # Strongest first, but cap each (type, column) so one noisy column cannot crowd out
+        # month-over-month jumps or duplicates
+        findings.sort(key=lambda f: f["score"], reverse=True)
+        selected, per_kind = [], {}
+        for finding in findings:
+            kind = (finding["type"], finding.get("column"))
+            if per_kind.get(kind, 0) >= self.max_per_kind:
+                continue
+            per_kind[kind] = per_kind.get(kind, 0) + 1
+            selected.append(finding)
+            if len(selected) >= self.max_findings:
+                break
+        return selected
+
+    def detect_frame(self, df: pd.DataFrame, column_mappings: Optional[Dict[str, Optional[str]]] = None) -> List[Dict[str, Any]]:
+        numeric_columns, group_columns, date_column = self._select_columns(df, column_mappings)
+        numeric = {col: pd.to_numeric(df[col], errors="coerce") for col in numeric_columns}
+
+        findings: List[Dict[str, Any]] = []
+        for col, values in numeric.items():
+            findings.extend(self._run(self._robust_z_outliers, df, col, values, group_columns))
+            findings.extend(self._run(self._iqr_outliers, col, values))
+            if date_column is not None:
+                findings.extend(self._run(self._monthly_jumps, df, col, values, date_column))
+        # Several concepts can map to one column (productivity and defect_rate); key each column once
+        key_columns = list(dict.fromkeys(c for c in (column_mappings or {}).values() if c is not None and c in df.columns))
+        findings.extend(self._run(self._duplicates, df, key_columns))
+
+        # One finding per row/column pair; keep the strongest signal
+        best: Dict[Tuple[Any, Any, Any], Dict[str, Any]] = {}
+        for finding in findings:
+            key = (finding.get("row_index"), finding.get("column"), finding.get("period"))
+            if key not in best or finding["score"] > best[key]["score"]:
+                best[key] = finding
+        return list(best.values())
+
+    def _run(self, detector, *args) -> List[Dict[str, Any]]:
+        """One detector's findings; a detector that fails is logged and skipped, not the whole sheet"""
+        try:
+            return detector(*args)
+        except Exception as e:
+            logger.warning("Anomaly detector failed", detector=detector.__name__, error=str(e))
+            return []
+
+    def _map_columns(self, df: pd.DataFrame, column_mapper: Any) -> Optional[Dict[str, Optional[str]]]:
+        if column_mapper is None:
+            return None
+        try:
+            return column_mapper._map_columns(df)
+        except Exception as e:
+            logger.warning("Column mapping failed; inferring anomaly columns", error=str(e))
+            return None
+
+    def _select_columns(self, df: pd.DataFrame, column_mappings: Optional[Dict[str, Optional[str]]]):
+        mapped = [col for col in (column_mappings or {}).values() if col is not None and col in df.columns]
+        candidates = list(dict.fromkeys(mapped)) or list(df.columns)
+
+        date_column = None
+        for concept, col in (column_mappings or {}).items():
+            if col is not None and col in df.columns and "date" in concept:
+                date_column = col
+                break
+        if date_column is None:
+            date_column = next((
+                col for col in candidates
+                if "date" in str(col).lower() and (not pd.api.types.is_numeric_dtype(df[col]) or is_epoch_ms(df[col]))
+            ), None)
+
+        numeric_columns, group_columns = [], []
+        for col in candidates:
+            if col == date_column:
+                continue
+            series = df[col]
+            if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                # Identifiers are numeric but not measures, and neither are dates stored as epoch milliseconds
+                if str(col).lower().endswith("id") or (pd.api.types.is_integer_dtype(series) and series.nunique(dropna=True) == len(series)):
+                    continue
+                if is_date_name(col) and is_epoch_ms(series):
+                    continue
+                if len(numeric_columns) < self.max_numeric_columns:
+                    numeric_columns.append(col)
+            elif 1 < series.nunique(dropna=True) <= self.max_group_cardinality:
+                group_columns.append(col)
+        return numeric_columns, group_columns, date_column
+
+    def _robust_z_outliers(self, df: pd.DataFrame, col: str, values: pd.Series, group_columns: List[str]) -> List[Dict[str, Any]]:
+        """Modified z-score (median/MAD), globally and within each category group"""
+        findings = []
+        groupings = [(None, pd.Series(0, index=df.index))] + [(g, df[g].astype(str)) for g in group_columns]
+        for group_column, keys in groupings:
+            median = values.groupby(keys).transform("median")
+            mad = (values - median).abs().groupby(keys).transform("median")
+            size = values.groupby(keys).transform("count")
+            z = 0.6745 * (values - median) / mad.replace(0, np.nan)
+            mask = (z.abs() >= self.robust_z_threshold) & (size >= self.min_group_size)
+            for idx in z[mask].abs().nlargest(self.max_findings).index:
+                group = None if group_column is None else keys[idx]
+                within = f" within {group_column} '{group}'" if group_column is not None else ""
+                findings.append({
+                    "type": "robust_zscore",
+                    "column": col,
+                    "group": {group_column: group} if group_column is not None else None,
+                    "row_index": int(idx),
+                    "value": float(values[idx]),
+                    "expected": float(median[idx]),
+                    "score": float(abs(z[idx])),
+                    "description": f"{col} = {values[idx]:,.2f} on row {int(idx) + 1} is {abs(z[idx]):.1f} robust z-scores {'above' if z[idx] > 0 else 'below'} the median of {median[idx]:,.2f}{within}"
+                })
+        return findings
+
+    def _iqr_outliers(self, col: str, values: pd.Series) -> List[Dict[str, Any]]:
+        clean = values.dropna()
+        if len(clean) < 4 * self.min_group_size:
+            return []
+        q1, q3 = clean.quantile([0.25, 0.75])
+        iqr = q3 - q1
+        if iqr <= 0:
+            return []
+        low, high = q1 - self.iqr_multiplier * iqr, q3 + self.iqr_multiplier * iqr
+        distance = np.maximum(low - values, values - high) / iqr
+        outside = distance[distance > 0].nlargest(self.max_findings)
+        return [{
+            "type": "iqr_fence",
+            "column": col,
+            "row_index": int(idx),
+            "value": float(values[idx]),
+            "expected": float(clean.median()),
+            # Scaled so an IQR breach ranks alongside a comparable robust z-score
+            "score": float(self.robust_z_threshold + dist),
+            "description": f"{col} = {values[idx]:,.2f} on row {int(idx) + 1} is outside the {self.iqr_multiplier:g}x IQR fences [{low:,.2f}, {high:,.2f}]"
+        } for idx, dist in outside.items()]
+
+    def _monthly_jumps(self, df: pd.DataFrame, col: str, values: pd.Series, date_column: str) -> List[Dict[str, Any]]:
+        months = parse_dates(df[date_column]).dt.to_period("M")
+        monthly = values.groupby(months).sum().sort_index()
+        if len(monthly) < 3:
+            return []
+        previous = monthly.shift(1)
+        change = (monthly - previous) / previous.abs().replace(0, np.nan)
+        jumps = change[change.abs() >= self.jump_threshold].dropna()
+        return [{
+            "type": "month_over_month_jump",
+            "column": col,
+            "period": str(period),
+            "value": float(monthly[period]),
+            "expected": float(previous[period]),
+            "score": float(self.robust_z_threshold * abs(pct) / self.jump_threshold),
+            "description": f"Monthly total of {col} {'jumped' if pct > 0 else 'dropped'} {abs(pct) * 100:.0f}% in {period} ({previous[period]:,.2f} → {monthly[period]:,.2f})"
+        } for period, pct in jumps.items()]
+
+    def _duplicates(self, df: pd.DataFrame, key_columns: List[str]) -> List[Dict[str, Any]]:
+        """Rows repeating the same mapped fields (or every field when nothing is mapped)"""
+        subset = list(dict.fromkeys(key_columns)) if len(set(key_columns)) >= 2 else list(df.columns)
+        hashable = df[subset].astype(str)
+        duplicated = hashable.duplicated(keep=False)
+        if not duplicated.any():
+            return []
+        groups = hashable[duplicated].groupby(subset, sort=False).groups
+        findings = []
+        for _, index in list(groups.items())[:self.max_findings]:
+            rows = [int(i) + 1 for i in index]
+            findings.append({
+                "type": "duplicate_transaction",
+                "column": None,
+                "row_index": int(index[0]),
+                "rows": rows[:10],
+                "score": float(self.robust_z_threshold + len(rows)),
+                "description": f"{len(rows)} identical records on rows {', '.join(map(str, rows[:10]))}{'…' if len(rows) > 10 else ''} ({', '.join(subset[:4])})"
+            })
+        return findings
+
+
+anomaly_detection_service = AnomalyDetectionService()
@@ -0,0 +1,162 @@
+from typing import Dict, Optional, Tuple
+from collections import OrderedDict
+from app.config.settings import settings
+from app.utils.logger import logger
+from app.utils.metrics import metrics, record_cache
+import numpy as np
+import calendar
+import threading
+import zlib
+import re
+
+# Filler that does not change what is being asked ("what's the total revenue?" -> "total revenue")
+FILLER_WORDS = {
+    "what", "whats", "is", "are", "was", "were", "the", "a", "an", "please", "me", "show", "tell",
+    "give", "can", "could", "would", "you", "i", "us", "our", "my", "of", "do", "does", "know", "want", "to"
+}
+# Questions leaning on earlier turns; their answer depends on the conversation, not just the words
+FOLLOW_UP_QUERY = re.compile(r"\b(it|its|that|those|these|them|same|above|again|also|instead|this(?!\s+(year|quarter|month|week)))\b", re.I)
+# Openings that continue the previous turn ("and March?", "what about by region", "why?")
+ELLIPTICAL_QUERY = re.compile(r"^\W*(and|or|but|so|then|what about|how about|why|more|tell me more|what else|anything else)\b", re.I)
+# Words that must agree exactly between near-duplicates: "revenue in March" is not "revenue in May",
+# "last year" is not "this year", "highest" is not "lowest" and "late" is not "on time". Tokens with
+# digits are anchors too.
+ANCHOR_WORDS = {name.lower() for name in list(calendar.month_name) + list(calendar.month_abbr) if name} | {
+    "last", "this", "next", "previous", "prior", "current", "ytd", "today", "yesterday", "week", "month", "quarter", "year",
+    "top", "bottom", "best", "worst", "highest", "lowest", "most", "least", "largest", "smallest", "max", "min",
+    "maximum", "minimum", "not", "without", "excluding", "except", "average", "median", "total", "count",
+    "no", "non", "never", "on", "off", "late", "early", "delayed", "before", "after", "over", "under", "above", "below",
+    "more", "less", "fewer", "up", "down", "increase", "increased", "decrease", "decreased", "rise", "rose", "fall",
+    "fell", "drop", "dropped", "grow", "grew", "growth", "decline", "declined", "gain", "loss", "high", "low", "higher",
+    "lower", "first", "final", "north", "south", "east", "west", "in", "out", "open", "closed", "active", "inactive",
+    "paid", "unpaid", "pass", "fail", "failed", "win", "won", "lost", "new", "old", "male", "female"
+}
+EMBEDDING_DIM = 512
+
+
+def _singular(word: str) -> str:
+    return word[:-1] if word.endswith("s") and not word.endswith("ss") and len(word) > 3 else word
+
+
+def normalize_question(question: str) -> str:
+    words = re.findall(r"[a-z0-9]+", question.lower().replace("'", ""))
+    kept = [w for w in words if w not in FILLER_WORDS]
+    return " ".join(_singular(w) for w in (kept or words))
+
+
+def _embed(normalized: str) -> np.ndarray:
+    """Hashed character-trigram vector, L2-normalised, so cosine similarity is a dot product"""
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for word in normalized.split():
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            vector[zlib.crc32(padded[i:i + 3].encode()) % EMBEDDING_DIM] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _anchors(normalized: str) -> frozenset:
+    return frozenset(w for w in normalized.split() if w in ANCHOR_WORDS or any(c.isdigit() for c in w))
+
+
+class AnswerCacheService:
+    """
+    Chat answers per file, keyed by (file_id, analysis version, normalised question), so the
+    same question asked again, by anyone with access to the file, skips the LLM call. Only
+    the answers of one analysis version are kept per file; a new version or an explicit
+    invalidate() on re-analysis drops them.
+
+    With a similarity threshold set, a question missing the exact key is compared with the
+    file's cached questions by cosine similarity of local character-trigram embeddings, and
+    the closest answer is served when it clears the threshold and agrees on the anchor words
+    (numbers, months, periods, directions such as highest/lowest).
+    """
+
+    def __init__(
+        self,
+        max_files: Optional[int] = None,
+        max_entries_per_file: Optional[int] = None,
+        similarity_threshold: Optional[float] = None
+    ):
+        self.max_files = max_files if max_files is not None else settings.answer_cache_max_files
+        self.max_entries_per_file = max_entries_per_file if max_entries_per_file is not None else settings.answer_cache_entries_per_file
+        self.similarity_threshold = similarity_threshold if similarity_threshold is not None else settings.answer_cache_similarity
+        # file_id -> (version, normalised question -> (answer, embedding))
+        self._files: "OrderedDict[str, Tuple[str, OrderedDict[str, Tuple[str, np.ndarray]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cacheable(self, question: str, has_history: bool = False) -> bool:
+        """
+        Whether the answer depends on the question alone. In a conversation, elliptical or
+        one-word questions ("why?", "tell me more", "and March?") lean on the earlier turns too.
+        """
+        if FOLLOW_UP_QUERY.search(question):
+            return False
+        return not has_history or not (ELLIPTICAL_QUERY.search(question) or len(normalize_question(question).split()) <= 1)
+
+    def get(self, file_id: str, version: Optional[str], question: str, has_history: bool = False) -> Optional[str]:
+        if version is None or not self.cacheable(question, has_history):
+            return None
+        normalized = normalize_question(question)
+        with self._lock:
+            cached = self._files.get(file_id)
+            if cached is None or cached[0] != version:
+                answer, match, similarity = None, None, 0.0
+            else:
+                self._files.move_to_end(file_id)
+                answer, match, similarity = self._lookup(cached[1], normalized)
+        record_cache("answer", answer is not None)
+        if answer is not None:
+            logger.info("Answer cache hit", file_id=file_id, match=match, similarity=round(similarity, 3), question=normalized)
+        return answer
+
+    def _lookup(self, entries: "OrderedDict[str, Tuple[str, np.ndarray]]", normalized: str) -> Tuple[Optional[str], Optional[str], float]:
+        entry = entries.get(normalized)
+        if entry is not None:
+            entries.move_to_end(normalized)
+            return entry[0], "exact", 1.0
+        if not self.similarity_threshold or not entries:
+            return None, None, 0.0
+
+        keys = list(entries)
+        similarities = np.stack([entries[k][1] for k in keys]) @ _embed(normalized)
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        if similarity < self.similarity_threshold or _anchors(keys[best]) != _anchors(normalized):
+            return None, None, similarity
+        entries.move_to_end(keys[best])
+        return entries[keys[best]][0], "similar", similarity
+
+    def put(self, file_id: str, version: Optional[str], question: str, answer: str, has_history: bool = False) -> None:
+        if version is None or not answer or not self.cacheable(question, has_history):
+            return
+        normalized = normalize_question(question)
+        with self._lock:
+            cached = self._files.get(file_id)
+            if cached is None or cached[0] != version:
+                cached = (version, OrderedDict())
+                self._files[file_id] = cached
+            self._files.move_to_end(file_id)
+            entries = cached[1]
+            entries[normalized] = (answer, _embed(normalized))
+            entries.move_to_end(normalized)
+            while len(entries) > self.max_entries_per_file:
+                entries.popitem(last=False)
+            while len(self._files) > self.max_files:
+                evicted_file, _ = self._files.popitem(last=False)
+                logger.debug("Evicted cached answers", file_id=evicted_file)
+
+    def invalidate(self, file_id: str) -> None:
+        with self._lock:
+            removed = self._files.pop(file_id, None)
+        if removed is not None:
+            logger.info("Invalidated cached answers", file_id=file_id, answers=len(removed[1]))
+
+    def stats(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return {("files",): len(self._files), ("answers",): sum(len(entries) for _, entries in self._files.values())}
+
+
+answer_cache_service = AnswerCacheService()
+
+metrics.gauge("answer_cache_size", "Cached chat answers, by unit", ("unit",), callback=answer_cache_service.stats)
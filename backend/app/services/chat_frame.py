@@ -0,0 +1,188 @@
+import pandas as pd
+from typing import List, Dict, Any, Optional, Callable, Tuple
+from app.utils.dates import parse_dates, restore_epoch_dates
+import re
+
+# Words that carry no column meaning in a question phrase ("the total revenue" -> "revenue")
+PHRASE_STOP_WORDS = {"the", "a", "an", "each", "every", "all", "of", "my", "our", "total", "overall", "number"}
+
+
+def _singular(word: str) -> str:
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def _name_words(col: Any) -> List[str]:
+    """Words of a column name; camelCase and PascalCase headers ("TotalRevenue") are split too"""
+    return re.findall(r"[a-z0-9]+", re.sub(r"(?<=[a-z0-9])(?=[A-Z])", " ", str(col)).lower())
+
+
+class ChatFrame:
+    """
+    Columnar view of the sheet a chat is about. The DataFrame and its column mappings are
+    built on first use and then kept with the cached analysis, so repeated questions run
+    vectorized group-bys instead of walking the row dicts. Columns are located with the
+    domain analysis service's _map_columns, the same mapping the insights were computed with.
+    """
+
+    def __init__(
+        self,
+        raw_data: List[Dict[str, Any]],
+        analysis_service,
+        clean: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None
+    ):
+        self.raw_data = raw_data
+        self.analysis_service = analysis_service
+        self.clean = clean
+        self._df: Optional[pd.DataFrame] = None
+        self._mappings: Optional[Dict[str, Optional[str]]] = None
+        self._numeric: Dict[str, pd.Series] = {}
+        self._labels: Dict[str, pd.Series] = {}
+        self._dates: Dict[str, pd.Series] = {}
+        self._distinct: Dict[str, int] = {}
+        self._values: Dict[str, Dict[str, Any]] = {}
+        self._df_bytes: Optional[int] = None
+
+    @property
+    def df(self) -> pd.DataFrame:
+        if self._df is None:
+            df = pd.DataFrame.from_records(self.raw_data) if self.raw_data else pd.DataFrame()
+            # Before cleaning, which would parse epoch-millisecond dates as nanoseconds
+            df = restore_epoch_dates(df)
+            self._df = self.clean(df) if self.clean is not None else df
+        return self._df
+
+    @property
+    def mappings(self) -> Dict[str, Optional[str]]:
+        if self._mappings is None:
+            self._mappings = self.analysis_service._map_columns(self.df)
+        return self._mappings
+
+    def __len__(self) -> int:
+        return len(self.raw_data)
+
+    def nbytes(self) -> int:
+        """Memory held by the DataFrame and the column caches built so far"""
+        if self._df is None:
+            return 0
+        if self._df_bytes is None:
+            self._df_bytes = int(self._df.memory_usage(deep=True).sum())
+        caches = (self._numeric, self._labels, self._dates)
+        return self._df_bytes + sum(int(series.memory_usage(deep=True)) for cache in caches for series in cache.values())
+
+    def column(self, *concepts: str) -> Optional[str]:
+        """Column mapped to the first of the concepts that has one"""
+        return next((self.mappings[c] for c in concepts if self.mappings.get(c)), None)
+
+    def numeric(self, *concepts: str) -> Optional[pd.Series]:
+        """Mapped column as floats; values that do not parse become NaN"""
+        col = self.column(*concepts)
+        return self.numeric_column(col) if col is not None else None
+
+    def labels(self, *concepts: str) -> Optional[pd.Series]:
+        """Mapped column for grouping, with empty values as NaN so group-bys drop them"""
+        col = self.column(*concepts)
+        return self.label_column(col) if col is not None else None
+
+    def dates(self, *concepts: str) -> Optional[pd.Series]:
+        """Mapped column as datetimes (epoch milliseconds from xlsx uploads included); values that do not parse become NaT"""
+        col = self.column(*concepts)
+        return self.date_column(col) if col is not None else None
+
+    def distinct(self, *concepts: str) -> Optional[int]:
+        """Number of distinct non-empty values in the mapped column"""
+        col = self.column(*concepts)
+        if col is None:
+            return None
+        if col not in self._distinct:
+            self._distinct[col] = int(self.label_column(col).nunique())
+        return self._distinct[col]
+
+    def group(self, values: Optional[pd.Series], *concepts: str, how: str = "sum") -> Optional[pd.Series]:
+        """values aggregated per label of the first mapped concept, or None if either is missing"""
+        labels = self.labels(*concepts)
+        if values is None or labels is None:
+            return None
+        grouped = values.groupby(labels, sort=False, observed=True).agg(how)
+        return grouped if not grouped.empty else None
+
+    # ---------- Column-level access ----------
+    def numeric_column(self, col: str) -> pd.Series:
+        if col not in self._numeric:
+            self._numeric[col] = pd.to_numeric(self.df[col], errors="coerce")
+        return self._numeric[col]
+
+    def label_column(self, col: str) -> pd.Series:
+        if col not in self._labels:
+            values = self.df[col]
+            # Categorical, so every later group-by works on integer codes rather than hashing strings
+            self._labels[col] = values.where(values.notna() & (values.astype(str).str.strip() != "")).astype("category")
+        return self._labels[col]
+
+    def date_column(self, col: str) -> pd.Series:
+        if col not in self._dates:
+            self._dates[col] = parse_dates(self.df[col])
+        return self._dates[col]
+
+    def resolve(self, phrase: str, numeric: bool = False) -> Optional[str]:
+        """
+        Column a question phrase such as "sales reps" or "revenue" refers to. The phrase is
+        scored against each mapped concept's patterns and against the column names themselves
+        with the analysis service's match score; numeric=True only accepts columns with numbers.
+        """
+        words = [w for w in re.findall(r"[a-z0-9]+", phrase.lower()) if w not in PHRASE_STOP_WORDS]
+        if not words:
+            return None
+        # Patterns mix plural and singular forms ("sales", "rep"), so both spellings are scored
+        phrases = {" ".join(words), " ".join(_singular(w) for w in words)}
+
+        candidates: List[Tuple[str, List[List[str]]]] = []
+        for concept, col in self.mappings.items():
+            if col:
+                patterns = self.analysis_service.column_patterns.get(concept, [])
+                candidates.append((col, [concept.split("_")] + patterns))
+        for col in self.df.columns:
+            candidates.append((col, [[_singular(w) for w in _name_words(col)]]))
+
+        best_col, best_score = None, 0.6  # Same minimum as the column mapping
+        for col, patterns in candidates:
+            score = max((self.analysis_service._calculate_match_score(phrase, p) for phrase in phrases for p in patterns if p), default=0.0)
+            if not numeric and pd.api.types.is_numeric_dtype(self.df[col]):
+                score -= 0.05  # Prefer names over ids when grouping
+            if score > best_score and (not numeric or self.numeric_column(col).notna().any()):
+                best_col, best_score = col, score
+        return best_col
+
+    def covers(self, col: str, phrase: str) -> bool:
+        """
+        Whether every word of the phrase belongs to the column's name, concept or patterns, so
+        a resolution that matched part of "revenue last quarter" is not taken for the whole
+        """
+        vocabulary = {_singular(w) for w in _name_words(col)}
+        for concept, mapped in self.mappings.items():
+            if mapped == col:
+                vocabulary.update(concept.split("_"))
+                vocabulary.update(w for pattern in self.analysis_service.column_patterns.get(concept, []) for w in pattern)
+        words = [_singular(w) for w in re.findall(r"[a-z0-9]+", phrase.lower()) if w not in PHRASE_STOP_WORDS]
+        # Prefixes count ("qty" in "qty_sold", "dept" for "department"), as in the match score
+        return bool(words) and all(
+            any(v.startswith(w) or w.startswith(v) for v in vocabulary if min(len(v), len(w)) >= 3 or v == w)
+            for w in words
+        )
+
+    def find_values(self, *values: str) -> Optional[Tuple[str, List[Any]]]:
+        """First text column holding all the values (case-insensitively), with their spelling in it"""
+        wanted = [v.strip().lower() for v in values]
+        mapped = [col for col in self.mappings.values() if col]
+        for col in dict.fromkeys(mapped + list(self.df.columns)):
+            if pd.api.types.is_numeric_dtype(self.df[col]):
+                continue
+            if col not in self._values:
+                self._values[col] = {str(v).strip().lower(): v for v in self.label_column(col).dropna().unique()}
+            index = self._values[col]
+            if all(w in index for w in wanted):
+                return col, [index[w] for w in wanted]
+        return None
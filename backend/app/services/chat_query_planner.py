@@ -0,0 +1,313 @@
+import pandas as pd
+from typing import Dict, Any, Optional, Tuple
+from app.services.chat_frame import ChatFrame, PHRASE_STOP_WORDS
+from app.utils.logger import logger
+import calendar
+import re
+
+# Deterministic planner for the aggregate questions chat gets most: a question is parsed into
+# a small plan (intent plus the phrases filling its slots), the phrases are resolved to columns
+# of the cached ChatFrame, and the plan runs as a pandas aggregate. Anything the planner cannot
+# parse or resolve is left to the LLM.
+
+MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+MONTHS["sept"] = 9
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+
+_END = r"\s*(?:[?.!]|$)"
+_PHRASE = r"[a-z][\w ]*?"
+_MONTH = "|".join(sorted(MONTHS, key=len, reverse=True))
+
+TOP_N_QUERY = re.compile(
+    rf"\b(?P<direction>top|bottom|best|worst|highest|lowest|largest|smallest)\s+(?:(?P<n>\d{{1,3}}|{'|'.join(NUMBER_WORDS)})\s+)?"
+    rf"(?P<dimension>{_PHRASE})\s+by\s+(?P<measure>{_PHRASE}){_END}", re.I)
+TOTAL_IN_MONTH_QUERY = re.compile(
+    rf"\b(?:total|sum of|how much)\s+(?P<measure>{_PHRASE})\s+(?:in|for|during)\s+(?P<month>{_MONTH})\b\.?"
+    rf"(?:\s+(?P<year>(?:19|20)\d{{2}}))?{_END}", re.I)
+AVERAGE_PER_QUERY = re.compile(
+    rf"\b(?:average|avg|mean)\s+(?P<measure>{_PHRASE})\s+(?:per|by|for each|in each|across)\s+(?P<dimension>{_PHRASE}){_END}", re.I)
+# "vs" splits before "and"/"with" so values such as "Food and Beverage" stay whole
+COMPARE_QUERIES = [
+    re.compile(rf"\b(?:compare\s+)?(?P<left>[\w&'./ -]+?)\s+(?:vs\.?|versus|against)\s+(?P<right>[\w&'./ -]+?)(?:\s+(?:by|on|in terms of)\s+(?P<measure>{_PHRASE}))?{_END}", re.I),
+    re.compile(rf"\bcompare\s+(?P<left>[\w&'./ -]+?)\s+(?:and|with|to)\s+(?P<right>[\w&'./ -]+?)(?:\s+(?:by|on|in terms of)\s+(?P<measure>{_PHRASE}))?{_END}", re.I),
+]
+# Phrases carrying a filter or period the plans do not express ("revenue in 2024", "revenue last
+# quarter", "amount over 1000"); those go to the LLM
+UNSUPPORTED_QUALIFIER = re.compile(
+    r"\b(in|for|during|from|since|between|where|when|except|without|excluding|last|this|next|ytd|qtd|mtd|per|"
+    r"over|under|above|below|than|day|week|month|quarter|year|today|yesterday)\b", re.I)
+LEADING_ARTICLE = re.compile(r"^(?:the|a|an|how (?:does|do|did)|what about)\s+", re.I)
+
+# Everyday words for measures, tried when the phrase itself matches no column
+MEASURE_SYNONYMS = {"sales": "revenue", "income": "revenue", "turnover": "revenue", "pay": "salary", "wages": "salary",
+                    "spend": "expense", "spending": "expenses", "costs": "cost", "units": "quantity", "volume": "quantity"}
+
+# Measures that are averaged rather than summed: a total of ratings or rates means nothing
+NON_ADDITIVE = re.compile(r"\b(rating|rate|score|percent|percentage|pct|ratio|margin|age|average|avg|mean)\b|%")
+
+# Measure words formatted as currency
+MONEY_WORDS = ("revenue", "price", "cost", "salary", "amount", "expense", "profit", "budget", "actual", "variance", "tax", "interest", "sales", "pay")
+
+TOP_LIMIT_DEFAULT = 5
+GROUPS_SHOWN = 10
+SOURCE_NOTE = "(computed from the supplied analysis/raw data)"
+
+
+def plan_query(question: str) -> Optional[Dict[str, Any]]:
+    """Plan for a supported question shape, or None when the question is open-ended"""
+    match = TOP_N_QUERY.search(question)
+    if match:
+        n = match.group("n")
+        if n:
+            n = int(n) if n.isdigit() else NUMBER_WORDS[n.lower()]
+        else:
+            # "top product by revenue" asks for one, "top products by revenue" for a list
+            n = TOP_LIMIT_DEFAULT if match.group("dimension").lower().endswith("s") else 1
+        return _checked({
+            "intent": "top",
+            "ascending": match.group("direction").lower() in ("bottom", "worst", "lowest", "smallest"),
+            "n": max(1, min(n, 50)),
+            "dimension": match.group("dimension"),
+            "measure": match.group("measure"),
+        })
+
+    match = TOTAL_IN_MONTH_QUERY.search(question)
+    if match:
+        return _checked({
+            "intent": "total_in_month",
+            "measure": match.group("measure"),
+            "month": MONTHS[match.group("month").lower()],
+            "year": int(match.group("year")) if match.group("year") else None,
+        })
+
+    match = AVERAGE_PER_QUERY.search(question)
+    if match:
+        return _checked({
+            "intent": "average_per",
+            "measure": match.group("measure"),
+            "dimension": match.group("dimension"),
+        })
+
+    for pattern in COMPARE_QUERIES:
+        match = pattern.search(question)
+        if match:
+            return _checked({
+                "intent": "compare",
+                "explicit": bool(re.search(r"\bcompare\b", question, re.I)),
+                "left": LEADING_ARTICLE.sub("", match.group("left").strip()),
+                "right": LEADING_ARTICLE.sub("", match.group("right").strip()),
+                "measure": match.group("measure"),
+            })
+    return None
+
+
+def is_aggregate_question(question: str) -> bool:
+    """Whether the question has one of the planned shapes, whether or not a plan could be made for it"""
+    patterns = [TOP_N_QUERY, TOTAL_IN_MONTH_QUERY, AVERAGE_PER_QUERY] + COMPARE_QUERIES
+    return any(pattern.search(question) for pattern in patterns)
+
+
+def _checked(plan: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    for slot in ("measure", "dimension"):
+        if plan.get(slot) and UNSUPPORTED_QUALIFIER.search(plan[slot]):
+            return None
+    return plan
+
+
+def execute_plan(
+    plan: Dict[str, Any],
+    frame: ChatFrame,
+    date_concepts: Tuple[str, ...],
+    default_measure: str,
+    derived_measures: Dict[str, Optional[pd.Series]]
+) -> Optional[str]:
+    """
+    Answer text for a plan, or None when its phrases do not resolve to columns. derived_measures
+    are currency series the domain computes rather than reads (retail revenue is units x price).
+    """
+    if not len(frame):
+        return None
+    intent = plan["intent"]
+    if intent == "top":
+        answer = _top(plan, frame, derived_measures)
+    elif intent == "total_in_month":
+        answer = _total_in_month(plan, frame, date_concepts, derived_measures)
+    elif intent == "average_per":
+        answer = _average_per(plan, frame, derived_measures)
+    else:
+        answer = _compare(plan, frame, default_measure, derived_measures)
+
+    if answer is not None:
+        logger.info("Answered chat question from query plan", intent=intent, rows=len(frame))
+    return answer
+
+
+def _measure(frame: ChatFrame, phrase: str, derived_measures: Dict[str, Optional[pd.Series]]) -> Optional[Tuple[pd.Series, bool, bool]]:
+    """(values, is_money, is_additive) for a measure phrase that resolves as a whole"""
+    words = set(re.findall(r"[a-z0-9]+", phrase.lower())) - PHRASE_STOP_WORDS
+    for name, values in derived_measures.items():
+        if values is not None and words in ({name}, {name.rstrip("s")}):
+            return values, True, True
+    col = frame.resolve(phrase, numeric=True)
+    if col is not None and not frame.covers(col, phrase):
+        col = None
+    if col is None:
+        synonym = " ".join(MEASURE_SYNONYMS.get(word, word) for word in phrase.lower().split())
+        col = frame.resolve(synonym, numeric=True) if synonym != phrase.lower() else None
+        if col is not None and not frame.covers(col, synonym):
+            col = None
+    if col is None:
+        return None
+    concept = next((c for c, mapped in frame.mappings.items() if mapped == col), "")
+    described = f"{concept} {str(col).lower()}".replace("_", " ")
+    is_money = any(word in described for word in MONEY_WORDS)
+    return frame.numeric_column(col), is_money, not NON_ADDITIVE.search(described)
+
+
+def _dimension(frame: ChatFrame, phrase: str) -> Optional[str]:
+    col = frame.resolve(phrase)
+    return col if col is not None and frame.covers(col, phrase) else None
+
+
+def _fmt(value: float, is_money: bool) -> str:
+    if is_money:
+        return f"${value:,.2f}"
+    return f"{value:,.0f}" if float(value).is_integer() else f"{value:,.2f}"
+
+
+def _clean_phrase(phrase: str) -> str:
+    return LEADING_ARTICLE.sub("", phrase.strip().lower())
+
+
+def _top(plan: Dict[str, Any], frame: ChatFrame, derived_measures: Dict[str, Optional[pd.Series]]) -> Optional[str]:
+    measure = _measure(frame, plan["measure"], derived_measures)
+    dimension = _dimension(frame, plan["dimension"])
+    if measure is None or dimension is None:
+        return None
+    values, is_money, is_additive = measure
+
+    grouped = values.groupby(frame.label_column(dimension), sort=False, observed=True)
+    totals = (grouped.sum() if is_additive else grouped.mean()).dropna()
+    if totals.empty:
+        return None
+    ranked = totals.sort_values(ascending=plan["ascending"]).head(plan["n"])
+
+    measure_label = f"{'total' if is_additive else 'average'} {_clean_phrase(plan['measure'])}"
+    if len(ranked) == 1:
+        name, total = next(iter(ranked.items()))
+        rank = "lowest" if plan["ascending"] else "highest"
+        return f"{name} has the {rank} {measure_label} with {_fmt(total, is_money)} {SOURCE_NOTE}."
+
+    heading = "Bottom" if plan["ascending"] else "Top"
+    listed = "; ".join(f"{i}. {name}: {_fmt(total, is_money)}" for i, (name, total) in enumerate(ranked.items(), 1))
+    return f"{heading} {len(ranked)} {_clean_phrase(plan['dimension'])} by {measure_label}: {listed} {SOURCE_NOTE}."
+
+
+def _total_in_month(
+    plan: Dict[str, Any],
+    frame: ChatFrame,
+    date_concepts: Tuple[str, ...],
+    derived_measures: Dict[str, Optional[pd.Series]]
+) -> Optional[str]:
+    measure = _measure(frame, plan["measure"], derived_measures)
+    dates = frame.dates(*date_concepts) if date_concepts else None
+    if measure is None or dates is None or not measure[2]:
+        return None
+    values, is_money, _ = measure
+
+    in_month = dates.dt.month == plan["month"]
+    year = plan["year"]
+    if year is None:
+        # A bare month means its latest occurrence in the data
+        years = dates[in_month].dt.year
+        if years.empty:
+            return f"No records are dated in {calendar.month_name[plan['month']]} {SOURCE_NOTE}."
+        year = int(years.max())
+    selected = in_month & (dates.dt.year == year)
+
+    period = f"{calendar.month_name[plan['month']]} {year}"
+    rows = int(selected.sum())
+    if not rows:
+        return f"No records are dated in {period} {SOURCE_NOTE}."
+    total = float(values[selected].sum())
+    return f"Total {_clean_phrase(plan['measure'])} in {period}: {_fmt(total, is_money)} across {rows:,} records {SOURCE_NOTE}."
+
+
+def _average_per(plan: Dict[str, Any], frame: ChatFrame, derived_measures: Dict[str, Optional[pd.Series]]) -> Optional[str]:
+    measure = _measure(frame, plan["measure"], derived_measures)
+    dimension = _dimension(frame, plan["dimension"])
+    if measure is None or dimension is None:
+        return None
+    values, is_money, _ = measure
+
+    averages = values.groupby(frame.label_column(dimension), sort=False, observed=True).mean().dropna()
+    if averages.empty:
+        return None
+    ranked = averages.sort_values(ascending=False)
+
+    listed = "; ".join(f"{name}: {_fmt(avg, is_money)}" for name, avg in ranked.head(GROUPS_SHOWN).items())
+    shown = f" (highest {GROUPS_SHOWN} of {len(ranked):,} shown)" if len(ranked) > GROUPS_SHOWN else ""
+    return f"Average {_clean_phrase(plan['measure'])} per {_clean_phrase(plan['dimension'])}{shown}: {listed} {SOURCE_NOTE}."
+
+
+def _compare(
+    plan: Dict[str, Any],
+    frame: ChatFrame,
+    default_measure: str,
+    derived_measures: Dict[str, Optional[pd.Series]]
+) -> Optional[str]:
+    left, right = plan["left"], plan["right"]
+
+    located = frame.find_values(left, right)
+    if located is None:
+        # Two measures rather than two groups: "compare revenue vs expenses"
+        if plan["measure"] or not plan["explicit"]:
+            return None
+        left_measure = _measure(frame, left, derived_measures)
+        right_measure = _measure(frame, right, derived_measures)
+        if left_measure is None or right_measure is None or left_measure[0] is right_measure[0]:
+            return None
+        if left_measure[1] != right_measure[1] or not (left_measure[2] and right_measure[2]):
+            return None  # An amount against a count, or a total of rates, has no meaningful difference
+        left_total, right_total = float(left_measure[0].sum()), float(right_measure[0].sum())
+        return (
+            f"Total {_clean_phrase(left)}: {_fmt(left_total, left_measure[1])}; "
+            f"total {_clean_phrase(right)}: {_fmt(right_total, right_measure[1])}. "
+            f"{_difference(_clean_phrase(left), _clean_phrase(right), left_total, right_total, left_measure[1])} {SOURCE_NOTE}."
+        )
+
+    measure_phrase = plan["measure"] or default_measure
+    measure = _measure(frame, measure_phrase, derived_measures) if measure_phrase else None
+    if measure is None:
+        return None
+    values, is_money, is_additive = measure
+    col, (left_value, right_value) = located
+    labels = frame.label_column(col)
+
+    parts, totals = [], []
+    for value in (left_value, right_value):
+        selected = labels == value
+        average = _fmt(float(values[selected].mean()), is_money)
+        if is_additive:
+            total = float(values[selected].sum())
+            parts.append(f"{value}: {_fmt(total, is_money)} total {_clean_phrase(measure_phrase)} over {int(selected.sum()):,} records "
+                         f"(average {average})")
+        else:
+            # Ratings and rates are compared on their averages
+            total = float(values[selected].mean())
+            parts.append(f"{value}: average {_clean_phrase(measure_phrase)} {average} over {int(selected.sum()):,} records")
+        totals.append(total)
+    return f"{'; '.join(parts)}. {_difference(str(left_value), str(right_value), totals[0], totals[1], is_money)} {SOURCE_NOTE}."
+
+
+def _difference(left: str, right: str, left_total: float, right_total: float, is_money: bool) -> str:
+    if left_total == right_total:
+        sentence = f"{left} and {right} are equal"
+    else:
+        higher, lower = (left, right) if left_total > right_total else (right, left)
+        gap = abs(left_total - right_total)
+        base = min(abs(left_total), abs(right_total))
+        share = f" ({gap / base * 100:,.1f}%)" if base else ""
+        sentence = f"{higher} is higher than {lower} by {_fmt(gap, is_money)}{share}"
+    return sentence[:1].upper() + sentence[1:]
@@ -0,0 +1,278 @@
+from langgraph.graph import StateGraph, END
+from typing import TypedDict, List, Dict, Any, Optional, AsyncIterator, Tuple
+from app.utils.logger import logger
+from fastapi import HTTPException
+from app.services.llm_gateway_service import llm_gateway, INTERACTIVE
+from app.services.chat_frame import ChatFrame
+from app.services.chat_query_planner import plan_query, execute_plan, is_aggregate_question
+from app.services.answer_cache_service import answer_cache_service
+from app.services.retrieval_index_service import RowIndex
+from app.services.conversation_memory_service import conversation_memory_service
+from app.services.token_budget_service import token_budget_service
+from app.config.settings import settings
+from app.utils.metrics import chat_answers
+import pandas as pd
+import json
+import re
+
+CONTROL_CHARS = re.compile(r'[\x00-\x1F\x7F]')
+
+class ChatState(TypedDict):
+    file_id: str
+    user_id: str
+    question: str
+    analysis_data: Dict
+    raw_data: List[Dict[str, Any]]
+    chat_history: List[Dict[str, str]]
+    frame: Optional[ChatFrame]
+    row_index: Optional[RowIndex]
+    analysis_version: Optional[str]
+    answer: str
+
+class ChatServiceBase:
+    """
+    Shared flow of the per-domain chat services: answer aggregate questions with the query
+    planner or a deterministic fast path when the question matches one, then from the answer
+    cache when the file's analysis version is known, otherwise ask Mixtral with a context
+    built from the insights (rendered once per analysis and stored with it), the conversation
+    memory and the sheet rows the row index ranks highest for the question, packed under fixed
+    token budgets. Subclasses provide the fast paths, the context and the prompt, and name the
+    analysis service whose column mapping the sheet is queried with.
+    """
+    spreadsheet_type = ""
+    analysis_service_class = None
+    # Query planner slots: where "in <month>" looks for dates, and what "compare X vs Z" measures
+    date_concepts: Tuple[str, ...] = ("date",)
+    default_measure = ""
+    # Bump when _build_context's output changes; contexts stored with analyses under another version are re-rendered
+    context_version = 1
+    model = "mistralai/Mixtral-8x7B-Instruct-v0.1"
+    max_tokens = 500
+
+    def __init__(self):
+        self.client = llm_gateway
+        self.analysis_service = self.analysis_service_class()
+        # Compiled once; the graph holds no per-request state, so concurrent chats can share it
+        self.graph = self._build_graph()
+
+    def _build_graph(self):
+        workflow = StateGraph(ChatState)
+        workflow.add_node("generate_answer", self._generate_answer)
+        workflow.set_entry_point("generate_answer")
+        workflow.add_edge("generate_answer", END)
+        return workflow.compile()
+
+    @property
+    def context_key(self) -> str:
+        return f"{self.spreadsheet_type.lower()}:{self.context_version}"
+
+    def render_context(self, insights: Dict, ai_insights: Dict) -> Dict[str, str]:
+        """Insights context for the prompts, rendered once per analysis and stored with it"""
+        return {"version": self.context_key, "text": self._build_context(insights, ai_insights)}
+
+    def context_is_current(self, chat_context: Optional[Dict[str, str]]) -> bool:
+        return isinstance(chat_context, dict) and chat_context.get("version") == self.context_key and "text" in chat_context
+
+    def frame_for(self, raw_data: List[Dict[str, Any]]) -> ChatFrame:
+        """Columnar view of raw_data for the fast paths; callers keep it with the cached analysis"""
+        return ChatFrame(raw_data, self.analysis_service)
+
+    async def process_chat(
+        self,
+        file_id: str,
+        user_id: str,
+        question: str,
+        analysis_data: Dict,
+        raw_data: List[Dict[str, Any]],
+        chat_history: List[Dict[str, str]],
+        frame: Optional[ChatFrame] = None,
+        analysis_version: Optional[str] = None,
+        row_index: Optional[RowIndex] = None
+    ) -> str:
+        try:
+            initial_state = {
+                "file_id": file_id,
+                "user_id": user_id,
+                "question": question,
+                "analysis_data": analysis_data,
+                "raw_data": raw_data,
+                "chat_history": chat_history,
+                "frame": frame,
+                "row_index": row_index,
+                "analysis_version": analysis_version,
+                "answer": ""
+            }
+
+            result = await self.graph.ainvoke(initial_state)
+            return result["answer"]
+
+        except Exception as e:
+            logger.error(f"Failed to process {self.spreadsheet_type} chat: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"{self.spreadsheet_type} chat processing error: {str(e)}")
+
+    async def stream_chat(
+        self,
+        file_id: str,
+        user_id: str,
+        question: str,
+        analysis_data: Dict,
+        raw_data: List[Dict[str, Any]],
+        chat_history: List[Dict[str, str]],
+        frame: Optional[ChatFrame] = None,
+        analysis_version: Optional[str] = None,
+        row_index: Optional[RowIndex] = None
+    ) -> AsyncIterator[str]:
+        """
+        Same answer as process_chat, yielded as it is generated: a local or cached answer
+        arrives in one piece, an LLM answer token by token.
+        """
+        question, local_answer, messages = self._prepare(
+            question, analysis_data, raw_data, chat_history, frame, file_id, analysis_version, row_index, user_id
+        )
+        if local_answer is not None:
+            yield local_answer
+            return
+        parts = []
+        async for delta in self.client.stream(
+            priority=INTERACTIVE,
+            model=self.model,
+            messages=messages,
+            max_tokens=self.max_tokens,
+            temperature=0.1
+        ):
+            parts.append(delta)
+            yield delta
+        answer_cache_service.put(file_id, analysis_version, question, "".join(parts).strip(), has_history=bool(chat_history))
+
+    async def _generate_answer(self, state: ChatState) -> Dict[str, str]:
+        question, local_answer, messages = self._prepare(
+            state.get("question", ""),
+            state.get("analysis_data", {}),
+            state.get("raw_data", []),
+            state.get("chat_history", []),
+            state.get("frame"),
+            state.get("file_id", ""),
+            state.get("analysis_version"),
+            state.get("row_index"),
+            state.get("user_id", "")
+        )
+        if local_answer is not None:
+            return {"answer": local_answer}
+
+        response = await self.client.create(
+            priority=INTERACTIVE,
+            model=self.model,
+            messages=messages,
+            max_tokens=self.max_tokens,
+            temperature=0.1
+        )
+
+        if not response.choices or not response.choices[0].message.content:
+            logger.error("Invalid response from API")
+            raise HTTPException(status_code=500, detail="Invalid response from AI model")
+
+        answer = response.choices[0].message.content.strip()
+        answer_cache_service.put(state.get("file_id", ""), state.get("analysis_version"), question, answer, has_history=bool(state.get("chat_history")))
+        logger.info(f"Generated {self.spreadsheet_type} answer using {len(list(state.get('analysis_data', {}).get('insights', {}).keys()))} insight keys")
+        return {"answer": answer}
+
+    def _prepare(
+        self,
+        question: str,
+        analysis_data: Dict,
+        raw_data: List[Dict[str, Any]],
+        chat_history: List[Dict[str, str]],
+        frame: Optional[ChatFrame] = None,
+        file_id: str = "",
+        analysis_version: Optional[str] = None,
+        row_index: Optional[RowIndex] = None,
+        user_id: str = ""
+    ) -> Tuple[str, Optional[str], Optional[List[Dict[str, str]]]]:
+        """(clean question, local or cached answer or None, LLM messages or None)"""
+        if frame is None:
+            frame = self.frame_for(raw_data)
+        insights = analysis_data.get("insights", {})
+        ai_insights = analysis_data.get("ai_insights", {})
+        question = CONTROL_CHARS.sub('', question.strip())
+
+        plan = plan_query(question)
+        if plan is not None:
+            planned_answer = execute_plan(plan, frame, self.date_concepts, self.default_measure, self._derived_measures(frame))
+            if planned_answer is not None:
+                chat_answers.inc(spreadsheet_type=self.spreadsheet_type, route="plan")
+                return question, planned_answer, None
+
+        # A planned shape the planner declined ("top 5 products by revenue last quarter") goes on to the
+        # LLM; the keyword fast paths would answer it without its qualifier
+        fast_answer = None if is_aggregate_question(question) else self._fast_answer(question, insights, frame)
+        if fast_answer is not None:
+            chat_answers.inc(spreadsheet_type=self.spreadsheet_type, route="fast_path")
+            return question, fast_answer, None
+
+        cached_answer = answer_cache_service.get(file_id, analysis_version, question, has_history=bool(chat_history))
+        if cached_answer is not None:
+            chat_answers.inc(spreadsheet_type=self.spreadsheet_type, route="cache")
+            return question, cached_answer, None
+
+        chat_answers.inc(spreadsheet_type=self.spreadsheet_type, route="llm")
+        stored = analysis_data.get("chat_context")
+        context = stored["text"] if self.context_is_current(stored) else self._build_context(insights, ai_insights)
+        conversation = conversation_memory_service.context(file_id, user_id, chat_history)
+        context = self._pack_context(question, context, conversation, raw_data, row_index)
+        return question, None, self._build_messages(question, context)
+
+    def _pack_context(
+        self,
+        question: str,
+        context: str,
+        conversation: str,
+        raw_data: List[Dict[str, Any]],
+        row_index: Optional[RowIndex]
+    ) -> str:
+        """
+        Insights context and the rows most relevant to the question, within chat_context_tokens,
+        with the conversation memory (budgeted on its own) between them. Whole lines are kept or
+        dropped, so no figure is cut mid-number.
+        """
+        budget = settings.chat_context_tokens
+        lines, used = [], 0
+        for line in context.split("\n") if context else []:
+            tokens = token_budget_service.count_tokens(line) + 1
+            if used + tokens > budget:
+                logger.warning("Chat context over budget; dropping trailing lines", spreadsheet_type=self.spreadsheet_type, kept=len(lines), budget=budget)
+                break
+            lines.append(line)
+            used += tokens
+        if conversation:
+            lines.append(conversation)
+
+        if row_index is not None:
+            matches = row_index.search(question, settings.chat_retrieval_rows)
+            rows = []
+            for position in matches:
+                row = json.dumps(raw_data[position], ensure_ascii=False, default=str)
+                tokens = token_budget_service.count_tokens(row) + 1
+                if used + tokens > budget:
+                    break
+                rows.append(row)
+                used += tokens
+            if rows:
+                lines.append(f"Relevant Rows ({len(rows)} of {len(raw_data):,}, best match first):")
+                lines.extend(rows)
+            logger.info("Retrieved rows for chat", spreadsheet_type=self.spreadsheet_type, matched=len(matches), included=len(rows), context_tokens=used)
+        return "\n".join(lines)
+
+    # ---------- Per-domain hooks ----------
+    def _fast_answer(self, question: str, insights: Dict, frame: ChatFrame) -> Optional[str]:
+        """Answer computed locally for recognised questions; None sends the question to the LLM"""
+        return None
+
+    def _derived_measures(self, frame: ChatFrame) -> Dict[str, Optional[pd.Series]]:
+        """Currency measures the planner can use that are computed rather than mapped, by name"""
+        return {}
+
+    def _build_context(self, insights: dict, ai_insights: dict) -> str:
+        raise NotImplementedError
+
+    def _build_messages(self, question: str, context: str) -> List[Dict[str, str]]:
+        raise NotImplementedError
@@ -0,0 +1,140 @@
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+from app.config.settings import settings
+from app.services.llm_gateway_service import llm_gateway, BATCH
+from app.services.token_budget_service import token_budget_service
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+import threading
+import re
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _turn_text(turn: Dict[str, Any]) -> str:
+    return f"Q: {turn.get('question') or ''}\nA: {(turn.get('answer') or '').strip()}"
+
+
+class ConversationMemoryService:
+    """
+    Conversation memory for the chat prompts, per (file_id, user_id): the latest turns quoted
+    verbatim, packed newest first under chat_history_tokens, and a rolling summary of every
+    turn before them, capped at chat_summary_tokens. After each turn the turns that have left
+    the verbatim window are folded into the summary with one batch-priority LLM call, so the
+    conversation part of a prompt stays the same size however long the chat runs.
+
+    Summaries live in memory. A conversation without one (new, or after a restart) gets one
+    from its older turns on the next update.
+    """
+    model = "mistralai/Mixtral-8x7B-Instruct-v0.1"
+    max_fold_tokens = 6000  # Older turns sent to a single summary update, newest kept
+
+    def __init__(self, max_conversations: Optional[int] = None):
+        self.max_conversations = max_conversations if max_conversations is not None else settings.conversation_memory_max
+        # (file_id, user_id) -> {"summary": str, "through": created_at of the last summarized turn}
+        self._memories: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def context(self, file_id: str, user_id: str, chat_history: List[Dict[str, Any]]) -> str:
+        """Conversation block for a prompt: the rolling summary, then the recent turns oldest first"""
+        with self._lock:
+            memory = self._memories.get((file_id, user_id))
+            if memory is not None:
+                self._memories.move_to_end((file_id, user_id))
+        recent = self._recent(chat_history)
+        parts = []
+        if memory and memory["summary"]:
+            parts.append(f"Earlier conversation (summary): {memory['summary']}")
+        if recent:
+            parts.append("Recent conversation:\n" + "\n".join(_turn_text(turn) for turn in recent))
+        return "\n".join(parts)
+
+    async def update(self, file_id: str, user_id: str, spreadsheet_type: str, chat_history: List[Dict[str, Any]]) -> None:
+        """Fold the turns that no longer fit the verbatim window into the summary; chat_history ends with the new turn"""
+        key = (file_id, user_id)
+        with self._lock:
+            memory = dict(self._memories.get(key) or {"summary": "", "through": None})
+        older = chat_history[:len(chat_history) - len(self._recent(chat_history))]
+        pending = [turn for turn in older if memory["through"] is None or str(turn.get("created_at") or "") > memory["through"]]
+        if not pending:
+            return
+
+        # Newest first under the fold budget; anything older than that is left out of the summary
+        selected, used = [], 0
+        for turn in reversed(pending):
+            tokens = token_budget_service.count_tokens(_turn_text(turn))
+            if selected and used + tokens > self.max_fold_tokens:
+                break
+            selected.insert(0, turn)
+            used += tokens
+
+        summary = await self._fold(memory["summary"], selected, spreadsheet_type, file_id)
+        through = str(pending[-1].get("created_at") or "")
+        with self._lock:
+            current = self._memories.get(key)
+            if current is not None and current["through"] is not None and current["through"] >= through:
+                return  # A concurrent update already got further
+            self._memories[key] = {"summary": summary, "through": through}
+            self._memories.move_to_end(key)
+            while len(self._memories) > self.max_conversations:
+                self._memories.popitem(last=False)
+        logger.info("Updated conversation summary", file_id=file_id, user_id=user_id, folded_turns=len(selected), summary_tokens=token_budget_service.count_tokens(summary))
+
+    def forget(self, file_id: str) -> None:
+        with self._lock:
+            keys = [key for key in self._memories if key[0] == file_id]
+            for key in keys:
+                del self._memories[key]
+
+    def stats(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return {(): len(self._memories)}
+
+    def _recent(self, chat_history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Latest turns, oldest first, that fit chat_history_tokens together"""
+        recent, used = [], 0
+        for turn in reversed(chat_history):
+            used += token_budget_service.count_tokens(_turn_text(turn)) + 1
+            if used > settings.chat_history_tokens:
+                break
+            recent.insert(0, turn)
+        return recent
+
+    async def _fold(self, summary: str, turns: List[Dict[str, Any]], spreadsheet_type: str, file_id: str) -> str:
+        limit = settings.chat_summary_tokens
+        prompt = (
+            f"Running summary of a conversation about a {spreadsheet_type} spreadsheet:\n{summary or '(empty)'}\n\n"
+            "New exchanges to add:\n" + "\n".join(_turn_text(turn) for turn in turns) + "\n\n"
+            f"Rewrite the summary to cover both, in at most {limit * 2 // 3} words. Keep the figures, names and periods "
+            "that were discussed and what the user was trying to find out. Reply with the summary only."
+        )
+        try:
+            response = await llm_gateway.create(
+                priority=BATCH,
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=limit,
+                temperature=0.1
+            )
+            folded = (response.choices[0].message.content or "").strip() if response.choices else ""
+        except Exception as e:
+            logger.warning("Conversation summary update failed; summarizing locally", error=str(e), file_id=file_id)
+            folded = ""
+        if not folded:
+            # Without the model, remember what was asked and the first sentence of each answer
+            folded = " ".join(
+                [summary] + [f"Asked: {t.get('question')} Answer: {SENTENCE_END.split((t.get('answer') or '').strip())[0]}" for t in turns]
+            ).strip()
+        return self._fit(folded, limit)
+
+    def _fit(self, text: str, limit: int) -> str:
+        """Drop leading sentences until text fits limit tokens, keeping the most recent content"""
+        sentences = SENTENCE_END.split(text)
+        while len(sentences) > 1 and token_budget_service.count_tokens(" ".join(sentences)) > limit:
+            sentences.pop(0)
+        return " ".join(sentences)
+
+
+conversation_memory_service = ConversationMemoryService()
+
+metrics.gauge("conversation_memories", "Conversations with a rolling summary in memory", (), callback=conversation_memory_service.stats)
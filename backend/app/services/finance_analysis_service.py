@@ -2,6 +2,8 @@ import pandas as pd
 import numpy as np
 from typing import Dict, Any, List, Optional, Tuple, Union
 from app.utils.logger import logger
+from app.utils.timing import timed
+from app.services.forecasting_service import forecasting_service
 import re
 from datetime import datetime
 
@@ -111,6 +113,7 @@ class FinanceAnalysisService:
             ]
         }
 
+    @timed("finance.compute_finance_insights")
     def compute_finance_insights(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Compute comprehensive financial insights from the dataframe"""
         try:
@@ -378,6 +381,7 @@ class FinanceAnalysisService:
         """Check if time trend analysis is possible"""
         return mappings.get('date') is not None and mappings.get('amount') is not None
 
+    @timed("finance.analyze_general_transactions")
     def _analyze_general_transactions(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze general transaction patterns regardless of specific categories"""
         insights = {}
@@ -433,6 +437,7 @@ class FinanceAnalysisService:
 
     # Keep all existing analysis methods but improve them with better error handling and flexibility
     
+    @timed("finance.analyze_revenue_metrics")
     def _analyze_revenue_metrics(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze revenue metrics and trends with improved flexibility"""
         insights = {}
@@ -515,6 +520,7 @@ class FinanceAnalysisService:
         
         return insights
 
+    @timed("finance.analyze_expense_metrics")
     def _analyze_expense_metrics(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze expense metrics and patterns with improved flexibility"""
         insights = {}
@@ -698,6 +704,7 @@ class FinanceAnalysisService:
         
         return available
 
+    @timed("finance.analyze_profitability_metrics")
     def _analyze_profitability_metrics(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze profitability and profit margins with improved flexibility"""
         insights = {}
@@ -781,6 +788,7 @@ class FinanceAnalysisService:
         
         return insights
 
+    @timed("finance.analyze_cashflow_metrics")
     def _analyze_cashflow_metrics(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze cash flow patterns with improved detection"""
         insights = {}
@@ -865,6 +873,7 @@ class FinanceAnalysisService:
         
         return insights
 
+    @timed("finance.analyze_budget_variance")
     def _analyze_budget_variance(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze budget vs actual performance with enhanced insights"""
         insights = {}
@@ -935,6 +944,7 @@ class FinanceAnalysisService:
         
         return insights
 
+    @timed("finance.analyze_account_performance")
     def _analyze_account_performance(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze performance by account with enhanced metrics"""
         insights = {}
@@ -991,6 +1001,7 @@ class FinanceAnalysisService:
         
         return insights
 
+    @timed("finance.analyze_department_financials")
     def _analyze_department_financials(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze financial performance by department/segment with enhanced insights"""
         insights = {}
@@ -1072,6 +1083,7 @@ class FinanceAnalysisService:
         
         return insights
 
+    @timed("finance.analyze_vendor_customer_metrics")
     def _analyze_vendor_customer_metrics(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze vendor and customer financial metrics with enhanced insights"""
         insights = {}
@@ -1177,6 +1189,7 @@ class FinanceAnalysisService:
         
         return insights
 
+    @timed("finance.analyze_financial_trends")
     def _analyze_financial_trends(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze financial trends over time with enhanced insights"""
         insights = {}
@@ -1226,6 +1239,15 @@ class FinanceAnalysisService:
                     'average_transaction': float(row['mean'])
                 })
             
+            # Local forecasts with prediction intervals, overall and per category
+            amount_forecast = forecasting_service.forecast_frame(df_trends, date_col, amount_col)
+            if amount_forecast:
+                insights['amount_forecast'] = amount_forecast
+            if category_col and category_col in df_trends.columns:
+                category_forecasts = forecasting_service.forecast_frame(df_trends, date_col, amount_col, group_col=category_col, group_label='category')
+                if category_forecasts:
+                    insights['amount_forecast_by_category'] = category_forecasts
+            
             # Calculate month-over-month growth
             if len(monthly_trends) > 1:
                 monthly_amounts = monthly_trends['sum']
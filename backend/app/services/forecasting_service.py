@@ -0,0 +1,168 @@
+import pandas as pd
+import numpy as np
+from typing import Dict, Any, Optional, Tuple
+from app.utils.logger import logger
+
+
+class ForecastingService:
+    """
+    Monthly forecasts with prediction intervals, fitted for many series at once.
+    Each row of the input matrix is one series (e.g. one product); smoothing runs
+    over time with numpy operations across all rows.
+    """
+
+    def __init__(self):
+        self.season_length = 12
+        self.horizon = 3
+        self.z_score = 1.96  # 95% prediction interval
+        self.max_groups = 20
+        self.alphas = [0.2, 0.5, 0.8]
+        self.betas = [0.05, 0.2]
+        self.gammas = [0.1, 0.3]
+
+    def forecast_frame(
+        self,
+        df: pd.DataFrame,
+        date_col: str,
+        value_col: str,
+        group_col: Optional[str] = None,
+        group_label: Optional[str] = None,
+        horizon: Optional[int] = None
+    ) -> Any:
+        """
+        Forecast monthly sums of value_col. Returns one forecast dict, or a list of
+        {group_label: name, ...forecast} for the largest groups when group_col is given.
+        """
+        horizon = horizon or self.horizon
+        dates = df[date_col] if pd.api.types.is_datetime64_any_dtype(df[date_col]) else pd.to_datetime(df[date_col], errors='coerce')
+        values = pd.to_numeric(df[value_col], errors='coerce')
+        frame = pd.DataFrame({
+            'month': dates.dt.to_period('M'),
+            'value': values,
+            'group': df[group_col].astype(str) if group_col else 'all'
+        }).dropna(subset=['month', 'value'])
+        if frame.empty:
+            return None if group_col is None else []
+
+        matrix = frame.groupby(['group', 'month'])['value'].sum().unstack(fill_value=0.0)
+        # Months without activity are zero, not missing
+        full_range = pd.period_range(matrix.columns.min(), matrix.columns.max(), freq='M')
+        matrix = matrix.reindex(columns=full_range, fill_value=0.0)
+        if group_col:
+            matrix = matrix.loc[matrix.sum(axis=1).nlargest(self.max_groups).index]
+
+        result = self.forecast_matrix(matrix.to_numpy(dtype=float), horizon)
+        if result is None:
+            return None if group_col is None else []
+
+        logger.debug("Forecast fitted", value_col=value_col, group_col=group_col, series=len(matrix), months=len(full_range))
+        future = [str(full_range[-1] + h) for h in range(1, horizon + 1)]
+        forecasts = []
+        for row, group in enumerate(matrix.index):
+            forecast = {
+                'method': result['method'][row],
+                'history_months': len(full_range),
+                'interval': 0.95,
+                'forecast': [
+                    {
+                        'month': future[h],
+                        'value': round(float(result['point'][row, h]), 2),
+                        'lower': round(float(result['lower'][row, h]), 2),
+                        'upper': round(float(result['upper'][row, h]), 2)
+                    }
+                    for h in range(horizon)
+                ]
+            }
+            forecasts.append({(group_label or group_col): group, **forecast} if group_col else forecast)
+        return forecasts if group_col else forecasts[0]
+
+    def forecast_matrix(self, Y: np.ndarray, horizon: int) -> Optional[Dict[str, Any]]:
+        """
+        Y is (series, months). Holt-Winters (additive) with two or more seasons of history,
+        Holt's linear trend otherwise; with at least one season plus a month, seasonal naive
+        is used for the series where it fits the history better. Parameters are picked per
+        series from a small grid by in-sample one-step error.
+        """
+        n_series, n_months = Y.shape
+        if n_months < 3:
+            return None
+
+        m = self.season_length
+        seasonal = n_months >= 2 * m
+        candidates = []
+        for alpha in self.alphas:
+            for beta in self.betas:
+                for gamma in (self.gammas if seasonal else [None]):
+                    candidates.append(self._smooth(Y, horizon, alpha, beta, gamma, m if seasonal else None))
+
+        mse = np.stack([c[0] for c in candidates])  # (candidates, series)
+        best = np.argmin(mse, axis=0)
+        rows = np.arange(n_series)
+        point = np.stack([c[1] for c in candidates])[best, rows]
+        sigma = np.sqrt(mse[best, rows])
+        method = np.array(['holt_winters' if seasonal else 'holt_linear'] * n_series, dtype=object)
+
+        if not seasonal and n_months > m:
+            naive_point, naive_mse = self._seasonal_naive(Y, horizon, m)
+            use_naive = naive_mse < mse[best, rows]
+            point = np.where(use_naive[:, None], naive_point, point)
+            sigma = np.where(use_naive, np.sqrt(naive_mse), sigma)
+            method = np.where(use_naive, 'seasonal_naive', method)
+
+        steps = np.arange(1, horizon + 1)
+        half_width = self.z_score * sigma[:, None] * np.sqrt(steps)[None, :]
+        lower, upper = point - half_width, point + half_width
+
+        # Non-negative histories (sales, quantities) get non-negative forecasts
+        non_negative = (Y >= 0).all(axis=1)[:, None]
+        point = np.where(non_negative, np.maximum(point, 0), point)
+        lower = np.where(non_negative, np.maximum(lower, 0), lower)
+
+        return {'point': point, 'lower': lower, 'upper': upper, 'method': list(method)}
+
+    def _smooth(self, Y: np.ndarray, horizon: int, alpha: float, beta: float, gamma: Optional[float], m: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """One parameter set for every series: returns (one-step MSE per series, forecasts)"""
+        n_series, n_months = Y.shape
+        if m:
+            level = Y[:, :m].mean(axis=1)
+            trend = (Y[:, m:2 * m].mean(axis=1) - level) / m
+            # Seasonal indices net of the trend inside the first season
+            season = Y[:, :m] - (level[:, None] + trend[:, None] * (np.arange(m) - (m - 1) / 2))
+            start = m  # The first season only initializes the model
+            level = level + trend * (m - 1) / 2  # First-season mean sits at its midpoint
+        else:
+            level = Y[:, 0].copy()
+            trend = Y[:, 1] - Y[:, 0]
+            season = None
+            start = 1
+
+        sq_error = np.zeros(n_series)
+        for t in range(start, n_months):
+            y = Y[:, t]
+            s = season[:, t % m] if m else 0.0
+            error = y - (level + trend + s)
+            sq_error += error ** 2
+            new_level = alpha * (y - s) + (1 - alpha) * (level + trend)
+            trend = beta * (new_level - level) + (1 - beta) * trend
+            if m:
+                season[:, t % m] = gamma * (y - new_level) + (1 - gamma) * s
+            level = new_level
+
+        steps = np.arange(1, horizon + 1)
+        forecast = level[:, None] + trend[:, None] * steps[None, :]
+        if m:
+            forecast = forecast + season[:, (n_months + steps - 1) % m]
+        mse = sq_error / max(1, n_months - start)
+        return mse, forecast
+
+    def _seasonal_naive(self, Y: np.ndarray, horizon: int, m: int) -> Tuple[np.ndarray, np.ndarray]:
+        n_months = Y.shape[1]
+        errors = Y[:, m:] - Y[:, :-m]
+        mse = (errors ** 2).mean(axis=1)
+        steps = np.arange(1, horizon + 1)
+        # Same month one season back; for horizons beyond a season, repeat the last season
+        index = n_months - m + (steps - 1) % m
+        return Y[:, index], mse
+
+
+forecasting_service = ForecastingService()
@@ -2,6 +2,7 @@ import pandas as pd
 import numpy as np
 from typing import Dict, Any, List, Optional, Tuple
 from app.utils.logger import logger
+from app.utils.timing import timed
 import re
 from datetime import datetime
 
@@ -81,6 +82,7 @@ class HRAnalysisService:
             ]
         }
 
+    @timed("hr.compute_hr_insights")
     def compute_hr_insights(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Compute comprehensive HR insights from the dataframe"""
         try:
@@ -209,6 +211,7 @@ class HRAnalysisService:
     def _can_analyze_attendance(self, mappings: Dict[str, Optional[str]]) -> bool:
         return mappings.get('sick_days') is not None or mappings.get('vacation_days') is not None or mappings.get('overtime_hours') is not None
 
+    @timed("hr.analyze_workforce_composition")
     def _analyze_workforce_composition(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze overall workforce composition"""
         insights = {}
@@ -248,6 +251,7 @@ class HRAnalysisService:
         
         return insights
 
+    @timed("hr.analyze_department_metrics")
     def _analyze_department_metrics(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze department-specific metrics"""
         insights = {}
@@ -291,6 +295,7 @@ class HRAnalysisService:
         
         return insights
 
+    @timed("hr.analyze_compensation_metrics")
     def _analyze_compensation_metrics(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze compensation and salary metrics"""
         insights = {}
@@ -349,6 +354,7 @@ class HRAnalysisService:
         
         return insights
 
+    @timed("hr.analyze_performance_metrics")
     def _analyze_performance_metrics(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze employee performance metrics"""
         insights = {}
@@ -385,6 +391,7 @@ class HRAnalysisService:
         
         return insights
 
+    @timed("hr.analyze_turnover_metrics")
     def _analyze_turnover_metrics(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze employee turnover and retention metrics"""
         insights = {}
@@ -449,6 +456,7 @@ class HRAnalysisService:
         
         return insights
 
+    @timed("hr.analyze_training_metrics")
     def _analyze_training_metrics(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze training and development metrics"""
         insights = {}
@@ -489,6 +497,7 @@ class HRAnalysisService:
         
         return insights
 
+    @timed("hr.analyze_demographics")
     def _analyze_demographics(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze workforce demographics"""
         insights = {}
@@ -536,6 +545,7 @@ class HRAnalysisService:
         
         return insights
 
+    @timed("hr.analyze_attendance_metrics")
     def _analyze_attendance_metrics(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze attendance and leave metrics"""
         insights = {}
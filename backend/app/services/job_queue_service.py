@@ -0,0 +1,179 @@
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+from datetime import datetime, timezone
+from app.config.settings import settings
+from app.utils.logger import logger
+import asyncio
+import json
+import sqlite3
+import threading
+import uuid
+
+JobHandler = Callable[[Dict[str, Any], Callable[[float, str], None]], Awaitable[Dict[str, Any]]]
+
+
+class JobQueueService:
+    """
+    In-process asyncio worker pool backed by a SQLite job table.
+    Jobs survive restarts: anything still queued or running when the process died is
+    re-queued on start(), up to max_attempts.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, workers: Optional[int] = None):
+        self.db_path = db_path or settings.job_db_path
+        self.workers = workers or settings.job_workers
+        self.max_attempts = 3
+        self.handlers: Dict[str, JobHandler] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self.handlers[kind] = handler
+
+    # ---------- Lifecycle ----------
+    async def start(self) -> None:
+        self._connect()
+        self._queue = asyncio.Queue()
+        resumed = self._requeue_interrupted()
+        for job_id in resumed:
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info("Job workers started", workers=self.workers, resumed_jobs=len(resumed), db_path=self.db_path)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Job workers stopped")
+
+    def _connect(self) -> None:
+        if self._conn is not None:
+            return
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress REAL NOT NULL DEFAULT 0,
+                    stage TEXT,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_user_created ON jobs (user_id, created_at)")
+
+    def _requeue_interrupted(self) -> List[str]:
+        """Jobs left running by a crash go back to the queue; those out of attempts are failed"""
+        now = self._now()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Interrupted too many times', updated_at = ? "
+                "WHERE status = 'running' AND attempts >= ?",
+                (now, self.max_attempts)
+            )
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', stage = 'resumed', updated_at = ? WHERE status = 'running'",
+                (now,)
+            )
+            rows = self._conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at").fetchall()
+        return [row["id"] for row in rows]
+
+    # ---------- Public API ----------
+    def submit(self, kind: str, user_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self._queue is None:
+            raise RuntimeError("Job queue is not started")
+        job_id = str(uuid.uuid4())
+        now = self._now()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, user_id, payload, status, stage, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'queued', 'queued', ?, ?)",
+                (job_id, kind, user_id, json.dumps(payload), now, now)
+            )
+        self._queue.put_nowait(job_id)
+        logger.info("Job submitted", job_id=job_id, kind=kind, user_id=user_id, queue_depth=self._queue.qsize())
+        return self.get(job_id)
+
+    def get(self, job_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        query = "SELECT * FROM jobs WHERE id = ?"
+        params: tuple = (job_id,)
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params = (job_id, user_id)
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE user_id = ? ORDER BY created_at DESC LIMIT ?", (user_id, limit)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    # ---------- Workers ----------
+    async def _worker(self, worker_id: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id, worker_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Job worker error", job_id=job_id, worker=worker_id, error=str(e))
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str, worker_id: int) -> None:
+        job = self.get(job_id)
+        if job is None or job["status"] != "queued":
+            return
+        self._update(job_id, status="running", stage="started", progress=0.0, attempts=job["attempts"] + 1)
+        logger.info("Job started", job_id=job_id, kind=job["kind"], worker=worker_id, attempt=job["attempts"] + 1)
+
+        def report(progress: float, stage: str) -> None:
+            self._update(job_id, progress=max(0.0, min(1.0, progress)), stage=stage)
+
+        try:
+            result = await self.handlers[job["kind"]]({**job, "attempts": job["attempts"] + 1}, report)
+            self._update(job_id, status="succeeded", stage="done", progress=1.0, result=json.dumps(result, default=str))
+            logger.info("Job succeeded", job_id=job_id, kind=job["kind"])
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e)
+            self._update(job_id, status="failed", stage="failed", error=str(detail))
+            logger.error("Job failed", job_id=job_id, kind=job["kind"], error=str(detail))
+
+    # ---------- Storage helpers ----------
+    def _update(self, job_id: str, **fields: Any) -> None:
+        fields["updated_at"] = self._now()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def _to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"]) if job["payload"] else {}
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _now(self) -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+
+job_queue_service = JobQueueService()
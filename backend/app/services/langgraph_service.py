@@ -1,27 +1,48 @@
 from langgraph.graph import StateGraph, END
-from typing import TypedDict, Dict, Any, Literal, List
+from typing import TypedDict, Dict, Any, Literal, List, Optional, AsyncIterator
 from app.utils.logger import logger
+from app.utils.timing import span, timed
 from fastapi import HTTPException
-from together import AsyncTogether
-from app.config.settings import settings
+from app.services.token_budget_service import token_budget_service
+from app.services.llm_gateway_service import llm_gateway, BATCH
+from app.services.sampling_service import sampling_service
+from app.services.anomaly_detection_service import anomaly_detection_service
+from app.services.sales_analysis_service import SalesAnalysisService
+from app.services.retail_analysis_service import RetailAnalysisService
+from app.services.hr_analysis_service import HRAnalysisService
+from app.services.finance_analysis_service import FinanceAnalysisService
+from app.services.operations_analysis_service import OperationsAnalysisService
 import json
 import time
 import asyncio
-import math
 
 class GraphState(TypedDict):
     json_data: Dict[str, Any]
     description: str
     spreadsheet_type: Literal['Finance', 'HR', 'Operations', 'Sales', 'Retail', 'Unknown']
     insights: Dict[str, Any]
+    detected_anomalies: List[Dict[str, Any]]
+    forecasts: List[Dict[str, Any]]
 
 class LangGraphService:
     def __init__(self):
-        self.client = AsyncTogether(api_key=settings.together_api_key)
+        self.client = llm_gateway
         self.types = ['Finance', 'HR', 'Operations', 'Sales', 'Retail']
+        self.token_budget = token_budget_service
+        # Column-mapping patterns from the analysis services drive the local classifier
+        self.analysis_services = {
+            'Finance': FinanceAnalysisService(),
+            'HR': HRAnalysisService(),
+            'Operations': OperationsAnalysisService(),
+            'Sales': SalesAnalysisService(),
+            'Retail': RetailAnalysisService(),
+        }
+        self._insight_graph = None  # Compiled lazily by _get_insight_graph
 
-    def _smart_sample_data(self, json_data: Dict[str, Any], max_rows: int = 100) -> Dict[str, Any]:
+    def _smart_sample_data(self, json_data: Dict[str, Any], max_rows: int = 100, spreadsheet_type: Optional[str] = None) -> Dict[str, Any]:
         """Smart sampling with statistical distribution and column prioritization"""
+        if isinstance(json_data, dict) and json_data and all(isinstance(rows, list) for rows in json_data.values()):
+            return self._sample_sheets(json_data, max_rows, spreadsheet_type)
         if not isinstance(json_data, list):
             return {"sampled_data": json_data, "metadata": {"strategy": "no_sampling_needed"}}
         if not json_data:
@@ -31,48 +52,117 @@ class LangGraphService:
         if total_rows <= max_rows:
             return {"sampled_data": json_data, "metadata": {"strategy": "full_data", "total_rows": total_rows}}
         
-        # Step 1: Column prioritization
-        priority_data = self._prioritize_columns(json_data)
-        filtered_data = priority_data["priority_data"]
-        
-        # Step 2: Statistical sampling - take from beginning, middle, end + some random
-        beginning_size = max_rows // 4
-        middle_size = max_rows // 4  
-        end_size = max_rows // 4
-        random_size = max_rows - beginning_size - middle_size - end_size
-        
-        # Beginning sample
-        beginning = filtered_data[:beginning_size]
-        
-        # Middle sample
-        middle_start = total_rows // 2 - middle_size // 2
-        middle_end = middle_start + middle_size
-        middle = filtered_data[middle_start:middle_end]
-        
-        # End sample
-        end = filtered_data[-end_size:]
-        
-        # Random sample from remaining data
-        import random
-        remaining_indices = list(range(beginning_size, middle_start)) + list(range(middle_end, total_rows - end_size))
-        if remaining_indices and random_size > 0:
-            random_indices = random.sample(remaining_indices, min(random_size, len(remaining_indices)))
-            random_sample = [filtered_data[i] for i in random_indices]
-        else:
-            random_sample = []
-        
-        sampled_data = beginning + middle + end + random_sample
-        
+        # Step 1: Stratified sampling over the full rows, keeping rare groups and numeric extremes
+        column_mapper = self.analysis_services.get(spreadsheet_type) if spreadsheet_type else None
+        sampling = sampling_service.sample_records(json_data, max_rows, column_mapper=column_mapper)
+
+        # Step 2: Column prioritization on the sample only
+        priority_data = self._prioritize_columns(sampling["sampled_data"])
+        sampled_data = priority_data["priority_data"]
+
         metadata = {
-            "strategy": "smart_sampling",
-            "total_rows": total_rows,
+            **sampling["metadata"],
             "sampled_rows": len(sampled_data),
-            "sampling_sections": ["beginning", "middle", "end", "random"],
             "column_info": priority_data["column_info"]
         }
         
         return {"sampled_data": sampled_data, "metadata": metadata}
 
+    def _sample_sheets(self, sheets: Dict[str, List[Dict[str, Any]]], max_rows: int, spreadsheet_type: Optional[str] = None) -> Dict[str, Any]:
+        """Sample a {sheet_name: [rows]} workbook, splitting the row budget across sheets"""
+        sizes = {name: len(rows) for name, rows in sheets.items()}
+        weights = {name: sizes[name] * self._sheet_information_score(rows) for name, rows in sheets.items()}
+        allocation = self._allocate_row_budget(sizes, weights, max_rows)
+
+        sampled_data = {}
+        sheet_metadata = {}
+        for name, rows in sheets.items():
+            if allocation[name] == 0 and rows:
+                # Budget exhausted by heavier sheets; the sheet is listed but contributes no rows
+                sampled_data[name] = []
+                sheet_metadata[name] = {"strategy": "no_budget", "total_rows": sizes[name], "sampled_rows": 0, "allocated_rows": 0}
+                continue
+            result = self._smart_sample_data(rows, max_rows=allocation[name], spreadsheet_type=spreadsheet_type)
+            sampled = result["sampled_data"]
+            metadata = dict(result["metadata"])
+            # Sheets small enough to keep whole still get their columns prioritized
+            if metadata.get("strategy") == "full_data" and sampled:
+                prioritized = self._prioritize_columns(sampled)
+                sampled = prioritized["priority_data"]
+                metadata["column_info"] = prioritized["column_info"]
+            metadata["total_rows"] = sizes[name]
+            metadata["sampled_rows"] = len(sampled)
+            metadata["allocated_rows"] = allocation[name]
+            sampled_data[name] = sampled
+            sheet_metadata[name] = metadata
+
+        total_rows = sum(sizes.values())
+        sampled_rows = sum(meta["sampled_rows"] for meta in sheet_metadata.values())
+        metadata = {
+            "strategy": "multi_sheet_sampling" if sampled_rows < total_rows else "full_data",
+            "total_rows": total_rows,
+            "sampled_rows": sampled_rows,
+            "sheets": sheet_metadata,
+            "column_info": {
+                "kept_columns": sum(meta.get("column_info", {}).get("kept_columns", 0) for meta in sheet_metadata.values()),
+                "total_columns": sum(meta.get("column_info", {}).get("total_columns", 0) for meta in sheet_metadata.values())
+            }
+        }
+        return {"sampled_data": sampled_data, "metadata": metadata}
+
+    def _sheet_information_score(self, rows: List[Dict[str, Any]]) -> float:
+        """Average per-column completeness x diversity over a sample, as a proxy for information content"""
+        sample = [row for row in rows[:100] if isinstance(row, dict)]
+        if not sample:
+            return 0.0
+        columns = list(sample[0].keys())
+        if not columns:
+            return 0.0
+        total = 0.0
+        for col in columns:
+            values = [row.get(col) for row in sample if row.get(col) is not None]
+            if not values:
+                continue
+            non_null_ratio = len(values) / len(sample)
+            unique_ratio = len(set(str(v) for v in values)) / len(values)
+            total += non_null_ratio * (unique_ratio + 0.1)
+        return total / len(columns)
+
+    def _allocate_row_budget(self, sizes: Dict[str, int], weights: Dict[str, float], max_rows: int) -> Dict[str, int]:
+        """
+        Split max_rows across sheets in proportion to their weights, never giving a sheet
+        more rows than it has. Every non-empty sheet gets a small floor so lookup tabs
+        are not starved by one large sheet; with more sheets than rows, only the heaviest
+        sheets get their one row, so the total never exceeds max_rows.
+        """
+        floor = max(1, min(10, max_rows // (4 * max(1, len(sizes)))))
+        allocation = {name: min(size, floor) for name, size in sizes.items()}
+        if sum(allocation.values()) > max_rows:
+            ranked = sorted((name for name in sizes if sizes[name] > 0), key=lambda n: weights[n], reverse=True)
+            floored = set(ranked[:max(0, max_rows)])
+            allocation = {name: 1 if name in floored else 0 for name in sizes}
+        remaining = max_rows - sum(allocation.values())
+
+        while remaining > 0:
+            open_sheets = [name for name in sizes if allocation[name] < sizes[name]]
+            if not open_sheets:
+                break
+            total_weight = sum(weights[name] for name in open_sheets)
+            given = 0
+            for name in open_sheets:
+                share = weights[name] / total_weight if total_weight > 0 else 1 / len(open_sheets)
+                extra = min(int(remaining * share), sizes[name] - allocation[name])
+                allocation[name] += extra
+                given += extra
+            if given == 0:
+                # Rounding left a few rows over; hand them to the heaviest sheets with room
+                for name in sorted(open_sheets, key=lambda n: weights[n], reverse=True)[:remaining]:
+                    allocation[name] += 1
+                    given += 1
+            remaining -= given
+
+        return allocation
+
     def _prioritize_columns(self, json_data: list) -> dict:
         """Rank columns by importance and filter to most relevant ones"""
         if not json_data:
@@ -162,13 +252,19 @@ class LangGraphService:
     async def _call_llm_with_retry(self, prompt: str, max_tokens: int = 300, retries: int = 2) -> str:
         for attempt in range(retries):
             try:
-                response = await self.client.chat.completions.create(
-                    model="mistralai/Mixtral-8x7B-Instruct-v0.1",
-                    messages=[{"role": "user", "content": prompt}],
-                    response_format={"type": "json_object"},
-                    max_tokens=max_tokens,
-                    temperature=0.2
-                )
+                with span("llm.call", max_tokens=max_tokens, prompt_chars=len(prompt), attempt=attempt + 1) as llm_span:
+                    response = await self.client.create(
+                        priority=BATCH,
+                        model="mistralai/Mixtral-8x7B-Instruct-v0.1",
+                        messages=[{"role": "user", "content": prompt}],
+                        response_format={"type": "json_object"},
+                        max_tokens=max_tokens,
+                        temperature=0.2
+                    )
+                    usage = getattr(response, "usage", None)
+                    if usage is not None:
+                        llm_span["prompt_tokens"] = getattr(usage, "prompt_tokens", None)
+                        llm_span["completion_tokens"] = getattr(usage, "completion_tokens", None)
                 return response.choices[0].message.content.strip()
             except Exception as e:
                 logger.warning(f"LLM call failed (attempt {attempt+1})", error=str(e))
@@ -176,65 +272,158 @@ class LangGraphService:
                     raise
                 await asyncio.sleep(2 ** attempt)  # Exponential backoff
 
+    def _collect_columns(self, json_data: Any) -> List[str]:
+        """Column names across all sheets, taken from the first rows of each"""
+        sheets = json_data.values() if isinstance(json_data, dict) else [json_data]
+        columns: List[str] = []
+        for rows in sheets:
+            if not isinstance(rows, list):
+                continue
+            for row in rows[:5]:
+                if isinstance(row, dict):
+                    columns.extend(str(col) for col in row.keys() if str(col) not in columns)
+        return columns
+
+    def _score_domain(self, service: Any, columns: List[str], threshold: float = 0.6) -> float:
+        """
+        How well the columns fit a domain's column patterns: harmonic mean of the share
+        of domain concepts found and the share of columns explained by some concept.
+        """
+        if not columns:
+            return 0.0
+        matched_concepts = 0
+        explained_columns = set()
+        for patterns in service.column_patterns.values():
+            best_col, best_score = None, 0.0
+            for col in columns:
+                for pattern in patterns:
+                    score = service._calculate_match_score(col.lower(), pattern)
+                    if score > best_score:
+                        best_col, best_score = col, score
+            if best_score > threshold:
+                matched_concepts += 1
+                explained_columns.add(best_col)
+
+        concept_coverage = matched_concepts / len(service.column_patterns)
+        column_coverage = len(explained_columns) / len(columns)
+        if concept_coverage + column_coverage == 0:
+            return 0.0
+        return 2 * concept_coverage * column_coverage / (concept_coverage + column_coverage)
+
+    def _classify_locally(self, json_data: Any, min_score: float = 0.3, min_margin: float = 1.2) -> Optional[str]:
+        """Cheap classification from column-mapping scores; None when no domain is a clear winner"""
+        columns = self._collect_columns(json_data)
+        scores = {
+            domain: self._score_domain(service, columns)
+            for domain, service in self.analysis_services.items()
+        }
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best_type, best_score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        logger.info("Local classification scores", scores={k: round(v, 3) for k, v in scores.items()})
+        if best_score >= min_score and best_score >= runner_up * min_margin:
+            return best_type
+        return None
+
     # ---------- New helper methods for chunking & aggregation ----------
     def _estimate_tokens_from_text(self, text: str) -> int:
         """
-        Rough token estimate: assume ~4 characters per token (conservative).
-        You can adjust this heuristic if you have a tokenizer available.
+        Token count using the local Mixtral tokenizer (see TokenBudgetService);
+        falls back to a digit/byte-aware estimate when the tokenizer is unavailable.
         """
-        if not text:
-            return 0
-        return max(1, math.ceil(len(text) / 4))
+        return self.token_budget.count_tokens(text)
 
-    def _chunk_json_data_by_tokens(self, json_data: List[Dict[str, Any]], max_input_tokens: int = 8000) -> List[List[Dict[str, Any]]]:
+    def _chunk_json_data_by_tokens(self, json_data: Any, max_input_tokens: int = 8000) -> List[Dict[str, Any]]:
         """
-        Split a list of rows (dicts) into chunks such that each chunk's JSON string
-        representation is estimated to be under `max_input_tokens`.
-        Default max_input_tokens is conservative (8k).
+        Pack rows (a list, or a {sheet_name: [rows]} dict) into chunks whose serialized
+        JSON fits within `max_input_tokens`. Each chunk is a dict with the prompt-ready
+        `text`, its row count and token count.
         """
-        if not isinstance(json_data, list):
-            return [json_data]
         if not json_data:
             return []
+        return self.token_budget.pack_rows(json_data, max_input_tokens=max_input_tokens)
 
-        chunks: List[List[Dict[str, Any]]] = []
-        current_chunk: List[Dict[str, Any]] = []
-        current_chars = 0
-        max_chars = max_input_tokens * 4  # reverse heuristic to characters
-
-        for row in json_data:
-            row_text = json.dumps(row, ensure_ascii=False)
-            row_len = len(row_text) + 2  # small padding
-            if current_chars + row_len > max_chars and current_chunk:
-                chunks.append(current_chunk)
-                current_chunk = [row]
-                current_chars = row_len
-            else:
-                current_chunk.append(row)
-                current_chars += row_len
-
-        if current_chunk:
-            chunks.append(current_chunk)
-
-        return chunks
-
-    async def _merge_partials(self, partials: List[Any], domain: str, kind: str, description: str, max_tokens: int = 400) -> List[str]:
+    async def _merge_partials(self, partials: List[Any], domain: str, kind: str, description: str, max_tokens: int = 400, fan_in: int = 8, max_levels: int = 6) -> List[str]:
         """
         Merge a list of partial results (strings or JSON arrays) into a final concise list (2-3 items).
         `domain` e.g., 'finance', 'hr'. `kind` e.g., 'trends', 'anomalies', 'predictions'.
+
+        Partials are tree-reduced: packed into groups of at most `fan_in` that fit the merge
+        prompt's token budget, each group merged in parallel, and the results merged again
+        level by level until one group remains. Prompt size never exceeds the context, and
+        the number of levels grows with log(fan_in) of the chunk count.
         """
-        try:
-            # Prepare a concise summarization prompt
-            partials_text = json.dumps(partials, ensure_ascii=False)
-            prompt = f"""
+        truncated_description = self._truncate_text(description, max_chars=800)
+        budget = self.token_budget.input_budget(
+            self._merge_prompt(domain, kind, truncated_description, "", final=True), "", max_tokens
+        )
+
+        items = list(partials)
+        for level in range(max_levels):
+            groups = self._group_partials(items, budget, fan_in)
+            if len(groups) <= 1:
+                return await self._merge_group(groups[0] if groups else [], domain, kind, truncated_description, max_tokens, final=True)
+            logger.info("Tree-reducing partials", domain=domain, kind=kind, level=level, partials=len(items), groups=len(groups))
+            items = await asyncio.gather(*[
+                self._merge_group(group, domain, kind, truncated_description, max_tokens, final=False)
+                for group in groups
+            ])
+
+        logger.warning("Merge did not converge; deduplicating remaining partials", domain=domain, kind=kind, partials=len(items))
+        return self._dedupe_partials(items, limit=3) or [f"Error merging {kind}"]
+
+    def _merge_prompt(self, domain: str, kind: str, description: str, partials_text: str, final: bool) -> str:
+        target = "the top 2-3" if final else "at most 5 distinct"
+        return f"""
             You are an expert {domain} analyst. Given multiple partial {kind} results (JSON array or text) from different chunks of data,
-            synthesize them into the top 2-3 {kind}. Keep entries short, include quantitative elements if present.
+            synthesize them into {target} {kind}. Keep entries short, include quantitative elements if present.
             
-            Description: {self._truncate_text(description, max_chars=800)}
+            Description: {description}
             Partials: {partials_text}
             
             Return JSON: {{"{kind}": ["Item 1", "Item 2"]}}
             """
+
+    def _group_partials(self, partials: List[Any], budget: int, fan_in: int) -> List[List[str]]:
+        """Greedily pack serialized partials into groups of at most fan_in that fit the token budget"""
+        groups: List[List[str]] = []
+        current: List[str] = []
+        current_tokens = 2  # Enclosing brackets
+        for partial in partials:
+            text = self._fit_partial(partial, budget - 2)
+            tokens = self.token_budget.count_tokens(text) + 1  # +1 for the separator
+            if current and (len(current) >= fan_in or current_tokens + tokens > budget):
+                groups.append(current)
+                current = []
+                current_tokens = 2
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        return groups
+
+    def _fit_partial(self, partial: Any, budget: int) -> str:
+        """Serialize one partial, dropping trailing items (or characters) until it fits the budget on its own"""
+        text = json.dumps(partial, ensure_ascii=False)
+        if self.token_budget.count_tokens(text) <= budget:
+            return text
+        if isinstance(partial, list):
+            kept = list(partial)
+            while len(kept) > 1 and self.token_budget.count_tokens(text) > budget:
+                kept.pop()
+                text = json.dumps(kept, ensure_ascii=False)
+            if self.token_budget.count_tokens(text) <= budget:
+                return text
+            partial = kept[0] if kept else ""
+        # Oversized single item: cut proportionally
+        raw = str(partial)
+        keep_chars = max(1, int(len(raw) * budget / max(1, self.token_budget.count_tokens(json.dumps(raw, ensure_ascii=False)))) - 8)
+        return json.dumps(raw[:keep_chars], ensure_ascii=False)
+
+    async def _merge_group(self, group: List[str], domain: str, kind: str, description: str, max_tokens: int, final: bool) -> List[str]:
+        """One merge LLM call over serialized partials; falls back to deduplication for this group only"""
+        try:
+            prompt = self._merge_prompt(domain, kind, description, "[" + ",".join(group) + "]", final)
             content = await self._call_llm_with_retry(prompt, max_tokens=max_tokens)
             parsed = json.loads(content)
             result = parsed.get(kind, [])
@@ -245,33 +434,47 @@ class LangGraphService:
         except Exception as e:
             logger.error("Merging partials failed", error=str(e))
             # As fallback, return unique non-empty strings from partials
-            flat = []
-            for p in partials:
-                if isinstance(p, list):
-                    flat.extend([str(x) for x in p if x])
-                else:
-                    flat.append(str(p))
-            # dedupe and short list
-            seen = []
-            for item in flat:
-                if item not in seen and item.strip():
-                    seen.append(item)
-                if len(seen) >= 3:
-                    break
-            return seen or [f"Error merging {kind}"]
-
-    async def _process_chunks_collect_and_merge(self, chunks: List[List[Dict[str, Any]]], domain: str, kind: str, prompt_template: str, description: str, per_chunk_max_tokens: int = 300, merge_max_tokens: int = 400) -> List[str]:
+            decoded = []
+            for text in group:
+                try:
+                    decoded.append(json.loads(text))
+                except Exception:
+                    decoded.append(text)
+            return self._dedupe_partials(decoded, limit=3 if final else 5) or [f"Error merging {kind}"]
+
+    def _dedupe_partials(self, partials: List[Any], limit: int) -> List[str]:
+        flat = []
+        for p in partials:
+            if isinstance(p, list):
+                flat.extend([str(x) for x in p if x])
+            else:
+                flat.append(str(p))
+        # dedupe and short list
+        seen = []
+        for item in flat:
+            if item not in seen and item.strip():
+                seen.append(item)
+            if len(seen) >= limit:
+                break
+        return seen
+
+    async def _process_chunks_collect_and_merge(self, json_data: Any, domain: str, kind: str, prompt_template: str, description: str, per_chunk_max_tokens: int = 300, merge_max_tokens: int = 400) -> List[str]:
         """
         Generic helper:
+        - packs json_data into chunks sized to the context left over by prompt_template
         - runs prompt_template for each chunk (where template contains {data} and {description})
         - expects JSON with key `kind` in each chunk response
         - collects partials and merges them using _merge_partials
         """
+        truncated_description = self._truncate_text(description, max_chars=1000)
+        max_input_tokens = self.token_budget.input_budget(prompt_template, truncated_description, per_chunk_max_tokens)
+        chunks = self._chunk_json_data_by_tokens(json_data, max_input_tokens=max_input_tokens)
+        logger.info("Chunked data for LLM", domain=domain, kind=kind, chunks=len(chunks), max_input_tokens=max_input_tokens)
+
         partials = []
         for chunk in chunks:
             try:
-                data_text = json.dumps(chunk, ensure_ascii=False)
-                prompt = prompt_template.format(data=data_text, description=self._truncate_text(description, max_chars=1000))
+                prompt = prompt_template.format(data=chunk["text"], description=truncated_description)
                 content = await self._call_llm_with_retry(prompt, max_tokens=per_chunk_max_tokens)
                 try:
                     parsed = json.loads(content)
@@ -288,377 +491,506 @@ class LangGraphService:
         merged = await self._merge_partials(partials, domain, kind, description, max_tokens=merge_max_tokens)
         return merged
 
-    # ---------- End new helpers ----------
+    async def _explain_anomalies(self, state: GraphState, domain: str, prompt_template: str, max_tokens: int = 400) -> List[str]:
+        """
+        Explain the anomalies found by AnomalyDetectionService in one short LLM call.
+        Falls back to LLM detection over the data chunks when nothing was pre-detected.
+        """
+        detected = state.get('detected_anomalies') or []
+        if not detected:
+            return await self._process_chunks_collect_and_merge(state['json_data'], domain=domain, kind="anomalies", prompt_template=prompt_template, description=state['description'])
 
-    async def generate_insights(self, json_data: Dict[str, Any], description: str) -> Dict[str, Any]:
+        findings = [
+            {k: v for k, v in finding.items() if k in ("type", "sheet", "column", "group", "period", "value", "expected", "description")}
+            for finding in detected
+        ]
+        prompt = f"""
+        You are an expert {domain} analyst. The anomalies below were detected statistically in the full dataset.
+        Pick the 1-2 most material ones and explain each in one sentence with a plausible business cause.
+        Only use the anomalies listed; do not invent new ones.
+        
+        Description: {self._truncate_text(state['description'], max_chars=800)}
+        Detected anomalies (JSON): {json.dumps(findings, ensure_ascii=False, default=str)}
+        
+        Return JSON: {{"anomalies": ["Anomaly 1 explanation", "Anomaly 2"]}}
+        """
         try:
-            # Use smart sampling first
-            sampling_result = self._smart_sample_data(json_data, max_rows=150)
-            sampled_data = sampling_result["sampled_data"]
-            sampling_metadata = sampling_result["metadata"]
-            
-            truncated_description = self._truncate_text(description)
-            sampled_json = json.dumps(sampled_data)
+            content = await self._call_llm_with_retry(prompt, max_tokens=max_tokens)
+            result = json.loads(content).get("anomalies", [])
+            if isinstance(result, list) and result:
+                return result
+        except Exception as e:
+            logger.warning("Anomaly explanation failed; returning detector output", error=str(e))
+        return [finding["description"] for finding in detected[:2]]
 
-            logger.info("Starting insight generation with smart sampling", 
-                       json_length=len(sampled_json),
-                       sampling_strategy=sampling_metadata.get("strategy"),
-                       total_rows=sampling_metadata.get("total_rows", 0),
-                       sampled_rows=sampling_metadata.get("sampled_rows", 0),
-                       column_info=sampling_metadata.get("column_info", {}))
+    def _collect_forecasts(self, computed_insights: Optional[Dict[str, Any]], max_groups: int = 5) -> List[Dict[str, Any]]:
+        """Forecasts produced by ForecastingService inside computed_insights ({sheet: insights})"""
+        if not isinstance(computed_insights, dict):
+            return []
+        forecasts = []
+        for sheet_name, insights in computed_insights.items():
+            if not isinstance(insights, dict):
+                continue
+            for key, value in insights.items():
+                if '_forecast' not in key:
+                    continue
+                if isinstance(value, dict) and value.get('forecast'):
+                    forecasts.append({"sheet": sheet_name, "metric": key, **value})
+                elif isinstance(value, list):
+                    forecasts.append({"sheet": sheet_name, "metric": key, "groups": value[:max_groups]})
+        return forecasts
 
-            workflow = StateGraph(GraphState)
+    async def _phrase_predictions(self, state: GraphState, domain: str, prompt_template: str, max_tokens: int = 400) -> List[str]:
+        """
+        Turn the locally computed forecasts into 1-2 predictions in one LLM call; the numbers
+        come from the forecasts, the LLM only phrases them. Falls back to LLM prediction over
+        the data chunks when no forecasts were computed.
+        """
+        forecasts = state.get('forecasts') or []
+        if not forecasts:
+            return await self._process_chunks_collect_and_merge(state['json_data'], domain=domain, kind="predictions", prompt_template=prompt_template, description=state['description'])
 
-            # Classification node
-            async def classify_spreadsheet(state: GraphState) -> GraphState:
-                try:
-                    # Use sampled data for classification
-                    sample_for_classification = state['json_data'][:5] if isinstance(state['json_data'], list) else list(state['json_data'].values())[:5]
-                    
-                    prompt = f"""
-                    Classify the spreadsheet as one of: {', '.join(self.types)}.
-                    Use description and sample data. If unclear, use 'Unknown'.
-                    
-                    Description: {state['description']}
-                    Sample Data (JSON): {json.dumps(sample_for_classification)}
-                    
-                    Return: {{"type": "Finance"}}  # Example; must be exact match
-                    """
-                    content = await self._call_llm_with_retry(prompt, max_tokens=50)
-                    parsed = json.loads(content)
-                    state_type = parsed.get('type', 'Unknown')
-                    if state_type not in self.types + ['Unknown']:
-                        state_type = 'Unknown'
-                    state['spreadsheet_type'] = state_type
-                    logger.info("Classified type", type=state_type)
-                except Exception as e:
-                    logger.error("Classification failed", error=str(e))
-                    state['spreadsheet_type'] = 'Unknown'
-                return state
+        prompt = f"""
+        You are an expert {domain} analyst. Below are statistical forecasts (point value and 95% interval per month)
+        computed from the full dataset. Write 1-2 predictions or recommendations based on them.
+        Use the forecast numbers as given, mention the interval where it matters, and do not invent other figures.
+        
+        Description: {self._truncate_text(state['description'], max_chars=800)}
+        Forecasts (JSON): {json.dumps(forecasts, ensure_ascii=False, default=str)}
+        
+        Return JSON: {{"predictions": ["Prediction 1", "Prediction 2"]}}
+        """
+        try:
+            content = await self._call_llm_with_retry(prompt, max_tokens=max_tokens)
+            result = json.loads(content).get("predictions", [])
+            if isinstance(result, list) and result:
+                return result
+        except Exception as e:
+            logger.warning("Prediction phrasing failed; returning forecast summary", error=str(e))
+        return [self._describe_forecast(forecast) for forecast in forecasts if forecast.get('forecast')][:2] or ["Error generating predictions"]
 
-            # ---------- Domain-specific nodes (now using chunking + merge) ----------
-            # Finance-specific nodes
-            async def analyze_finance_trends(state: GraphState) -> GraphState:
-                # Chunk data conservatively to avoid context overflow
-                chunks = self._chunk_json_data_by_tokens(state['json_data'], max_input_tokens=8000)
-                prompt_template = """
-                Analyze financial data for 2-3 key trends, e.g., revenue growth, expense patterns, ROI, cash flow changes.
-                Include quantitative metrics where possible (e.g., 'Revenue grew 12% YoY').
-                Data: {data}
-                Description: {description}
-                Return: {{"trends": ["Trend 1 with metric", "Trend 2"]}}
-                """
-                merged = await self._process_chunks_collect_and_merge(chunks, domain="finance", kind="trends", prompt_template=prompt_template, description=state['description'])
-                state['insights']['trends'] = merged
-                return state
+    def _describe_forecast(self, forecast: Dict[str, Any]) -> str:
+        nxt = forecast['forecast'][0]
+        metric = forecast['metric'].replace('_forecast', '').replace('_', ' ')
+        return f"{metric.capitalize()} is forecast at {nxt['value']:,.2f} for {nxt['month']} (95% interval {nxt['lower']:,.2f}–{nxt['upper']:,.2f}, {forecast.get('method', 'model').replace('_', ' ')})"
 
-            async def analyze_finance_anomalies(state: GraphState) -> GraphState:
-                chunks = self._chunk_json_data_by_tokens(state['json_data'], max_input_tokens=8000)
-                prompt_template = """
-                Detect 1-2 financial anomalies, e.g., unusual expense spikes, budget overruns, irregular cash flows.
-                Explain potential causes.
-                Data: {data}
-                Description: {description}
-                Return: {{"anomalies": ["Anomaly 1 explanation", "Anomaly 2"]}}
-                """
-                merged = await self._process_chunks_collect_and_merge(chunks, domain="finance", kind="anomalies", prompt_template=prompt_template, description=state['description'])
-                state['insights']['anomalies'] = merged
-                return state
+    # ---------- End new helpers ----------
 
-            async def generate_finance_predictions(state: GraphState) -> GraphState:
-                chunks = self._chunk_json_data_by_tokens(state['json_data'], max_input_tokens=8000)
-                prompt_template = """
-                Generate 1-2 financial predictions/recommendations, e.g., forecast revenue, suggest cost cuts, risk assessments.
-                Data: {data}
-                Description: {description}
-                Return: {{"predictions": ["Prediction 1", "Prediction 2"]}}
-                """
-                merged = await self._process_chunks_collect_and_merge(chunks, domain="finance", kind="predictions", prompt_template=prompt_template, description=state['description'])
-                state['insights']['predictions'] = merged
+    def _get_insight_graph(self):
+        """Build and compile the insight workflow once; nodes read everything they need from state"""
+        if self._insight_graph is not None:
+            return self._insight_graph
+
+        workflow = StateGraph(GraphState)
+
+        # Classification node
+        async def classify_spreadsheet(state: GraphState) -> GraphState:
+            # Column-mapping scores usually settle it without an LLM round trip
+            local_type = self._classify_locally(state['json_data'])
+            if local_type:
+                state['spreadsheet_type'] = local_type
+                logger.info("Classified type", type=local_type, source="column_mapping")
                 return state
-            
-            # HR-specific nodes
-            async def analyze_hr_trends(state: GraphState) -> GraphState:
-                chunks = self._chunk_json_data_by_tokens(state['json_data'], max_input_tokens=8000)
-                prompt_template = """
-                Analyze HR data for 2-3 key trends, e.g., employee turnover rates, hiring patterns, salary progression, 
-                performance ratings distribution, training completion rates, diversity metrics.
-                Include quantitative insights where possible.
-                Data: {data}
-                Description: {description}
-                Return: {{"trends": ["HR trend 1 with metric", "HR trend 2"]}}
+            try:
+                # Use sampled data for classification: a few rows per sheet
+                if isinstance(state['json_data'], list):
+                    sample_for_classification = state['json_data'][:5]
+                else:
+                    sample_for_classification = {
+                        name: rows[:5] if isinstance(rows, list) else rows
+                        for name, rows in list(state['json_data'].items())[:5]
+                    }
+                
+                prompt = f"""
+                Classify the spreadsheet as one of: {', '.join(self.types)}.
+                Use description and sample data. If unclear, use 'Unknown'.
+                
+                Description: {state['description']}
+                Sample Data (JSON): {json.dumps(sample_for_classification)}
+                
+                Return: {{"type": "Finance"}}  # Example; must be exact match
                 """
-                merged = await self._process_chunks_collect_and_merge(chunks, domain="hr", kind="trends", prompt_template=prompt_template, description=state['description'])
-                state['insights']['trends'] = merged
-                return state
+                content = await self._call_llm_with_retry(prompt, max_tokens=50)
+                parsed = json.loads(content)
+                state_type = parsed.get('type', 'Unknown')
+                if state_type not in self.types + ['Unknown']:
+                    state_type = 'Unknown'
+                state['spreadsheet_type'] = state_type
+                logger.info("Classified type", type=state_type, source="llm")
+            except Exception as e:
+                logger.error("Classification failed", error=str(e))
+                state['spreadsheet_type'] = 'Unknown'
+            return state
 
-            async def analyze_hr_anomalies(state: GraphState) -> GraphState:
-                chunks = self._chunk_json_data_by_tokens(state['json_data'], max_input_tokens=8000)
-                prompt_template = """
-                Detect 1-2 HR anomalies, e.g., sudden turnover spikes in specific departments, unusual hiring patterns,
-                salary disparities, performance rating inconsistencies.
-                Data: {data}
-                Description: {description}
-                Return: {{"anomalies": ["HR anomaly 1 explanation", "HR anomaly 2"]}}
-                """
-                merged = await self._process_chunks_collect_and_merge(chunks, domain="hr", kind="anomalies", prompt_template=prompt_template, description=state['description'])
-                state['insights']['anomalies'] = merged
-                return state
+        # ---------- Domain-specific nodes (now using chunking + merge) ----------
+        # Finance-specific nodes
+        async def analyze_finance_trends(state: GraphState) -> GraphState:
+            prompt_template = """
+            Analyze financial data for 2-3 key trends, e.g., revenue growth, expense patterns, ROI, cash flow changes.
+            Include quantitative metrics where possible (e.g., 'Revenue grew 12% YoY').
+            Data: {data}
+            Description: {description}
+            Return: {{"trends": ["Trend 1 with metric", "Trend 2"]}}
+            """
+            merged = await self._process_chunks_collect_and_merge(state['json_data'], domain="finance", kind="trends", prompt_template=prompt_template, description=state['description'])
+            state['insights']['trends'] = merged
+            return state
 
-            async def generate_hr_predictions(state: GraphState) -> GraphState:
-                chunks = self._chunk_json_data_by_tokens(state['json_data'], max_input_tokens=8000)
-                prompt_template = """
-                Generate 1-2 HR predictions/recommendations, e.g., forecast hiring needs, retention strategies.
-                Data: {data}
-                Description: {description}
-                Return: {{"predictions": ["HR prediction 1", "HR prediction 2"]}}
-                """
-                merged = await self._process_chunks_collect_and_merge(chunks, domain="hr", kind="predictions", prompt_template=prompt_template, description=state['description'])
-                state['insights']['predictions'] = merged
-                return state
+        async def analyze_finance_anomalies(state: GraphState) -> GraphState:
+            prompt_template = """
+            Detect 1-2 financial anomalies, e.g., unusual expense spikes, budget overruns, irregular cash flows.
+            Explain potential causes.
+            Data: {data}
+            Description: {description}
+            Return: {{"anomalies": ["Anomaly 1 explanation", "Anomaly 2"]}}
+            """
+            merged = await self._explain_anomalies(state, domain="finance", prompt_template=prompt_template)
+            state['insights']['anomalies'] = merged
+            return state
 
-            # Operations-specific nodes
-            async def analyze_operations_trends(state: GraphState) -> GraphState:
-                chunks = self._chunk_json_data_by_tokens(state['json_data'], max_input_tokens=8000)
-                prompt_template = """
-                Analyze operations data for 2-3 key trends, e.g., production efficiency, supply chain performance, downtime.
-                Data: {data}
-                Description: {description}
-                Return: {{"trends": ["Operations trend 1 with metric", "Operations trend 2"]}}
-                """
-                merged = await self._process_chunks_collect_and_merge(chunks, domain="operations", kind="trends", prompt_template=prompt_template, description=state['description'])
-                state['insights']['trends'] = merged
-                return state
+        async def generate_finance_predictions(state: GraphState) -> GraphState:
+            prompt_template = """
+            Generate 1-2 financial predictions/recommendations, e.g., forecast revenue, suggest cost cuts, risk assessments.
+            Data: {data}
+            Description: {description}
+            Return: {{"predictions": ["Prediction 1", "Prediction 2"]}}
+            """
+            merged = await self._phrase_predictions(state, domain="finance", prompt_template=prompt_template)
+            state['insights']['predictions'] = merged
+            return state
+        
+        # HR-specific nodes
+        async def analyze_hr_trends(state: GraphState) -> GraphState:
+            prompt_template = """
+            Analyze HR data for 2-3 key trends, e.g., employee turnover rates, hiring patterns, salary progression, 
+            performance ratings distribution, training completion rates, diversity metrics.
+            Include quantitative insights where possible.
+            Data: {data}
+            Description: {description}
+            Return: {{"trends": ["HR trend 1 with metric", "HR trend 2"]}}
+            """
+            merged = await self._process_chunks_collect_and_merge(state['json_data'], domain="hr", kind="trends", prompt_template=prompt_template, description=state['description'])
+            state['insights']['trends'] = merged
+            return state
 
-            async def analyze_operations_anomalies(state: GraphState) -> GraphState:
-                chunks = self._chunk_json_data_by_tokens(state['json_data'], max_input_tokens=8000)
-                prompt_template = """
-                Detect 1-2 operations anomalies, e.g., unexpected equipment failures, supply chain disruptions.
-                Data: {data}
-                Description: {description}
-                Return: {{"anomalies": ["Operations anomaly 1 explanation", "Operations anomaly 2"]}}
-                """
-                merged = await self._process_chunks_collect_and_merge(chunks, domain="operations", kind="anomalies", prompt_template=prompt_template, description=state['description'])
-                state['insights']['anomalies'] = merged
-                return state
+        async def analyze_hr_anomalies(state: GraphState) -> GraphState:
+            prompt_template = """
+            Detect 1-2 HR anomalies, e.g., sudden turnover spikes in specific departments, unusual hiring patterns,
+            salary disparities, performance rating inconsistencies.
+            Data: {data}
+            Description: {description}
+            Return: {{"anomalies": ["HR anomaly 1 explanation", "HR anomaly 2"]}}
+            """
+            merged = await self._explain_anomalies(state, domain="hr", prompt_template=prompt_template)
+            state['insights']['anomalies'] = merged
+            return state
 
-            async def generate_operations_predictions(state: GraphState) -> GraphState:
-                chunks = self._chunk_json_data_by_tokens(state['json_data'], max_input_tokens=8000)
-                prompt_template = """
-                Generate 1-2 operations predictions/recommendations, e.g., maintenance scheduling, capacity forecasts.
-                Data: {data}
-                Description: {description}
-                Return: {{"predictions": ["Operations prediction 1", "Operations prediction 2"]}}
-                """
-                merged = await self._process_chunks_collect_and_merge(chunks, domain="operations", kind="predictions", prompt_template=prompt_template, description=state['description'])
-                state['insights']['predictions'] = merged
-                return state
+        async def generate_hr_predictions(state: GraphState) -> GraphState:
+            prompt_template = """
+            Generate 1-2 HR predictions/recommendations, e.g., forecast hiring needs, retention strategies.
+            Data: {data}
+            Description: {description}
+            Return: {{"predictions": ["HR prediction 1", "HR prediction 2"]}}
+            """
+            merged = await self._phrase_predictions(state, domain="hr", prompt_template=prompt_template)
+            state['insights']['predictions'] = merged
+            return state
 
-            # Sales-specific nodes
-            async def analyze_sales_trends(state: GraphState) -> GraphState:
-                chunks = self._chunk_json_data_by_tokens(state['json_data'], max_input_tokens=8000)
-                prompt_template = """
-                Analyze sales data for 2-3 key trends, e.g., revenue growth, conversion rates, product performance.
-                Data: {data}
-                Description: {description}
-                Return: {{"trends": ["Sales trend 1 with metric", "Sales trend 2"]}}
-                """
-                merged = await self._process_chunks_collect_and_merge(chunks, domain="sales", kind="trends", prompt_template=prompt_template, description=state['description'])
-                state['insights']['trends'] = merged
-                return state
+        # Operations-specific nodes
+        async def analyze_operations_trends(state: GraphState) -> GraphState:
+            prompt_template = """
+            Analyze operations data for 2-3 key trends, e.g., production efficiency, supply chain performance, downtime.
+            Data: {data}
+            Description: {description}
+            Return: {{"trends": ["Operations trend 1 with metric", "Operations trend 2"]}}
+            """
+            merged = await self._process_chunks_collect_and_merge(state['json_data'], domain="operations", kind="trends", prompt_template=prompt_template, description=state['description'])
+            state['insights']['trends'] = merged
+            return state
 
-            async def analyze_sales_anomalies(state: GraphState) -> GraphState:
-                chunks = self._chunk_json_data_by_tokens(state['json_data'], max_input_tokens=8000)
-                prompt_template = """
-                Detect 1-2 sales anomalies, e.g., sudden drops in specific products/regions, unusual customer behavior.
-                Data: {data}
-                Description: {description}
-                Return: {{"anomalies": ["Sales anomaly 1 explanation", "Sales anomaly 2"]}}
-                """
-                merged = await self._process_chunks_collect_and_merge(chunks, domain="sales", kind="anomalies", prompt_template=prompt_template, description=state['description'])
-                state['insights']['anomalies'] = merged
-                return state
+        async def analyze_operations_anomalies(state: GraphState) -> GraphState:
+            prompt_template = """
+            Detect 1-2 operations anomalies, e.g., unexpected equipment failures, supply chain disruptions.
+            Data: {data}
+            Description: {description}
+            Return: {{"anomalies": ["Operations anomaly 1 explanation", "Operations anomaly 2"]}}
+            """
+            merged = await self._explain_anomalies(state, domain="operations", prompt_template=prompt_template)
+            state['insights']['anomalies'] = merged
+            return state
 
-            async def generate_sales_predictions(state: GraphState) -> GraphState:
-                chunks = self._chunk_json_data_by_tokens(state['json_data'], max_input_tokens=8000)
-                prompt_template = """
-                Generate 1-2 sales predictions/recommendations, e.g., forecast revenue, pricing recommendations.
-                Data: {data}
-                Description: {description}
-                Return: {{"predictions": ["Sales prediction 1", "Sales prediction 2"]}}
-                """
-                merged = await self._process_chunks_collect_and_merge(chunks, domain="sales", kind="predictions", prompt_template=prompt_template, description=state['description'])
-                state['insights']['predictions'] = merged
-                return state
+        async def generate_operations_predictions(state: GraphState) -> GraphState:
+            prompt_template = """
+            Generate 1-2 operations predictions/recommendations, e.g., maintenance scheduling, capacity forecasts.
+            Data: {data}
+            Description: {description}
+            Return: {{"predictions": ["Operations prediction 1", "Operations prediction 2"]}}
+            """
+            merged = await self._phrase_predictions(state, domain="operations", prompt_template=prompt_template)
+            state['insights']['predictions'] = merged
+            return state
 
-            # Retail-specific nodes
-            async def analyze_retail_trends(state: GraphState) -> GraphState:
-                chunks = self._chunk_json_data_by_tokens(state['json_data'], max_input_tokens=8000)
-                prompt_template = """
-                Analyze retail data for 2-3 key trends, e.g., inventory turnover, customer footfall, product performance.
-                Data: {data}
-                Description: {description}
-                Return: {{"trends": ["Retail trend 1 with metric", "Retail trend 2"]}}
-                """
-                merged = await self._process_chunks_collect_and_merge(chunks, domain="retail", kind="trends", prompt_template=prompt_template, description=state['description'])
-                state['insights']['trends'] = merged
-                return state
+        # Sales-specific nodes
+        async def analyze_sales_trends(state: GraphState) -> GraphState:
+            prompt_template = """
+            Analyze sales data for 2-3 key trends, e.g., revenue growth, conversion rates, product performance.
+            Data: {data}
+            Description: {description}
+            Return: {{"trends": ["Sales trend 1 with metric", "Sales trend 2"]}}
+            """
+            merged = await self._process_chunks_collect_and_merge(state['json_data'], domain="sales", kind="trends", prompt_template=prompt_template, description=state['description'])
+            state['insights']['trends'] = merged
+            return state
 
-            async def analyze_retail_anomalies(state: GraphState) -> GraphState:
-                chunks = self._chunk_json_data_by_tokens(state['json_data'], max_input_tokens=8000)
-                prompt_template = """
-                Detect 1-2 retail anomalies, e.g., stockouts, slow-moving inventory, unusual customer patterns.
-                Data: {data}
-                Description: {description}
-                Return: {{"anomalies": ["Retail anomaly 1 explanation", "Retail anomaly 2"]}}
-                """
-                merged = await self._process_chunks_collect_and_merge(chunks, domain="retail", kind="anomalies", prompt_template=prompt_template, description=state['description'])
-                state['insights']['anomalies'] = merged
-                return state
+        async def analyze_sales_anomalies(state: GraphState) -> GraphState:
+            prompt_template = """
+            Detect 1-2 sales anomalies, e.g., sudden drops in specific products/regions, unusual customer behavior.
+            Data: {data}
+            Description: {description}
+            Return: {{"anomalies": ["Sales anomaly 1 explanation", "Sales anomaly 2"]}}
+            """
+            merged = await self._explain_anomalies(state, domain="sales", prompt_template=prompt_template)
+            state['insights']['anomalies'] = merged
+            return state
 
-            async def generate_retail_predictions(state: GraphState) -> GraphState:
-                chunks = self._chunk_json_data_by_tokens(state['json_data'], max_input_tokens=8000)
-                prompt_template = """
-                Generate 1-2 retail predictions/recommendations, e.g., inventory optimization, demand forecasting.
-                Data: {data}
-                Description: {description}
-                Return: {{"predictions": ["Retail prediction 1", "Retail prediction 2"]}}
-                """
-                merged = await self._process_chunks_collect_and_merge(chunks, domain="retail", kind="predictions", prompt_template=prompt_template, description=state['description'])
-                state['insights']['predictions'] = merged
-                return state
+        async def generate_sales_predictions(state: GraphState) -> GraphState:
+            prompt_template = """
+            Generate 1-2 sales predictions/recommendations, e.g., forecast revenue, pricing recommendations.
+            Data: {data}
+            Description: {description}
+            Return: {{"predictions": ["Sales prediction 1", "Sales prediction 2"]}}
+            """
+            merged = await self._phrase_predictions(state, domain="sales", prompt_template=prompt_template)
+            state['insights']['predictions'] = merged
+            return state
 
-            # Generic fallback nodes
-            async def analyze_generic_trends(state: GraphState) -> GraphState:
-                chunks = self._chunk_json_data_by_tokens(state['json_data'], max_input_tokens=8000)
-                prompt_template = """
-                Identify 2-3 key trends in the data. Look for patterns, growth/decline, changes over time,
-                distributions, or notable characteristics in the dataset.
-                Data: {data}
-                Description: {description}
-                Return: {{"trends": ["Generic trend 1", "Generic trend 2"]}}
-                """
-                merged = await self._process_chunks_collect_and_merge(chunks, domain="generic", kind="trends", prompt_template=prompt_template, description=state['description'])
-                state['insights']['trends'] = merged
-                return state
+        # Retail-specific nodes
+        async def analyze_retail_trends(state: GraphState) -> GraphState:
+            prompt_template = """
+            Analyze retail data for 2-3 key trends, e.g., inventory turnover, customer footfall, product performance.
+            Data: {data}
+            Description: {description}
+            Return: {{"trends": ["Retail trend 1 with metric", "Retail trend 2"]}}
+            """
+            merged = await self._process_chunks_collect_and_merge(state['json_data'], domain="retail", kind="trends", prompt_template=prompt_template, description=state['description'])
+            state['insights']['trends'] = merged
+            return state
 
-            async def analyze_generic_anomalies(state: GraphState) -> GraphState:
-                chunks = self._chunk_json_data_by_tokens(state['json_data'], max_input_tokens=8000)
-                prompt_template = """
-                Detect 1-2 anomalies or outliers in the data.
-                Data: {data}
-                Description: {description}
-                Return: {{"anomalies": ["Generic anomaly 1", "Generic anomaly 2"]}}
-                """
-                merged = await self._process_chunks_collect_and_merge(chunks, domain="generic", kind="anomalies", prompt_template=prompt_template, description=state['description'])
-                state['insights']['anomalies'] = merged
-                return state
+        async def analyze_retail_anomalies(state: GraphState) -> GraphState:
+            prompt_template = """
+            Detect 1-2 retail anomalies, e.g., stockouts, slow-moving inventory, unusual customer patterns.
+            Data: {data}
+            Description: {description}
+            Return: {{"anomalies": ["Retail anomaly 1 explanation", "Retail anomaly 2"]}}
+            """
+            merged = await self._explain_anomalies(state, domain="retail", prompt_template=prompt_template)
+            state['insights']['anomalies'] = merged
+            return state
 
-            async def generate_generic_predictions(state: GraphState) -> GraphState:
-                chunks = self._chunk_json_data_by_tokens(state['json_data'], max_input_tokens=8000)
-                prompt_template = """
-                Generate 1-2 predictions or recommendations based on the data patterns.
-                Data: {data}
-                Description: {description}
-                Return: {{"predictions": ["Generic prediction 1", "Generic prediction 2"]}}
-                """
-                merged = await self._process_chunks_collect_and_merge(chunks, domain="generic", kind="predictions", prompt_template=prompt_template, description=state['description'])
-                state['insights']['predictions'] = merged
-                return state
+        async def generate_retail_predictions(state: GraphState) -> GraphState:
+            prompt_template = """
+            Generate 1-2 retail predictions/recommendations, e.g., inventory optimization, demand forecasting.
+            Data: {data}
+            Description: {description}
+            Return: {{"predictions": ["Retail prediction 1", "Retail prediction 2"]}}
+            """
+            merged = await self._phrase_predictions(state, domain="retail", prompt_template=prompt_template)
+            state['insights']['predictions'] = merged
+            return state
 
-            # Add nodes to workflow
-            workflow.add_node("classify", classify_spreadsheet)
-            
-            # Finance nodes
-            workflow.add_node("analyze_finance_trends", analyze_finance_trends)
-            workflow.add_node("analyze_finance_anomalies", analyze_finance_anomalies)
-            workflow.add_node("generate_finance_predictions", generate_finance_predictions)
-
-            # HR nodes
-            workflow.add_node("analyze_hr_trends", analyze_hr_trends)
-            workflow.add_node("analyze_hr_anomalies", analyze_hr_anomalies)
-            workflow.add_node("generate_hr_predictions", generate_hr_predictions)
-
-            # Operations nodes
-            workflow.add_node("analyze_operations_trends", analyze_operations_trends)
-            workflow.add_node("analyze_operations_anomalies", analyze_operations_anomalies)
-            workflow.add_node("generate_operations_predictions", generate_operations_predictions)
-
-            # Sales nodes
-            workflow.add_node("analyze_sales_trends", analyze_sales_trends)
-            workflow.add_node("analyze_sales_anomalies", analyze_sales_anomalies)
-            workflow.add_node("generate_sales_predictions", generate_sales_predictions)
-
-            # Retail nodes
-            workflow.add_node("analyze_retail_trends", analyze_retail_trends)
-            workflow.add_node("analyze_retail_anomalies", analyze_retail_anomalies)
-            workflow.add_node("generate_retail_predictions", generate_retail_predictions)
-
-            # Generic fallback nodes
-            workflow.add_node("analyze_generic_trends", analyze_generic_trends)
-            workflow.add_node("analyze_generic_anomalies", analyze_generic_anomalies)
-            workflow.add_node("generate_generic_predictions", generate_generic_predictions)
-
-            # Conditional routing based on type
-            def route_after_classify(state: GraphState):
-                spreadsheet_type = state['spreadsheet_type'].lower()
-                if spreadsheet_type == 'finance':
-                    return "analyze_finance_trends"
-                elif spreadsheet_type == 'hr':
-                    return "analyze_hr_trends"
-                elif spreadsheet_type == 'operations':
-                    return "analyze_operations_trends"
-                elif spreadsheet_type == 'sales':
-                    return "analyze_sales_trends"
-                elif spreadsheet_type == 'retail':
-                    return "analyze_retail_trends"
-                else:  # Unknown or any other type
-                    return "analyze_generic_trends"
-
-            # Set up the workflow structure
-            workflow.set_entry_point("classify")
-            workflow.add_conditional_edges("classify", route_after_classify)
-
-            # Chain edges for each domain (trends -> anomalies -> predictions -> END)
-            
-            # Finance chain
-            workflow.add_edge("analyze_finance_trends", "analyze_finance_anomalies")
-            workflow.add_edge("analyze_finance_anomalies", "generate_finance_predictions")
-            workflow.add_edge("generate_finance_predictions", END)
-
-            # HR chain
-            workflow.add_edge("analyze_hr_trends", "analyze_hr_anomalies")
-            workflow.add_edge("analyze_hr_anomalies", "generate_hr_predictions")
-            workflow.add_edge("generate_hr_predictions", END)
-
-            # Operations chain
-            workflow.add_edge("analyze_operations_trends", "analyze_operations_anomalies")
-            workflow.add_edge("analyze_operations_anomalies", "generate_operations_predictions")
-            workflow.add_edge("generate_operations_predictions", END)
-
-            # Sales chain
-            workflow.add_edge("analyze_sales_trends", "analyze_sales_anomalies")
-            workflow.add_edge("analyze_sales_anomalies", "generate_sales_predictions")
-            workflow.add_edge("generate_sales_predictions", END)
-
-            # Retail chain
-            workflow.add_edge("analyze_retail_trends", "analyze_retail_anomalies")
-            workflow.add_edge("analyze_retail_anomalies", "generate_retail_predictions")
-            workflow.add_edge("generate_retail_predictions", END)
-
-            # Generic chain
-            workflow.add_edge("analyze_generic_trends", "analyze_generic_anomalies")
-            workflow.add_edge("analyze_generic_anomalies", "generate_generic_predictions")
-            workflow.add_edge("generate_generic_predictions", END)
-
-            # Compile and execute the workflow
-            graph = workflow.compile()
-            initial_state = GraphState(
-                json_data=sampled_data,
-                description=truncated_description,
-                spreadsheet_type='Unknown',
-                insights={}
-            )
+        # Generic fallback nodes
+        async def analyze_generic_trends(state: GraphState) -> GraphState:
+            prompt_template = """
+            Identify 2-3 key trends in the data. Look for patterns, growth/decline, changes over time,
+            distributions, or notable characteristics in the dataset.
+            Data: {data}
+            Description: {description}
+            Return: {{"trends": ["Generic trend 1", "Generic trend 2"]}}
+            """
+            merged = await self._process_chunks_collect_and_merge(state['json_data'], domain="generic", kind="trends", prompt_template=prompt_template, description=state['description'])
+            state['insights']['trends'] = merged
+            return state
+
+        async def analyze_generic_anomalies(state: GraphState) -> GraphState:
+            prompt_template = """
+            Detect 1-2 anomalies or outliers in the data.
+            Data: {data}
+            Description: {description}
+            Return: {{"anomalies": ["Generic anomaly 1", "Generic anomaly 2"]}}
+            """
+            merged = await self._explain_anomalies(state, domain="generic", prompt_template=prompt_template)
+            state['insights']['anomalies'] = merged
+            return state
+
+        async def generate_generic_predictions(state: GraphState) -> GraphState:
+            prompt_template = """
+            Generate 1-2 predictions or recommendations based on the data patterns.
+            Data: {data}
+            Description: {description}
+            Return: {{"predictions": ["Generic prediction 1", "Generic prediction 2"]}}
+            """
+            merged = await self._phrase_predictions(state, domain="generic", prompt_template=prompt_template)
+            state['insights']['predictions'] = merged
+            return state
+
+        # Every node is timed as its own span
+        def add_node(name: str, node) -> None:
+            workflow.add_node(name, timed(f"langgraph.{name}")(node))
+
+        # Add nodes to workflow
+        add_node("classify", classify_spreadsheet)
+        
+        # Finance nodes
+        add_node("analyze_finance_trends", analyze_finance_trends)
+        add_node("analyze_finance_anomalies", analyze_finance_anomalies)
+        add_node("generate_finance_predictions", generate_finance_predictions)
+
+        # HR nodes
+        add_node("analyze_hr_trends", analyze_hr_trends)
+        add_node("analyze_hr_anomalies", analyze_hr_anomalies)
+        add_node("generate_hr_predictions", generate_hr_predictions)
+
+        # Operations nodes
+        add_node("analyze_operations_trends", analyze_operations_trends)
+        add_node("analyze_operations_anomalies", analyze_operations_anomalies)
+        add_node("generate_operations_predictions", generate_operations_predictions)
+
+        # Sales nodes
+        add_node("analyze_sales_trends", analyze_sales_trends)
+        add_node("analyze_sales_anomalies", analyze_sales_anomalies)
+        add_node("generate_sales_predictions", generate_sales_predictions)
+
+        # Retail nodes
+        add_node("analyze_retail_trends", analyze_retail_trends)
+        add_node("analyze_retail_anomalies", analyze_retail_anomalies)
+        add_node("generate_retail_predictions", generate_retail_predictions)
+
+        # Generic fallback nodes
+        add_node("analyze_generic_trends", analyze_generic_trends)
+        add_node("analyze_generic_anomalies", analyze_generic_anomalies)
+        add_node("generate_generic_predictions", generate_generic_predictions)
+
+        # Conditional routing based on type
+        def route_after_classify(state: GraphState):
+            spreadsheet_type = state['spreadsheet_type'].lower()
+            if spreadsheet_type == 'finance':
+                return "analyze_finance_trends"
+            elif spreadsheet_type == 'hr':
+                return "analyze_hr_trends"
+            elif spreadsheet_type == 'operations':
+                return "analyze_operations_trends"
+            elif spreadsheet_type == 'sales':
+                return "analyze_sales_trends"
+            elif spreadsheet_type == 'retail':
+                return "analyze_retail_trends"
+            else:  # Unknown or any other type
+                return "analyze_generic_trends"
+
+        # Skip classification entirely when the caller already knows the type
+        def route_entry(state: GraphState):
+            if state['spreadsheet_type'] in self.types:
+                return route_after_classify(state)
+            return "classify"
+
+        # Set up the workflow structure
+        workflow.set_conditional_entry_point(route_entry)
+        workflow.add_conditional_edges("classify", route_after_classify)
+
+        # Chain edges for each domain (trends -> anomalies -> predictions -> END)
+        
+        # Finance chain
+        workflow.add_edge("analyze_finance_trends", "analyze_finance_anomalies")
+        workflow.add_edge("analyze_finance_anomalies", "generate_finance_predictions")
+        workflow.add_edge("generate_finance_predictions", END)
+
+        # HR chain
+        workflow.add_edge("analyze_hr_trends", "analyze_hr_anomalies")
+        workflow.add_edge("analyze_hr_anomalies", "generate_hr_predictions")
+        workflow.add_edge("generate_hr_predictions", END)
+
+        # Operations chain
+        workflow.add_edge("analyze_operations_trends", "analyze_operations_anomalies")
+        workflow.add_edge("analyze_operations_anomalies", "generate_operations_predictions")
+        workflow.add_edge("generate_operations_predictions", END)
+
+        # Sales chain
+        workflow.add_edge("analyze_sales_trends", "analyze_sales_anomalies")
+        workflow.add_edge("analyze_sales_anomalies", "generate_sales_predictions")
+        workflow.add_edge("generate_sales_predictions", END)
+
+        # Retail chain
+        workflow.add_edge("analyze_retail_trends", "analyze_retail_anomalies")
+        workflow.add_edge("analyze_retail_anomalies", "generate_retail_predictions")
+        workflow.add_edge("generate_retail_predictions", END)
+
+        # Generic chain
+        workflow.add_edge("analyze_generic_trends", "analyze_generic_anomalies")
+        workflow.add_edge("analyze_generic_anomalies", "generate_generic_predictions")
+        workflow.add_edge("generate_generic_predictions", END)
+
+        self._insight_graph = workflow.compile()
+        return self._insight_graph
+
+    async def _prepare_insight_run(self, json_data: Any, description: str, spreadsheet_type: Optional[str], computed_insights: Optional[Dict[str, Any]] = None):
+        """Sample the data and build the initial graph state shared by the blocking and streaming paths"""
+        with span("langgraph.sampling"):
+            sampling_result = self._smart_sample_data(json_data, max_rows=150, spreadsheet_type=spreadsheet_type)
+        sampled_data = sampling_result["sampled_data"]
+        sampling_metadata = sampling_result["metadata"]
+        
+        truncated_description = self._truncate_text(description)
+        sampled_json = json.dumps(sampled_data)
+
+        logger.info("Starting insight generation with smart sampling", 
+                   json_length=len(sampled_json),
+                   sampling_strategy=sampling_metadata.get("strategy"),
+                   total_rows=sampling_metadata.get("total_rows", 0),
+                   sampled_rows=sampling_metadata.get("sampled_rows", 0),
+                   column_info=sampling_metadata.get("column_info", {}))
+
+        # Outliers are found on the full rows; the LLM only explains them
+        column_mapper = self.analysis_services.get(spreadsheet_type) if spreadsheet_type else None
+        with span("langgraph.anomaly_detection"):
+            # A full pass over every row; kept off the event loop so other requests are not held up
+            detected_anomalies = await asyncio.to_thread(anomaly_detection_service.detect, json_data, column_mapper)
+        logger.info("Pre-detected anomalies", count=len(detected_anomalies), types=sorted({a["type"] for a in detected_anomalies}))
+
+        initial_state = GraphState(
+            json_data=sampled_data,
+            description=truncated_description,
+            spreadsheet_type=spreadsheet_type if spreadsheet_type in self.types else 'Unknown',
+            insights={},
+            detected_anomalies=detected_anomalies,
+            forecasts=self._collect_forecasts(computed_insights)
+        )
+        return initial_state, sampling_metadata
+
+    def _insights_metadata(self, sampling_metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Sampling information attached to the final insights for transparency"""
+        metadata = {
+            "sampling_applied": sampling_metadata.get("strategy") not in ["no_sampling_needed", "full_data"],
+            "total_rows_analyzed": sampling_metadata.get("total_rows", 0),
+            "sampled_rows_used": sampling_metadata.get("sampled_rows", 0),
+            "columns_prioritized": sampling_metadata.get("column_info", {}).get("kept_columns", 0),
+            "sampling_strategy": sampling_metadata.get("strategy", "unknown")
+        }
+        if "sheets" in sampling_metadata:
+            metadata["sheets"] = {
+                name: {
+                    "total_rows": meta.get("total_rows", 0),
+                    "sampled_rows": meta.get("sampled_rows", 0),
+                    "columns_prioritized": meta.get("column_info", {}).get("kept_columns", 0),
+                    "sampling_strategy": meta.get("strategy", "unknown")
+                }
+                for name, meta in sampling_metadata["sheets"].items()
+            }
+        return metadata
+
+    @timed("langgraph.generate_insights")
+    async def generate_insights(self, json_data: Dict[str, Any], description: str, spreadsheet_type: Optional[str] = None, computed_insights: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        try:
+            initial_state, sampling_metadata = await self._prepare_insight_run(json_data, description, spreadsheet_type, computed_insights)
+            graph = self._get_insight_graph()
             
             result = await graph.ainvoke(initial_state)
             logger.info("Insight generation completed", 
@@ -674,13 +1006,7 @@ class LangGraphService:
             })
             
             # Include sampling information in the response
-            final_insights["_metadata"] = {
-                "sampling_applied": sampling_metadata.get("strategy") not in ["no_sampling_needed", "full_data"],
-                "total_rows_analyzed": sampling_metadata.get("total_rows", 0),
-                "sampled_rows_used": sampling_metadata.get("sampled_rows", 0),
-                "columns_prioritized": sampling_metadata.get("column_info", {}).get("kept_columns", 0),
-                "sampling_strategy": sampling_metadata.get("strategy", "unknown")
-            }
+            final_insights["_metadata"] = self._insights_metadata(sampling_metadata)
             
             return final_insights
             
@@ -691,3 +1017,34 @@ class LangGraphService:
                 "anomalies": ["Error analyzing anomalies"],
                 "predictions": ["Error generating predictions"]
             }
+
+    async def stream_insights(self, json_data: Dict[str, Any], description: str, spreadsheet_type: Optional[str] = None, computed_insights: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run the insight workflow and yield {"stage", "data"} events as each node finishes:
+        classification, trends, anomalies, predictions, then "complete" with the full insights.
+        Errors propagate to the caller.
+        """
+        initial_state, sampling_metadata = await self._prepare_insight_run(json_data, description, spreadsheet_type, computed_insights)
+        graph = self._get_insight_graph()
+
+        if initial_state['spreadsheet_type'] in self.types:
+            yield {"stage": "classification", "data": {"spreadsheet_type": initial_state['spreadsheet_type'], "source": "provided"}}
+
+        final_state = initial_state
+        async for update in graph.astream(initial_state, stream_mode="updates"):
+            for node, state in update.items():
+                if not state:
+                    continue
+                final_state = state
+                if node == "classify":
+                    yield {"stage": "classification", "data": {"spreadsheet_type": state['spreadsheet_type']}}
+                else:
+                    stage = node.rsplit("_", 1)[-1]  # analyze_<domain>_trends -> trends
+                    yield {"stage": stage, "data": state['insights'].get(stage, [])}
+
+        final_insights = dict(final_state.get('insights') or {})
+        final_insights["_metadata"] = self._insights_metadata(sampling_metadata)
+        logger.info("Streamed insight generation completed",
+                   classified_type=final_state.get("spreadsheet_type", "Unknown"),
+                   insights_keys=[key for key in final_insights if key != "_metadata"])
+        yield {"stage": "complete", "data": final_insights}
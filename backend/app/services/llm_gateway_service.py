@@ -0,0 +1,225 @@
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
+from collections import deque
+from together import AsyncTogether
+from app.config.settings import settings
+from app.services.token_budget_service import token_budget_service
+from app.utils.logger import logger
+from app.utils.metrics import llm_request_duration, llm_time_to_first_token, llm_tokens
+from app.utils.timing import enclosing_span_name
+import asyncio
+import heapq
+import itertools
+import time
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = {INTERACTIVE: 0, BATCH: 1}
+
+
+class TokenBucket:
+    """Continuously refilling bucket; capacity is one minute's allowance"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        missing = amount - self.tokens
+        return max(0.0, missing / self.rate) if self.rate > 0 else float("inf")
+
+
+class LLMGatewayService:
+    """
+    Process-wide entry point for Together chat completions. One shared client, a
+    requests-per-minute and tokens-per-minute token bucket, and a priority queue so
+    interactive chat is admitted ahead of batch insight generation.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None
+    ):
+        self.client = AsyncTogether(api_key=settings.together_api_key)
+        self.request_bucket = TokenBucket(requests_per_minute or settings.llm_requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute or settings.llm_tokens_per_minute)
+        self._waiters: List[Tuple[int, int, float, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._wait_samples = {name: deque(maxlen=500) for name in PRIORITIES}
+        self._stats = {name: {"requests": 0, "total_wait_seconds": 0.0, "max_wait_seconds": 0.0} for name in PRIORITIES}
+
+    async def create(self, priority: str = BATCH, **kwargs) -> Any:
+        """Drop-in for client.chat.completions.create, admitted through the rate limiter"""
+        estimated_tokens = await self._admit(priority, kwargs)
+
+        model = kwargs.get("model", "unknown")
+        node = enclosing_span_name(skip_prefix="llm.") or "unknown"
+        started = time.monotonic()
+        try:
+            response = await self.client.chat.completions.create(**kwargs)
+        except Exception:
+            llm_request_duration.observe(time.monotonic() - started, model=model, node=node, status="error")
+            raise
+        llm_request_duration.observe(time.monotonic() - started, model=model, node=node, status="ok")
+        usage = getattr(response, "usage", None)
+        self._settle(estimated_tokens, usage)
+        self._record_usage(model, node, usage)
+        return response
+
+    async def stream(self, priority: str = INTERACTIVE, **kwargs) -> AsyncIterator[str]:
+        """
+        Streaming variant of create: yields content deltas as the provider sends them. The
+        request is admitted once up front; usage arrives with the last chunk and settles the
+        token bucket like a regular completion.
+        """
+        estimated_tokens = await self._admit(priority, kwargs)
+
+        model = kwargs.get("model", "unknown")
+        node = enclosing_span_name(skip_prefix="llm.") or "unknown"
+        started = time.monotonic()
+        usage = None
+        first_token = True
+        try:
+            chunks = await self.client.chat.completions.create(stream=True, **kwargs)
+            async for chunk in chunks:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                for choice in chunk.choices or []:
+                    content = choice.delta.content if choice.delta is not None else None
+                    if not content:
+                        continue
+                    if first_token:
+                        llm_time_to_first_token.observe(time.monotonic() - started, model=model, node=node)
+                        first_token = False
+                    yield content
+        except Exception:
+            llm_request_duration.observe(time.monotonic() - started, model=model, node=node, status="error")
+            raise
+        llm_request_duration.observe(time.monotonic() - started, model=model, node=node, status="ok")
+        self._settle(estimated_tokens, usage)
+        self._record_usage(model, node, usage)
+
+    async def _admit(self, priority: str, kwargs: Dict[str, Any]) -> float:
+        """Wait for rate-limit admission; returns the token estimate deducted from the bucket"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown LLM priority: {priority}")
+        estimated_tokens = self._estimate_tokens(kwargs.get("messages", []), kwargs.get("max_tokens", 512))
+
+        started = time.monotonic()
+        await self._acquire(priority, estimated_tokens)
+        self._record_wait(priority, time.monotonic() - started)
+        return estimated_tokens
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Queue-wait statistics per priority class plus current bucket levels"""
+        now = time.monotonic()
+        self.request_bucket.refill(now)
+        self.token_bucket.refill(now)
+        queued = self.queued_counts()
+
+        priorities = {}
+        for name, stats in self._stats.items():
+            samples = sorted(self._wait_samples[name])
+            priorities[name] = {
+                **stats,
+                "queued": queued[name],
+                "p50_wait_seconds": samples[len(samples) // 2] if samples else 0.0,
+                "p95_wait_seconds": samples[min(len(samples) - 1, int(len(samples) * 0.95))] if samples else 0.0
+            }
+        return {
+            "requests_available": round(self.request_bucket.tokens, 2),
+            "tokens_available": round(self.token_bucket.tokens, 2),
+            "priorities": priorities
+        }
+
+    def _estimate_tokens(self, messages: List[Dict[str, Any]], max_tokens: int) -> float:
+        prompt_tokens = sum(token_budget_service.count_tokens(str(m.get("content", ""))) for m in messages)
+        # A request larger than the whole bucket could never be admitted; cap it at capacity
+        return float(min(prompt_tokens + max_tokens, self.token_bucket.capacity))
+
+    async def _acquire(self, priority: str, tokens: float) -> None:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (PRIORITIES[priority], next(self._sequence), tokens, future))
+        self._ensure_dispatcher()
+        self._wakeup.set()
+        # If the caller is cancelled while queued, the dispatcher skips its future without deducting
+        await future
+
+    def _ensure_dispatcher(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        """Admit waiters strictly in (priority, arrival) order as the buckets allow"""
+        while True:
+            while self._waiters and self._waiters[0][3].done():
+                heapq.heappop(self._waiters)
+            if not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            _, _, tokens, future = self._waiters[0]
+            now = time.monotonic()
+            self.request_bucket.refill(now)
+            self.token_bucket.refill(now)
+            delay = max(self.request_bucket.wait_time(1), self.token_bucket.wait_time(tokens))
+            if delay <= 0:
+                heapq.heappop(self._waiters)
+                self.request_bucket.tokens -= 1
+                self.token_bucket.tokens -= tokens
+                future.set_result(None)
+                continue
+
+            # Sleep until the head fits, but wake early if a higher-priority request arrives
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _settle(self, estimated_tokens: float, usage: Any) -> None:
+        """Correct the token bucket with the provider-reported usage when available"""
+        actual = getattr(usage, "total_tokens", None) if usage is not None else None
+        if actual is None:
+            return
+        self.token_bucket.tokens = min(self.token_bucket.capacity, self.token_bucket.tokens + estimated_tokens - actual)
+
+    def _record_usage(self, model: str, node: str, usage: Any) -> None:
+        if usage is None:
+            return
+        for direction, field in (("prompt", "prompt_tokens"), ("completion", "completion_tokens")):
+            count = getattr(usage, field, None)
+            if count:
+                llm_tokens.inc(count, model=model, node=node, direction=direction)
+
+    def queued_counts(self) -> Dict[str, int]:
+        """Requests waiting for admission, per priority class"""
+        queued = {name: 0 for name in PRIORITIES}
+        for rank, _, _, future in self._waiters:
+            if not future.done():
+                queued[next(name for name, value in PRIORITIES.items() if value == rank)] += 1
+        return queued
+
+    def _record_wait(self, priority: str, waited: float) -> None:
+        stats = self._stats[priority]
+        stats["requests"] += 1
+        stats["total_wait_seconds"] += waited
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+        self._wait_samples[priority].append(waited)
+        if waited > 1.0:
+            logger.info("LLM request waited for rate limit", priority=priority, wait_seconds=round(waited, 3))
+
+
+llm_gateway = LLMGatewayService()
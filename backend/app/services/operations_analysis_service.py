@@ -2,6 +2,8 @@ import pandas as pd
 import numpy as np
 from typing import Dict, Any, List, Optional, Tuple
 from app.utils.logger import logger
+from app.utils.timing import timed
+from app.services.forecasting_service import forecasting_service
 import re
 from datetime import datetime
 
@@ -123,6 +125,7 @@ class OperationsAnalysisService:
             ]
         }
 
+    @timed("operations.compute_operations_insights")
     def compute_operations_insights(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Compute comprehensive operations insights from the dataframe"""
         try:
@@ -270,6 +273,7 @@ class OperationsAnalysisService:
     def _can_analyze_time_trends(self, mappings: Dict[str, Optional[str]]) -> bool:
         return mappings.get('order_date') is not None and mappings.get('quantity') is not None
 
+    @timed("operations.analyze_order_fulfillment")
     def _analyze_order_fulfillment(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze order fulfillment metrics"""
         insights = {}
@@ -334,6 +338,7 @@ class OperationsAnalysisService:
         
         return insights
 
+    @timed("operations.analyze_inventory_management")
     def _analyze_inventory_management(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze inventory management metrics"""
         insights = {}
@@ -399,6 +404,7 @@ class OperationsAnalysisService:
         
         return insights
 
+    @timed("operations.analyze_supply_chain_performance")
     def _analyze_supply_chain_performance(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze supply chain performance metrics"""
         insights = {}
@@ -481,6 +487,7 @@ class OperationsAnalysisService:
         
         return insights
 
+    @timed("operations.analyze_quality_metrics")
     def _analyze_quality_metrics(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze quality control metrics"""
         insights = {}
@@ -550,6 +557,7 @@ class OperationsAnalysisService:
         
         return insights
 
+    @timed("operations.analyze_production_efficiency")
     def _analyze_production_efficiency(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze production efficiency metrics"""
         insights = {}
@@ -614,6 +622,7 @@ class OperationsAnalysisService:
         
         return insights
 
+    @timed("operations.analyze_delivery_performance")
     def _analyze_delivery_performance(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze delivery performance metrics"""
         insights = {}
@@ -681,6 +690,7 @@ class OperationsAnalysisService:
         
         return insights
 
+    @timed("operations.analyze_regional_operations")
     def _analyze_regional_operations(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze regional operations performance"""
         insights = {}
@@ -740,6 +750,7 @@ class OperationsAnalysisService:
         
         return insights
 
+    @timed("operations.analyze_operational_costs")
     def _analyze_operational_costs(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze operational cost metrics"""
         insights = {}
@@ -811,6 +822,7 @@ class OperationsAnalysisService:
         
         return insights
 
+    @timed("operations.analyze_operational_trends")
     def _analyze_operational_trends(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze operational trends over time"""
         insights = {}
@@ -858,6 +870,20 @@ class OperationsAnalysisService:
                 
                 insights['monthly_operational_trends'].append(trend_data)
             
+            # Local forecasts with prediction intervals for volume, cost and per-product volume
+            quantity_forecast = forecasting_service.forecast_frame(df_trends, order_date_col, quantity_col)
+            if quantity_forecast:
+                insights['quantity_forecast'] = quantity_forecast
+            if cost_col:
+                cost_forecast = forecasting_service.forecast_frame(df_trends, order_date_col, cost_col)
+                if cost_forecast:
+                    insights['cost_forecast'] = cost_forecast
+            product_col = mappings.get('product_name') or mappings.get('product_id')
+            if product_col:
+                product_forecasts = forecasting_service.forecast_frame(df_trends, order_date_col, quantity_col, group_col=product_col, group_label='product')
+                if product_forecasts:
+                    insights['quantity_forecast_by_product'] = product_forecasts
+            
             # Weekly patterns
             df_trends['day_of_week'] = df_trends[order_date_col].dt.day_name()
             daily_patterns = df_trends.groupby('day_of_week')[quantity_col].agg(['sum', 'count']).round(2)
@@ -4,6 +4,8 @@ import aiohttp
 import json
 from fastapi import HTTPException
 from app.utils.logger import logger
+from app.utils.timing import span, timed
+from app.config.settings import settings
 from app.services.sales_analysis_service import SalesAnalysisService
 from app.services.retail_analysis_service import RetailAnalysisService
 from app.services.hr_analysis_service import HRAnalysisService
@@ -20,6 +22,7 @@ class ParserService:
         self.finance_analysis_service = FinanceAnalysisService()
         self.operations_analysis_service = OperationsAnalysisService()
 
+    @timed("parse_spreadsheet")
     async def parse_spreadsheet(
         self,
         storage_path: str,            # e.g. "user123/fake_business_data.xlsx"
@@ -33,12 +36,14 @@ class ParserService:
             file_name = storage_path.rsplit("/", 1)[1] if "/" in storage_path else storage_path
 
             # Check if file exists in bucket
-            objects = self.supabase_client.storage.from_("spreadsheets").list(folder)
+            with span("storage.list", folder=folder):
+                objects = self.supabase_client.storage.from_("spreadsheets").list(folder)
             if not any(obj["name"] == file_name for obj in objects):
                 raise HTTPException(status_code=404, detail=f"File not found in storage: {storage_path}")
 
             # Create signed download URL (valid 60s)
-            signed_url_response = self.supabase_client.storage.from_("spreadsheets").create_signed_url(storage_path, 60)
+            with span("storage.signed_url"):
+                signed_url_response = self.supabase_client.storage.from_("spreadsheets").create_signed_url(storage_path, 60)
 
             # Debug raw response
             logger.debug("Signed URL raw response", response=signed_url_response)
@@ -57,15 +62,9 @@ class ParserService:
                 raise HTTPException(status_code=500, detail="Failed to generate signed URL")
 
             # Download file from signed URL
-            async with aiohttp.ClientSession() as session:
-                async with session.get(download_url) as response:
-                    if response.status != 200:
-                        error_detail = await response.text()
-                        raise HTTPException(
-                            status_code=400,
-                            detail=f"Failed to download file: {response.reason} - {error_detail}"
-                        )
-                    file_content = await response.read()
+            with span("storage.download") as download_span:
+                file_content = await self._download(download_url)
+                download_span["bytes"] = len(file_content)
 
             # Parse into DataFrame(s)
             json_data = {}
@@ -74,19 +73,16 @@ class ParserService:
 
             if file_type == "csv":
                 # CSV files don't have multiple sheets
-                df = pd.read_csv(io.BytesIO(file_content))
-                json_data["Sheet1"] = json.loads(df.to_json(orient="records"))
-                description["Sheet1"] = self._generate_description(df)
-                if compute_insights:
-                    computed_insights["Sheet1"] = self._compute_insights(df, spreadsheet_type)
+                with span("parse.read_csv", bytes=len(file_content)):
+                    df = pd.read_csv(io.BytesIO(file_content))
+                self._convert_sheet("Sheet1", df, spreadsheet_type, json_data, description, computed_insights)
             elif file_type in ["xls", "xlsx"]:
                 # Load all sheets for Excel files
-                dfs = pd.read_excel(io.BytesIO(file_content), engine="openpyxl", sheet_name=None)
+                with span("parse.read_excel", bytes=len(file_content)) as read_span:
+                    dfs = pd.read_excel(io.BytesIO(file_content), engine="openpyxl", sheet_name=None)
+                    read_span["sheets"] = len(dfs)
                 for sheet_name, df in dfs.items():
-                    json_data[sheet_name] = json.loads(df.to_json(orient="records"))
-                    description[sheet_name] = self._generate_description(df)
-                    if compute_insights:
-                        computed_insights[sheet_name] = self._compute_insights(df, spreadsheet_type)
+                    self._convert_sheet(sheet_name, df, spreadsheet_type, json_data, description, computed_insights)
             else:
                 raise HTTPException(status_code=400, detail=f"Unsupported file type: {file_type}")
 
@@ -117,6 +113,27 @@ class ParserService:
             )
             raise HTTPException(status_code=500, detail=f"Parsing error: {str(e)}")
 
+    async def _download(self, download_url: str) -> bytes:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(download_url) as response:
+                if response.status != 200:
+                    error_detail = await response.text()
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Failed to download file: {response.reason} - {error_detail}"
+                    )
+                return await response.read()
+
+    def _convert_sheet(self, sheet_name: str, df: pd.DataFrame, spreadsheet_type: str, json_data: dict, description: dict, computed_insights: dict | None) -> None:
+        """Records, description and (optionally) computed insights for one sheet, each timed separately"""
+        with span("parse.to_json", sheet=sheet_name, rows=len(df), columns=len(df.columns)):
+            json_data[sheet_name] = json.loads(df.to_json(orient="records"))
+        with span("parse.describe", sheet=sheet_name):
+            description[sheet_name] = self._generate_description(df)
+        if computed_insights is not None:
+            with span("parse.compute_insights", sheet=sheet_name, spreadsheet_type=spreadsheet_type, rows=len(df)):
+                computed_insights[sheet_name] = self._compute_insights(df, spreadsheet_type)
+
     def _compute_insights(self, df: pd.DataFrame, spreadsheet_type: str) -> dict:
         try:
             if spreadsheet_type == "Sales":
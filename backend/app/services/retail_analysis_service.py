@@ -2,6 +2,7 @@ import pandas as pd
 import numpy as np
 from typing import Dict, Any, List, Optional, Tuple
 from app.utils.logger import logger
+from app.utils.timing import timed
 import re
 
 class RetailAnalysisService:
@@ -58,6 +59,7 @@ class RetailAnalysisService:
             ]
         }
 
+    @timed("retail.compute_retail_insights")
     def compute_retail_insights(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Compute comprehensive retail business insights from the dataframe"""
         try:
@@ -186,6 +188,7 @@ class RetailAnalysisService:
     def _can_analyze_time(self, mappings: Dict[str, Optional[str]]) -> bool:
         return mappings.get('date') is not None and mappings.get('quantity_sold') is not None
 
+    @timed("retail.analyze_product_performance")
     def _analyze_product_performance(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze individual product performance"""
         insights = {}
@@ -242,6 +245,7 @@ class RetailAnalysisService:
         
         return insights
 
+    @timed("retail.analyze_category_performance")
     def _analyze_category_performance(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze category performance"""
         insights = {}
@@ -282,6 +286,7 @@ class RetailAnalysisService:
         
         return insights
 
+    @timed("retail.analyze_brand_performance")
     def _analyze_brand_performance(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze brand performance"""
         insights = {}
@@ -321,6 +326,7 @@ class RetailAnalysisService:
         
         return insights
 
+    @timed("retail.analyze_inventory_metrics")
     def _analyze_inventory_metrics(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze inventory levels and turnover"""
         insights = {}
@@ -361,6 +367,7 @@ class RetailAnalysisService:
         
         return insights
 
+    @timed("retail.analyze_pricing_strategy")
     def _analyze_pricing_strategy(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze pricing and margin strategies"""
         insights = {}
@@ -415,6 +422,7 @@ class RetailAnalysisService:
         
         return insights
 
+    @timed("retail.analyze_store_performance")
     def _analyze_store_performance(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze performance across different stores"""
         insights = {}
@@ -453,6 +461,7 @@ class RetailAnalysisService:
         
         return insights
 
+    @timed("retail.analyze_seasonal_trends")
     def _analyze_seasonal_trends(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze seasonal and time-based trends"""
         insights = {}
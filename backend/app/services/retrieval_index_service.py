@@ -0,0 +1,148 @@
+from typing import Dict, Any, List, Optional
+from app.utils.logger import logger
+import pandas as pd
+import numpy as np
+import calendar
+import base64
+import math
+import sys
+import zlib
+import re
+
+# Bumped whenever tokenization or the payload layout changes; stored indexes of another version are rebuilt
+INDEX_VERSION = 1
+# Question words that never identify a row
+QUERY_STOP_WORDS = {
+    "what", "whats", "which", "who", "whom", "when", "where", "why", "how", "is", "are", "was", "were", "did", "do",
+    "does", "the", "a", "an", "of", "in", "on", "for", "to", "from", "by", "with", "and", "or", "at", "me", "show",
+    "tell", "give", "list", "much", "many", "our", "my", "their", "his", "her", "its", "any", "all"
+}
+ISO_DATE = re.compile(r"^(\d{4})-(\d{2})-\d{2}")
+TOKEN = re.compile(r"[a-z0-9]+")
+MONTH_NAMES = [name.lower() for name in calendar.month_name]
+
+
+def _tokens(value: str) -> List[str]:
+    """Words of a cell value; ISO dates also yield their month name so "March" finds 2024-03-15"""
+    tokens = TOKEN.findall(value.lower())
+    date = ISO_DATE.match(value)
+    if date and 1 <= int(date.group(2)) <= 12:
+        tokens.append(MONTH_NAMES[int(date.group(2))])
+    return tokens
+
+
+def _encode(array: np.ndarray) -> str:
+    """Ascending ids as zlib-compressed int32 deltas, which are mostly small and compress well"""
+    deltas = np.diff(np.asarray(array, dtype=np.int64), prepend=0).astype(np.int32)
+    return base64.b64encode(zlib.compress(deltas.tobytes(), 1)).decode("ascii")
+
+
+def _decode(text: str) -> np.ndarray:
+    return np.cumsum(np.frombuffer(zlib.decompress(base64.b64decode(text)), dtype=np.int32), dtype=np.int64)
+
+
+class RowIndex:
+    """
+    BM25 index over the rows of one sheet. Postings are stored term by term as row ids, a row
+    appearing once per occurrence of the term, so term frequencies are a count away.
+    """
+    k1 = 1.5
+    b = 0.75
+
+    def __init__(self, terms: List[str], offsets: np.ndarray, postings: np.ndarray, lengths: np.ndarray):
+        self.terms = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.postings = postings
+        self.lengths = lengths
+        self.avg_length = float(lengths.mean()) if len(lengths) else 0.0
+        self.nbytes = offsets.nbytes + postings.nbytes + lengths.nbytes + sys.getsizeof(self.terms) + sum(sys.getsizeof(t) for t in terms)
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def search(self, question: str, k: int) -> List[int]:
+        """Positions of the k rows best matching the question, best first; rows sharing no word are never returned"""
+        words = [w for w in TOKEN.findall(question.lower()) if w not in QUERY_STOP_WORDS]
+        term_ids = set()
+        for word in words:
+            for form in (word, word[:-1] if word.endswith("s") and len(word) > 3 else None):
+                if form in self.terms:
+                    term_ids.add(self.terms[form])
+        if not term_ids or not len(self) or k <= 0:
+            return []
+
+        scores = np.zeros(len(self), dtype=np.float64)
+        norms = self.k1 * (1 - self.b + self.b * self.lengths / (self.avg_length or 1.0))
+        for term_id in term_ids:
+            rows, tf = np.unique(self.postings[self.offsets[term_id]:self.offsets[term_id + 1]], return_counts=True)
+            idf = math.log(1 + (len(self) - len(rows) + 0.5) / (len(rows) + 0.5))
+            scores[rows] += idf * tf * (self.k1 + 1) / (tf + norms[rows])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        return [int(i) for i in matched[np.argsort(-scores[matched], kind="stable")]]
+
+
+class RetrievalIndexService:
+    """
+    Builds the per-sheet row indexes stored with an analysis, so chat can put the rows a
+    question is about into the prompt ("what did ACME pay in March?") rather than only the
+    aggregate insights. Text cells and numeric identifiers are indexed; other numbers are not.
+    """
+
+    def build(self, json_data: Any) -> Dict[str, Dict[str, Any]]:
+        """Serializable index per sheet of {sheet_name: [rows]} (or "" for a plain row list), as saved with the analysis"""
+        sheets = json_data.items() if isinstance(json_data, dict) else [("", json_data)]
+        return {sheet: self._build_sheet(rows) for sheet, rows in sheets if isinstance(rows, list) and rows}
+
+    def load(self, payload: Optional[Dict[str, Any]], rows: List[Dict[str, Any]]) -> RowIndex:
+        """Index from one sheet's stored payload, rebuilt from the rows when it is missing or stale"""
+        if not payload or payload.get("version") != INDEX_VERSION or payload.get("rows") != len(rows):
+            logger.info("Building row index for chat", rows=len(rows), stored=bool(payload))
+            payload = self._build_sheet(rows)
+        lengths = np.diff(_decode(payload["lengths"]), prepend=0)
+        return RowIndex(payload["terms"], _decode(payload["offsets"]), _decode(payload["postings"]), lengths)
+
+    def _is_identifier(self, values: pd.Series) -> bool:
+        """Whole numbers that are mostly distinct (invoice or order numbers), unlike quantities or amounts"""
+        present = values.dropna()
+        return bool(len(present)) and bool((present % 1 == 0).all()) and present.nunique() >= 0.5 * len(present)
+
+    def _build_sheet(self, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        df = pd.DataFrame.from_records(rows)
+        vocabulary: Dict[str, int] = {}
+        row_parts, term_parts = [], []
+        for col in df.columns:
+            values = df[col]
+            if pd.api.types.is_bool_dtype(values) or (pd.api.types.is_numeric_dtype(values) and not self._is_identifier(values)):
+                continue
+            if pd.api.types.is_float_dtype(values):
+                values = values.astype("Int64")  # Ids with gaps load as floats; index 10423, not 10423.0
+            # Tokenize each distinct value once; ids and categories repeat across rows
+            codes, uniques = pd.factorize(values)
+            unique_terms = [[vocabulary.setdefault(t, len(vocabulary)) for t in _tokens(str(u))] for u in uniques]
+            counts = np.array([len(t) for t in unique_terms] + [0], dtype=np.int64)[codes]  # code -1 (missing) has no terms
+            if not counts.sum():
+                continue
+            flat = np.array([t for terms in unique_terms for t in terms], dtype=np.int64)
+            starts = np.concatenate([[0], np.cumsum([len(t) for t in unique_terms])])[codes]
+            row_parts.append(np.repeat(np.arange(len(df)), counts))
+            offsets_in_row = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            term_parts.append(flat[np.repeat(starts, counts) + offsets_in_row])
+
+        row_ids = np.concatenate(row_parts) if row_parts else np.zeros(0, dtype=np.int64)
+        term_ids = np.concatenate(term_parts) if term_parts else np.zeros(0, dtype=np.int64)
+        order = np.lexsort((row_ids, term_ids))
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)))])
+        return {
+            "version": INDEX_VERSION,
+            "rows": len(df),
+            "terms": list(vocabulary),
+            "offsets": _encode(offsets),
+            "postings": _encode(row_ids[order]),
+            "lengths": _encode(np.bincount(row_ids, minlength=len(df)).cumsum())
+        }
+
+
+retrieval_index_service = RetrievalIndexService()
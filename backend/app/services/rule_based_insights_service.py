@@ -0,0 +1,236 @@
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+from app.config.settings import settings
+from app.utils.logger import logger
+import re
+import time
+
+
+class RuleBasedInsightsService:
+    """
+    Deterministic trends / anomalies / predictions from computed insights, without an LLM.
+    Used for free plans and for datasets small enough that the LLM adds little.
+    """
+
+    def __init__(self):
+        self.period_keys = ['month', 'period', 'week', 'quarter', 'year', 'date']
+        # Derived metrics that are already rates; growth on them reads badly
+        self.skip_metric_keywords = ['percent', 'rate', 'growth', 'ratio']
+        self.primary_metric_keywords = ['revenue', 'sales', 'amount', 'profit', 'total', 'cost', 'expense', 'salary', 'orders', 'hires']
+        self.max_items = 3
+
+    def should_use(self, plan: Optional[str], total_rows: Optional[int] = None) -> bool:
+        """
+        Fast path for configured plans (free by default), or for small datasets when total_rows
+        is given. Explicit AI analysis requests leave it out: they asked for the LLM.
+        """
+        fast_path_plans = [p.strip() for p in settings.fast_path_plans.split(",") if p.strip()]
+        return plan in fast_path_plans or (total_rows is not None and total_rows <= settings.fast_path_max_rows)
+
+    def generate_insights(self, computed_insights: Optional[Dict[str, Any]], spreadsheet_type: Optional[str] = None) -> Dict[str, Any]:
+        """Same shape as LangGraphService.generate_insights: trends, anomalies, predictions and _metadata"""
+        started = time.perf_counter()
+        sheets = self._sheets(computed_insights)
+        show_sheet = len(sheets) > 1
+
+        trends: List[Tuple[float, str]] = []
+        anomalies: List[Tuple[float, str]] = []
+        predictions: List[Tuple[float, str]] = []
+        series_analyzed = 0
+
+        for sheet_name, insights in sheets.items():
+            for key, value in insights.items():
+                context = f" [{sheet_name}]" if show_sheet else ""
+                if key.endswith('_forecast') and isinstance(value, dict) and value.get('forecast'):
+                    # Model forecasts from ForecastingService outrank the simple projections below
+                    predictions.append((1000 * self._metric_weight(key, key), self._model_forecast_text(key, value) + context))
+                    continue
+                series = self._as_time_series(value)
+                if series:
+                    period_key, periods, metrics = series
+                    for metric, values in metrics.items():
+                        series_analyzed += 1
+                        weight = self._metric_weight(metric, key)
+                        trends.extend((score * weight, text + context) for score, text in self._trend_items(metric, periods, values, period_key))
+                        anomalies.extend((score * weight, text + context) for score, text in self._series_outliers(metric, periods, values))
+                        forecast = self._forecast(metric, periods, values, period_key)
+                        if forecast:
+                            predictions.append((forecast[0] * weight, forecast[1] + context))
+                    continue
+
+                breakdown = self._as_breakdown(value)
+                if breakdown:
+                    label_key, labels, metrics = breakdown
+                    for metric, values in metrics.items():
+                        weight = self._metric_weight(metric, key)
+                        anomalies.extend((score * weight, text + context) for score, text in self._category_outliers(metric, labels, values, label_key))
+
+        result = {
+            "trends": self._top(trends) or ["Not enough time-based data to identify trends"],
+            "anomalies": self._top(anomalies) or ["No statistically unusual values detected"],
+            "predictions": self._top(predictions) or ["Not enough history to project the next period"],
+            "_metadata": {
+                "generator": "rule_based",
+                "spreadsheet_type": spreadsheet_type,
+                "series_analyzed": series_analyzed,
+                "sampling_applied": False,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+            }
+        }
+        logger.info("Rule-based insights generated", spreadsheet_type=spreadsheet_type, series_analyzed=series_analyzed, elapsed_ms=result["_metadata"]["elapsed_ms"])
+        return result
+
+    # ---------- Shape detection ----------
+    def _sheets(self, computed_insights: Optional[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """computed_insights is {sheet_name: insights}; tolerate a single flat insights dict too"""
+        if not isinstance(computed_insights, dict) or not computed_insights:
+            return {}
+        if all(isinstance(v, dict) for v in computed_insights.values()):
+            return computed_insights
+        return {"Sheet1": computed_insights}
+
+    def _numeric_fields(self, rows: List[Dict[str, Any]], exclude: str) -> Dict[str, np.ndarray]:
+        fields = {}
+        for field in rows[0].keys():
+            if field == exclude or any(k in field.lower() for k in self.skip_metric_keywords):
+                continue
+            values = [row.get(field) for row in rows]
+            if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+                fields[field] = np.asarray(values, dtype=float)
+        return fields
+
+    def _as_time_series(self, value: Any) -> Optional[Tuple[str, List[str], Dict[str, np.ndarray]]]:
+        if not isinstance(value, list) or len(value) < 3 or not all(isinstance(row, dict) for row in value):
+            return None
+        period_key = next((k for k in value[0].keys() if any(k == p or k.endswith('_' + p) for p in self.period_keys)), None)
+        if period_key is None or not all(isinstance(row.get(period_key), str) for row in value):
+            return None
+        rows = sorted(value, key=lambda row: row[period_key])
+        metrics = self._numeric_fields(rows, period_key)
+        if not metrics:
+            return None
+        return period_key, [row[period_key] for row in rows], metrics
+
+    def _as_breakdown(self, value: Any) -> Optional[Tuple[str, List[str], Dict[str, np.ndarray]]]:
+        if not isinstance(value, list) or len(value) < 5 or not all(isinstance(row, dict) for row in value):
+            return None
+        label_key = next((k for k, v in value[0].items() if isinstance(v, str)), None)
+        if label_key is None:
+            return None
+        metrics = self._numeric_fields(value, label_key)
+        if not metrics:
+            return None
+        return label_key, [str(row.get(label_key)) for row in value], metrics
+
+    # ---------- Rules ----------
+    def _trend_items(self, metric: str, periods: List[str], values: np.ndarray, period_key: str) -> List[Tuple[float, str]]:
+        items = []
+        name = self._label(metric)
+        previous, last = values[-2], values[-1]
+        if previous != 0:
+            change = (last - previous) / abs(previous) * 100
+            unit = "month over month" if "month" in period_key else "period over period"
+            items.append((abs(change), f"{name} {'rose' if change >= 0 else 'fell'} {abs(change):.1f}% {unit} ({periods[-2]}: {self._fmt(previous)} → {periods[-1]}: {self._fmt(last)})"))
+
+        if "month" in period_key and len(values) >= 13 and values[-13] != 0:
+            yoy = (last - values[-13]) / abs(values[-13]) * 100
+            items.append((abs(yoy) * 1.2, f"{name} is {'up' if yoy >= 0 else 'down'} {abs(yoy):.1f}% year over year ({periods[-13]} → {periods[-1]})"))
+
+        mean = values.mean()
+        if len(values) >= 4 and mean != 0:
+            slope = np.polyfit(np.arange(len(values)), values, 1)[0]
+            per_period = slope / abs(mean) * 100
+            if abs(per_period) >= 1:
+                direction = "upward" if per_period > 0 else "downward"
+                items.append((abs(per_period) * len(values) / 2, f"{name} shows a steady {direction} trend of about {abs(per_period):.1f}% of its average per period across {len(values)} periods"))
+        return items
+
+    def _series_outliers(self, metric: str, periods: List[str], values: np.ndarray) -> List[Tuple[float, str]]:
+        if len(values) < 4:
+            return []
+        return [
+            (abs(z) * 10, f"{periods[i]} {self._label(metric).lower()} of {self._fmt(values[i])} is {abs(z):.1f} standard deviations {'above' if z > 0 else 'below'} the average of {self._fmt(values.mean())}")
+            for i, z in self._outlier_indices(values)
+        ]
+
+    def _category_outliers(self, metric: str, labels: List[str], values: np.ndarray, label_key: str) -> List[Tuple[float, str]]:
+        return [
+            (abs(z) * 8, f"{self._label(label_key)} '{labels[i]}' has unusually {'high' if z > 0 else 'low'} {self._label(metric).lower()} ({self._fmt(values[i])} vs. average {self._fmt(values.mean())}, z={z:.1f})")
+            for i, z in self._outlier_indices(values)
+        ]
+
+    def _outlier_indices(self, values: np.ndarray) -> List[Tuple[int, float]]:
+        std = values.std()
+        if std == 0:
+            return []
+        z_scores = (values - values.mean()) / std
+        threshold = 2.0 if len(values) < 10 else 2.5
+        return [(int(i), float(z_scores[i])) for i in np.flatnonzero(np.abs(z_scores) >= threshold)]
+
+    def _forecast(self, metric: str, periods: List[str], values: np.ndarray, period_key: str) -> Optional[Tuple[float, str]]:
+        if len(values) < 3:
+            return None
+        next_period = self._next_period(periods[-1])
+        if "month" in period_key and len(values) >= 24:
+            # Seasonal naive with drift: same month last year, scaled by the recent year-over-year level
+            recent, year_ago = values[-3:].mean(), values[-15:-12].mean()
+            ratio = recent / year_ago if year_ago else 1.0
+            forecast = values[-12] * ratio
+            method = "seasonal naive"
+        else:
+            window = values[-12:]
+            slope, intercept = np.polyfit(np.arange(len(window)), window, 1)
+            forecast = slope * len(window) + intercept
+            method = "linear trend"
+        last = values[-1]
+        change = (forecast - last) / abs(last) * 100 if last else 0.0
+        if (values >= 0).all():
+            forecast = max(0.0, forecast)
+        return (
+            abs(change) + 5,
+            f"{self._label(metric)} is projected at about {self._fmt(forecast)} for {next_period} ({'+' if change >= 0 else '-'}{abs(change):.1f}% vs. {periods[-1]}, {method})"
+        )
+
+    def _model_forecast_text(self, key: str, value: Dict[str, Any]) -> str:
+        nxt = value['forecast'][0]
+        method = value.get('method', 'model').replace('_', ' ')
+        return f"{self._label(key.replace('_forecast', ''))} is forecast at {self._fmt(nxt['value'])} for {nxt['month']} (95% interval {self._fmt(nxt['lower'])}–{self._fmt(nxt['upper'])}, {method})"
+
+    # ---------- Formatting ----------
+    def _metric_weight(self, metric: str, series_key: str) -> float:
+        text = f"{metric} {series_key}".lower()
+        return 1.5 if any(k in text for k in self.primary_metric_keywords) else 1.0
+
+    def _top(self, items: List[Tuple[float, str]]) -> List[str]:
+        seen = []
+        for _, text in sorted(items, key=lambda item: item[0], reverse=True):
+            if text not in seen:
+                seen.append(text)
+            if len(seen) >= self.max_items:
+                break
+        return seen
+
+    def _next_period(self, period: str) -> str:
+        match = re.fullmatch(r"(\d{4})-(\d{2})", period)
+        if match:
+            year, month = int(match.group(1)), int(match.group(2))
+            return f"{year + month // 12}-{month % 12 + 1:02d}"
+        match = re.fullmatch(r"(\d{4})Q([1-4])", period)
+        if match:
+            year, quarter = int(match.group(1)), int(match.group(2))
+            return f"{year + quarter // 4}Q{quarter % 4 + 1}"
+        if re.fullmatch(r"\d{4}", period):
+            return str(int(period) + 1)
+        return "the next period"
+
+    def _label(self, key: str) -> str:
+        return key.replace("_", " ").strip().capitalize()
+
+    def _fmt(self, value: float) -> str:
+        value = float(value)
+        if abs(value) >= 1000 or value == int(value):
+            return f"{value:,.0f}"
+        return f"{value:,.2f}"
+
+
+rule_based_insights_service = RuleBasedInsightsService()
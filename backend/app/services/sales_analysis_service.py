@@ -2,6 +2,8 @@ import pandas as pd
 import numpy as np
 from typing import Dict, Any, List, Optional, Tuple
 from app.utils.logger import logger
+from app.utils.timing import timed
+from app.services.forecasting_service import forecasting_service
 import re
 
 class SalesAnalysisService:
@@ -44,6 +46,7 @@ class SalesAnalysisService:
             ]
         }
 
+    @timed("sales.compute_sales_insights")
     def compute_sales_insights(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Compute actual business insights from the dataframe"""
         try:
@@ -162,6 +165,7 @@ class SalesAnalysisService:
     def _can_analyze_regions(self, mappings: Dict[str, Optional[str]]) -> bool:
         return mappings.get('region') is not None and mappings.get('revenue') is not None
 
+    @timed("sales.analyze_sales_data")
     def _analyze_sales_data(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze sales representative performance"""
         insights = {}
@@ -222,6 +226,7 @@ class SalesAnalysisService:
         
         return insights
 
+    @timed("sales.analyze_product_data")
     def _analyze_product_data(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze product performance"""
         insights = {}
@@ -278,6 +283,7 @@ class SalesAnalysisService:
         
         return insights
 
+    @timed("sales.analyze_customer_data")
     def _analyze_customer_data(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze customer behavior and value"""
         insights = {}
@@ -327,6 +333,7 @@ class SalesAnalysisService:
         
         return insights
 
+    @timed("sales.analyze_time_data")
     def _analyze_time_data(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze time-based trends"""
         insights = {}
@@ -372,6 +379,16 @@ class SalesAnalysisService:
                 for month, row in monthly_revenue.iterrows()
             ]
             
+            # Local revenue forecasts with prediction intervals, overall and per product / region
+            revenue_forecast = forecasting_service.forecast_frame(df_clean, date_col, revenue_col)
+            if revenue_forecast:
+                insights['revenue_forecast'] = revenue_forecast
+            for concept in ['product', 'region']:
+                if mappings.get(concept):
+                    group_forecasts = forecasting_service.forecast_frame(df_clean, date_col, revenue_col, group_col=mappings[concept], group_label=concept)
+                    if group_forecasts:
+                        insights[f'revenue_forecast_by_{concept}'] = group_forecasts
+            
             # Growth calculations
             if len(monthly_revenue) > 1:
                 revenue_values = monthly_revenue['sum'].values
@@ -403,6 +420,7 @@ class SalesAnalysisService:
         
         return insights
 
+    @timed("sales.analyze_regional_data")
     def _analyze_regional_data(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Analyze regional performance"""
         insights = {}
@@ -440,6 +458,7 @@ class SalesAnalysisService:
         
         return insights
 
+    @timed("sales.get_basic_stats")
     def _get_basic_stats(self, df: pd.DataFrame, mappings: Dict[str, Optional[str]]) -> Dict[str, Any]:
         """Get basic statistical information about the dataset"""
         stats = {
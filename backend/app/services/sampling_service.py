@@ -0,0 +1,213 @@
+import pandas as pd
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+from app.utils.dates import is_date_name, is_epoch_ms, parse_dates
+from app.utils.logger import logger
+
+
+class SamplingService:
+    """Vectorized, reproducible row sampling for LLM input"""
+
+    def __init__(self, seed: int = 42):
+        self.seed = seed
+        self.extreme_share = 0.2  # Share of the budget reserved for percentile extremes
+        self.extreme_quantile = 0.01  # Rows at or beyond the 1st / 99th percentile count as extremes
+        self.max_strata_columns = 2
+        self.max_category_cardinality = 50
+        self.max_numeric_columns = 5
+
+    def sample_records(self, rows: List[Dict[str, Any]], max_rows: int, column_mapper: Any = None) -> Dict[str, Any]:
+        """Sample a list of row dicts; returns {"sampled_data": [rows], "metadata": {...}}"""
+        df = pd.DataFrame(rows)
+        sampled, metadata = self.sample_frame(df, max_rows, self._map_columns(df, column_mapper))
+        # Back to JSON-friendly records with NaN -> None
+        records = sampled.astype(object).where(pd.notna(sampled), None).to_dict("records")
+        return {"sampled_data": records, "metadata": metadata}
+
+    def sample_parquet(self, path: str, max_rows: int, columns: Optional[List[str]] = None, column_mapper: Any = None) -> pd.DataFrame:
+        """Sample a Parquet file, reading only the requested columns (needs a pandas Parquet engine)"""
+        df = pd.read_parquet(path, columns=columns)
+        sampled, metadata = self.sample_frame(df, max_rows, self._map_columns(df, column_mapper))
+        logger.info("Sampled Parquet source", path=path, **{k: v for k, v in metadata.items() if k in ("total_rows", "sampled_rows")})
+        return sampled
+
+    def _map_columns(self, df: pd.DataFrame, column_mapper: Any) -> Optional[Dict[str, Optional[str]]]:
+        """Domain column mapping from an analysis service, if one was given"""
+        if column_mapper is None:
+            return None
+        try:
+            return column_mapper._map_columns(df)
+        except Exception as e:
+            logger.warning("Column mapping failed; inferring sampling columns", error=str(e))
+            return None
+
+    def sample_frame(self, df: pd.DataFrame, max_rows: int, column_mappings: Optional[Dict[str, Optional[str]]] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        """
+        Pick up to max_rows rows: the most extreme rows of key numeric columns first,
+        then a stratified sample over category/date strata so rare groups are kept.
+        Row order of the source is preserved.
+        """
+        total_rows = len(df)
+        if total_rows <= max_rows:
+            return df, {"strategy": "full_data", "total_rows": total_rows, "sampled_rows": total_rows}
+
+        rng = np.random.default_rng(self.seed)
+        strata_columns, date_column, numeric_columns = self._select_columns(df, column_mappings)
+
+        extreme_positions = self._extreme_positions(df, numeric_columns, int(max_rows * self.extreme_share))
+        remaining = max_rows - len(extreme_positions)
+
+        keys = self._strata_keys(df, strata_columns, date_column)
+        strata = self._combine_keys(keys, len(df))
+        stratified_positions = self._stratified_positions(keys, strata, remaining, rng, exclude=extreme_positions)
+
+        positions = np.union1d(extreme_positions, stratified_positions)
+        sampled = df.iloc[positions]
+
+        metadata = {
+            "strategy": "stratified_sampling",
+            "total_rows": total_rows,
+            "sampled_rows": len(sampled),
+            "sampling_sections": ["numeric_extremes", "strata"],
+            "strata_columns": strata_columns + ([date_column] if date_column else []),
+            "extreme_columns": numeric_columns,
+            "strata_count": int(strata.nunique()),
+            "extreme_rows": int(len(extreme_positions)),
+            "seed": self.seed
+        }
+        return sampled, metadata
+
+    def _select_columns(self, df: pd.DataFrame, column_mappings: Optional[Dict[str, Optional[str]]]):
+        """Choose stratification, date and numeric columns from the domain mapping, or infer them"""
+        candidates = list(dict.fromkeys(col for col in (column_mappings or {}).values() if col is not None and col in df.columns))
+        if not candidates:
+            candidates = list(df.columns)
+
+        date_column = None
+        for col in candidates:
+            series = df[col]
+            named_like_date = any(key in str(col).lower() for key in ("date", "time", "period", "month"))
+            # Dates from xlsx uploads are stored as epoch milliseconds, so a numeric column can be one too
+            is_stored_date = named_like_date and (not pd.api.types.is_numeric_dtype(series) or is_epoch_ms(series))
+            if pd.api.types.is_datetime64_any_dtype(series) or is_stored_date:
+                date_column = col
+                break
+
+        strata_columns = []
+        numeric_columns = []
+        for col in candidates:
+            if col == date_column:
+                continue
+            series = df[col]
+            if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                if is_date_name(col) and is_epoch_ms(series):
+                    continue  # Another stored date, not a measure to take extremes of
+                if len(numeric_columns) < self.max_numeric_columns:
+                    numeric_columns.append(col)
+            elif len(strata_columns) < self.max_strata_columns:
+                cardinality = series.nunique(dropna=True)
+                if 1 < cardinality <= self.max_category_cardinality:
+                    strata_columns.append(col)
+
+        return strata_columns, date_column, numeric_columns
+
+    def _extreme_positions(self, df: pd.DataFrame, numeric_columns: List[str], budget: int) -> np.ndarray:
+        """Positions of the rows furthest into the top and bottom percentiles, shared evenly across columns"""
+        if not numeric_columns or budget <= 0:
+            return np.array([], dtype=np.int64)
+
+        per_side = max(1, budget // (2 * len(numeric_columns)))
+        selected: List[np.ndarray] = []
+        for col in numeric_columns:
+            values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+            valid = ~np.isnan(values)
+            if valid.sum() < 3:
+                continue
+            low, high = np.nanquantile(values, [self.extreme_quantile, 1 - self.extreme_quantile])
+            order = np.argsort(values, kind="stable")  # NaNs sort last
+            n_valid = int(valid.sum())
+            bottom = order[:per_side]
+            top = order[n_valid - per_side:n_valid]
+            selected.append(bottom[values[bottom] <= low])
+            selected.append(top[values[top] >= high])
+
+        if not selected:
+            return np.array([], dtype=np.int64)
+        positions = np.unique(np.concatenate(selected))
+        return positions[:budget]
+
+    def _strata_keys(self, df: pd.DataFrame, strata_columns: List[str], date_column: Optional[str]) -> List[np.ndarray]:
+        """Integer codes per row for each category column and for the month of the date column (-1 when missing)"""
+        keys = [pd.factorize(df[col].astype(str))[0] for col in strata_columns]
+        if date_column is not None:
+            months = parse_dates(df[date_column]).dt.to_period("M")
+            keys.append(pd.factorize(months)[0])
+        return keys
+
+    def _combine_keys(self, keys: List[np.ndarray], total_rows: int) -> pd.Series:
+        """One stratum id per row: the combination of all keys"""
+        if not keys:
+            # Nothing to stratify on: a single stratum gives a plain seeded random sample
+            return pd.Series(np.zeros(total_rows, dtype=np.int64), index=range(total_rows))
+        codes, _ = pd.MultiIndex.from_arrays(keys).factorize() if len(keys) > 1 else pd.factorize(keys[0])
+        return pd.Series(codes, index=range(total_rows))
+
+    def _stratified_positions(
+        self,
+        keys: List[np.ndarray],
+        strata: pd.Series,
+        budget: int,
+        rng: np.random.Generator,
+        exclude: np.ndarray
+    ) -> np.ndarray:
+        """
+        Rows covering every distinct value of every stratification key first (rarest values
+        first if the budget cannot cover them all), then the rest of the budget allocated to
+        the combined strata in proportion to their size. The full category x category x month
+        product can have more strata than the budget has rows, so coverage is guaranteed per
+        key rather than per combination. Random order comes from one vectorized draw.
+        """
+        if budget <= 0:
+            return np.array([], dtype=np.int64)
+
+        total_rows = len(strata)
+        available = np.ones(total_rows, dtype=bool)
+        available[exclude] = False
+        if not available.any():
+            return np.array([], dtype=np.int64)
+        order = rng.permutation(total_rows)
+
+        # One random row for each key value not already present among the excluded (extreme) rows
+        reserved: List[int] = []
+        rarity: List[int] = []
+        for codes in keys:
+            present = set(codes[exclude].tolist()) | set(codes[reserved].tolist())
+            counts = np.bincount(codes[codes >= 0])
+            shuffled = order[available[order]]
+            values, first = np.unique(codes[shuffled], return_index=True)
+            for value, index in zip(values, first):
+                if value >= 0 and value not in present:
+                    reserved.append(int(shuffled[index]))
+                    rarity.append(int(counts[value]))
+        if len(reserved) > budget:
+            reserved = [reserved[i] for i in np.argsort(rarity, kind="stable")[:budget]]
+        chosen = np.array(sorted(set(reserved)), dtype=np.int64)
+        available[chosen] = False
+
+        # Proportional fill over the combined strata, then random rows for what rounding left over
+        fill_budget = budget - len(chosen)
+        if fill_budget > 0 and available.any():
+            candidates = strata[available]
+            quotas = np.floor(candidates.value_counts() * fill_budget / len(candidates)).astype(int)
+            draw = pd.Series(rng.random(len(candidates)), index=candidates.index)
+            rank = draw.groupby(candidates).rank(method="first")
+            filled = candidates.index[(rank <= candidates.map(quotas)).to_numpy()].to_numpy()
+            available[filled] = False
+            leftover = fill_budget - len(filled)
+            if leftover > 0 and available.any():
+                rest = order[available[order]][:leftover]
+                filled = np.concatenate([filled, rest])
+            chosen = np.concatenate([chosen, filled])
+        return np.sort(chosen)
+
+sampling_service = SamplingService()
@@ -1,5 +1,5 @@
 from supabase import Client
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 from app.utils.logger import logger
 from fastapi import HTTPException
 import datetime
@@ -145,7 +145,7 @@ class SupabaseService:
             logger.error("Failed to update file status", error=str(e), file_id=file_id, user_id=user_id)
             raise HTTPException(status_code=500, detail=f"Failed to update file status: {str(e)}")
 
-    async def save_analysis_result(self, file_id: str, user_id: str, json_data: Dict[str, Any], description: Dict[str, str], computed_insights: Dict[str, Any] | None, ai_insights: Dict[str, Any] | None):
+    async def save_analysis_result(self, file_id: str, user_id: str, json_data: Dict[str, Any], description: Dict[str, str], computed_insights: Dict[str, Any] | None, ai_insights: Dict[str, Any] | None, retrieval_index: Dict[str, Any] | None = None, chat_context: Dict[str, str] | None = None):
         try:
             data = {
                 "file_id": file_id,
@@ -153,7 +153,10 @@ class SupabaseService:
                 "json_data": json_data,
                 "description": description,
                 "computed_insights": computed_insights,
-                "ai_insights": ai_insights
+                "ai_insights": ai_insights,
+                "retrieval_index": retrieval_index,
+                "chat_context": chat_context,
+                "updated_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
             }
             response = self.client.from_("analysis_results").insert(data).execute()
             if response.data:
@@ -185,14 +188,39 @@ class SupabaseService:
             logger.error("Failed to retrieve analysis", error=str(e), file_id=file_id, user_id=user_id)
             raise HTTPException(status_code=500, detail=f"Failed to retrieve analysis: {str(e)}")
         
+    async def get_analysis_version(self, file_id: str, user_id: str) -> str:
+        """Cheap freshness probe for cached analyses: the row id and updated_at, without json_data"""
+        try:
+            response = self.client.from_("analysis_results").select("id, updated_at").eq("file_id", file_id).eq("user_id", user_id).single().execute()
+            if response.data:
+                return f"{response.data['id']}:{response.data.get('updated_at')}"
+            else:
+                raise HTTPException(status_code=404, detail="Analysis not found")
+        except Exception as e:
+            logger.error("Failed to retrieve analysis version", error=str(e), file_id=file_id, user_id=user_id)
+            raise HTTPException(status_code=500, detail=f"Failed to retrieve analysis: {str(e)}")
+
+    async def save_chat_context(self, file_id: str, user_id: str, chat_context: Dict[str, str]) -> None:
+        """Store a re-rendered chat context. updated_at is left alone: the analysis itself did not change"""
+        try:
+            self.client.from_("analysis_results").update({"chat_context": chat_context}).eq("file_id", file_id).eq("user_id", user_id).execute()
+            logger.info("Chat context saved", file_id=file_id, user_id=user_id, version=chat_context.get("version"))
+        except Exception as e:
+            # Chat keeps the rendered context with the cached analysis; the next cold load renders it again
+            logger.warning("Failed to save chat context", error=str(e), file_id=file_id, user_id=user_id)
+
     async def save_chat_history(self, file_id: str, analysis_id: str, user_id: str, question: str, answer: str):
+        return await self.save_chat_history_batch(file_id, analysis_id, user_id, [(question, answer)])
+
+    async def save_chat_history_batch(self, file_id: str, analysis_id: str, user_id: str, turns: List[Tuple[str, str]]):
+        """Save (question, answer) turns in one insert, after making room for them under the retention limits"""
         try:
             # Enforce message count limit (100 messages per file)
             count_response = self.client.from_("chat_history").select("id", count="exact").eq("file_id", file_id).eq("user_id", user_id).execute()
             message_count = count_response.count if count_response.count is not None else 0
-            if message_count >= 100:
+            if message_count + len(turns) > 100:
                 # Delete oldest messages to keep under limit
-                oldest_response = self.client.from_("chat_history").select("id").eq("file_id", file_id).eq("user_id", user_id).order("created_at").limit(message_count - 99).execute()
+                oldest_response = self.client.from_("chat_history").select("id").eq("file_id", file_id).eq("user_id", user_id).order("created_at").limit(message_count + len(turns) - 100).execute()
                 if oldest_response.data:
                     oldest_ids = [record["id"] for record in oldest_response.data]
                     self.client.from_("chat_history").delete().in_("id", oldest_ids).execute()
@@ -203,17 +231,23 @@ class SupabaseService:
             thirty_days_ago = datetime.datetime.now() - timedelta(days=30)
             self.client.from_("chat_history").delete().eq("file_id", file_id).eq("user_id", user_id).lt("created_at", thirty_days_ago).execute()
 
-            # Insert new chat history
-            data = {
-                "file_id": file_id,
-                "analysis_id": analysis_id,
-                "user_id": user_id,
-                "question": question,
-                "answer": answer
-            }
+            # Insert new chat history. Rows of one insert would share the created_at default, and history
+            # is read back in created_at order, so each turn gets its own timestamp a microsecond apart
+            created_at = datetime.datetime.now(datetime.timezone.utc)
+            data = [
+                {
+                    "file_id": file_id,
+                    "analysis_id": analysis_id,
+                    "user_id": user_id,
+                    "question": question,
+                    "answer": answer,
+                    "created_at": (created_at + timedelta(microseconds=i)).isoformat(timespec="microseconds")
+                }
+                for i, (question, answer) in enumerate(turns[-100:])
+            ]
             response = self.client.from_("chat_history").insert(data).execute()
             if response.data:
-                logger.info("Chat history saved", file_id=file_id, user_id=user_id)
+                logger.info("Chat history saved", file_id=file_id, user_id=user_id, messages=len(data))
                 return response.data
             else:
                 raise Exception("Failed to save chat history: No data returned")
@@ -0,0 +1,185 @@
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+from app.config.settings import settings
+from app.utils.logger import logger
+from app.utils.metrics import record_cache
+import json
+import math
+import os
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:  # tokenizers is optional; fall back to the byte heuristic below
+    Tokenizer = None
+
+
+class TokenBudgetService:
+    """Token counting and context packing for the Mixtral prompts"""
+
+    def __init__(self, tokenizer_path: Optional[str] = None, context_tokens: Optional[int] = None):
+        self.context_tokens = context_tokens or settings.llm_context_tokens
+        self.safety_margin = 256  # Chat template / special tokens not visible in the prompt text
+        self.fill_ratio = 0.97  # Pack against estimates up to this share of the budget, then verify exactly
+        self.sample_rows = 64
+        self.max_cached_models = 128
+        self.tokenizer = self._load_tokenizer(tokenizer_path or settings.mixtral_tokenizer_path)
+        self._cost_models: "OrderedDict[Tuple[str, ...], Dict[str, float]]" = OrderedDict()
+
+    def _load_tokenizer(self, tokenizer_path: Optional[str]):
+        if Tokenizer is None or not tokenizer_path:
+            logger.info("Mixtral tokenizer not configured; using heuristic token counts")
+            return None
+        if not os.path.exists(tokenizer_path):
+            logger.warning("Mixtral tokenizer file not found; using heuristic token counts", path=tokenizer_path)
+            return None
+        try:
+            tokenizer = Tokenizer.from_file(tokenizer_path)
+            logger.info("Loaded Mixtral tokenizer", path=tokenizer_path)
+            return tokenizer
+        except Exception as e:
+            logger.error("Failed to load Mixtral tokenizer", error=str(e), path=tokenizer_path)
+            return None
+
+    @property
+    def is_exact(self) -> bool:
+        return self.tokenizer is not None
+
+    def count_tokens(self, text: str) -> int:
+        """Count tokens with the Mixtral tokenizer, or estimate them if it is unavailable"""
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+        return self._heuristic_tokens(text)
+
+    def _heuristic_tokens(self, text: str) -> int:
+        """
+        Conservative estimate for the Mixtral SentencePiece vocabulary:
+        every digit is its own token, ASCII text averages ~3.5 chars per token,
+        and multi-byte characters cost roughly one token per extra byte.
+        """
+        digits = sum(text.count(d) for d in "0123456789")
+        extra_bytes = len(text.encode("utf-8")) - len(text)
+        return max(1, digits + math.ceil((len(text) - digits) / 3.5) + extra_bytes)
+
+    def input_budget(self, prompt_template: str, description: Any, max_output_tokens: int) -> int:
+        """Tokens left for the {data} slot once the template, description and completion are accounted for"""
+        fixed = self.count_tokens(prompt_template) + self.count_tokens(str(description))
+        return max(256, self.context_tokens - fixed - max_output_tokens - self.safety_margin)
+
+    # ---------- Per-column byte-cost model ----------
+    def column_cost_model(self, rows: List[Dict[str, Any]]) -> Dict[str, float]:
+        """
+        Tokens-per-byte model for a row schema, built from a small sample and cached
+        by column signature so repeated sheets/chunks with the same layout reuse it.
+        """
+        sample = [row for row in rows[:self.sample_rows] if isinstance(row, dict)]
+        columns = tuple(sample[0].keys()) if sample else ()
+        cached = self._cost_models.get(columns)
+        record_cache("token_cost_model", cached is not None)
+        if cached is not None:
+            self._cost_models.move_to_end(columns)
+            return cached
+
+        # Structural cost: keys, quotes, colons and separators that every row repeats
+        skeleton = json.dumps({col: None for col in columns}, ensure_ascii=False)
+        fixed_bytes = len(skeleton.encode("utf-8")) - 4 * len(columns)  # minus the "null" placeholders
+        fixed_tokens = self.count_tokens(skeleton) - len(columns)
+
+        # Value cost, weighted across columns by the bytes each one contributes
+        value_bytes = 0
+        value_tokens = 0
+        for col in columns:
+            values = [json.dumps(row.get(col), ensure_ascii=False) for row in sample]
+            joined = " ".join(values)
+            value_bytes += len(joined.encode("utf-8"))
+            value_tokens += self.count_tokens(joined)
+
+        model = {
+            "fixed_bytes": float(max(0, fixed_bytes)),
+            "fixed_tokens": float(max(1, fixed_tokens)),
+            "tokens_per_byte": (value_tokens / value_bytes) if value_bytes else 0.5,
+        }
+        self._cost_models[columns] = model
+        if len(self._cost_models) > self.max_cached_models:
+            self._cost_models.popitem(last=False)
+        return model
+
+    def _estimate_row_tokens(self, row_bytes: int, model: Dict[str, float]) -> int:
+        value_bytes = max(0, row_bytes - model["fixed_bytes"])
+        return math.ceil(model["fixed_tokens"] + value_bytes * model["tokens_per_byte"]) + 1  # +1 for the separator
+
+    # ---------- Chunk packing ----------
+    def pack_rows(self, json_data: Any, max_input_tokens: int) -> List[Dict[str, Any]]:
+        """
+        Split rows (a list, or a {sheet_name: [rows]} dict) into chunks whose serialized
+        JSON fits `max_input_tokens`. Each row is serialized exactly once; the returned
+        chunk text is what goes into the prompt.
+        """
+        if isinstance(json_data, list):
+            sheets = [(None, json_data)]
+        elif isinstance(json_data, dict) and all(isinstance(v, list) for v in json_data.values()):
+            sheets = list(json_data.items())
+        else:
+            text = json.dumps(json_data, ensure_ascii=False)
+            return [{"text": text, "rows": 0, "tokens": self.count_tokens(text)}]
+
+        chunks: List[Dict[str, Any]] = []
+        current: List[Tuple[Optional[str], str, int]] = []  # (sheet, row_text, estimated_tokens)
+        current_tokens = 2  # Enclosing brackets
+        target = int(max_input_tokens * self.fill_ratio)
+        skipped = 0
+
+        for sheet_name, rows in sheets:
+            if not rows:
+                continue
+            model = self.column_cost_model(rows)
+            # "sheet_name":[ ... ] wrapper around this sheet's rows within a chunk
+            sheet_overhead = self.count_tokens(json.dumps(sheet_name, ensure_ascii=False)) + 3 if sheet_name is not None else 0
+            current_tokens += sheet_overhead
+
+            for row in rows:
+                row_text = json.dumps(row, ensure_ascii=False)
+                row_tokens = self._estimate_row_tokens(len(row_text.encode("utf-8")), model)
+                if row_tokens + sheet_overhead + 2 > max_input_tokens:
+                    skipped += 1
+                    continue
+                if current and current_tokens + row_tokens > target:
+                    chunks.extend(self._close_chunk(current, max_input_tokens, sheet_name is not None))
+                    current = []
+                    current_tokens = 2 + sheet_overhead
+                current.append((sheet_name, row_text, row_tokens))
+                current_tokens += row_tokens
+
+        if current:
+            chunks.extend(self._close_chunk(current, max_input_tokens, sheets[0][0] is not None))
+
+        if skipped:
+            logger.warning("Skipped rows larger than the chunk budget", skipped_rows=skipped, max_input_tokens=max_input_tokens)
+        return chunks
+
+    def _render_chunk(self, items: List[Tuple[Optional[str], str, int]], keyed: bool) -> str:
+        if not keyed:
+            return "[" + ",".join(row_text for _, row_text, _ in items) + "]"
+        grouped: "OrderedDict[str, List[str]]" = OrderedDict()
+        for sheet_name, row_text, _ in items:
+            grouped.setdefault(sheet_name, []).append(row_text)
+        return "{" + ",".join(
+            json.dumps(sheet_name, ensure_ascii=False) + ":[" + ",".join(row_texts) + "]"
+            for sheet_name, row_texts in grouped.items()
+        ) + "}"
+
+    def _close_chunk(self, items: List[Tuple[Optional[str], str, int]], max_input_tokens: int, keyed: bool) -> List[Dict[str, Any]]:
+        """Render a chunk and verify it against the exact count, moving trailing rows out if it overflows"""
+        text = self._render_chunk(items, keyed)
+        tokens = self.count_tokens(text)
+        if tokens <= max_input_tokens or len(items) == 1:
+            return [{"text": text, "rows": len(items), "tokens": tokens}]
+
+        # Estimate was low for this chunk: shrink proportionally and re-pack the remainder
+        keep = max(1, int(len(items) * max_input_tokens / tokens) - 1)
+        logger.debug("Chunk overflowed after exact count; splitting", estimated_rows=len(items), kept_rows=keep, tokens=tokens)
+        return self._close_chunk(items[:keep], max_input_tokens, keyed) + self._close_chunk(items[keep:], max_input_tokens, keyed)
+
+
+token_budget_service = TokenBudgetService()
@@ -0,0 +1,47 @@
+import pandas as pd
+
+# Stored rows come from df.to_json(orient="records"), which writes datetime cells (every date
+# read from an xlsx upload) as epoch milliseconds; pd.to_datetime alone would take them for
+# nanoseconds and land in 1970. Whole numbers between these bounds, and not within a few days of
+# the epoch where small counts and amounts sit, are read as such dates.
+EPOCH_MS_MIN = int(pd.Timestamp("1900-01-01").value // 10**6)
+EPOCH_MS_MAX = int(pd.Timestamp("2200-01-01").value // 10**6)
+EPOCH_MS_NEAR = 10**9  # About 11.6 days
+DATE_NAME_WORDS = ("date", "time", "created", "updated", "posted", "period", "month", "day")
+
+
+def is_epoch_ms(series: pd.Series) -> bool:
+    """Whether a numeric column holds epoch-millisecond timestamps, as written by to_json"""
+    if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return False
+    values = series.dropna()
+    if values.empty:
+        return False
+    in_range = values.between(EPOCH_MS_MIN, EPOCH_MS_MAX) & (values.abs() >= EPOCH_MS_NEAR)
+    return bool(in_range.all()) and bool((values % 1 == 0).all())
+
+
+def parse_dates(series: pd.Series) -> pd.Series:
+    """Column as datetimes, epoch milliseconds included; values that do not parse become NaT"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if is_epoch_ms(series):
+        return pd.to_datetime(series, unit="ms", errors="coerce")
+    return pd.to_datetime(series, errors="coerce")
+
+
+def is_date_name(name: str) -> bool:
+    """Column names that announce a date ("order_date", "CreatedAt", "period")"""
+    lowered = str(name).lower()
+    return any(word in lowered for word in DATE_NAME_WORDS)
+
+
+def restore_epoch_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """Date-named columns stored as epoch milliseconds back as datetimes, for code that parses dates itself"""
+    columns = [col for col in df.columns if is_date_name(col) and is_epoch_ms(df[col])]
+    if not columns:
+        return df
+    df = df.copy()
+    for col in columns:
+        df[col] = pd.to_datetime(df[col], unit="ms", errors="coerce")
+    return df
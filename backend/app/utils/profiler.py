@@ -0,0 +1,113 @@
+from typing import Dict, Optional
+from collections import Counter
+from datetime import datetime, timezone
+from app.utils.logger import logger
+import os
+import re
+import sys
+import threading
+import time
+
+
+class SamplingProfiler:
+    """
+    Stack sampler for one thread, using only the standard library. A daemon thread reads the
+    target thread's current frame every interval and counts the stacks it sees; the result is
+    written in the folded format read by flamegraph.pl, speedscope and inferno.
+
+    Handlers run on the event loop thread, so a profile also contains any other work the loop
+    did at the same time. That is usually what we want for the pandas and ReportLab hot paths,
+    which block the loop while they run.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self.duration = 0.0
+
+    def start(self) -> "SamplingProfiler":
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self._started
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({self._short_path(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def _short_path(self, path: str) -> str:
+        # Keep frames readable in the flamegraph: <pkg>/... for libraries, app/... for our code
+        index = path.rfind("site-packages" + os.sep)
+        if index != -1:
+            return path[index + len("site-packages" + os.sep):]
+        index = path.rfind(os.sep + "app" + os.sep)
+        if index != -1:
+            return path[index + 1:]
+        return os.path.basename(path)
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def save(self, directory: str, request_id: str, label: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        # Both parts come from the client (X-Request-ID, URL path), so neither may carry separators
+        safe_id = _safe_name(request_id, "unknown")
+        safe_label = _safe_name(label, "request")
+        path = os.path.join(directory, f"{timestamp}_{safe_id}_{safe_label}.folded")
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write(self.folded())
+        return path
+
+    def summary(self, limit: int = 5) -> Dict[str, int]:
+        """Leaf frames with the most samples, for the log line"""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return dict(leaves.most_common(limit))
+
+
+def _safe_name(text: str, default: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", text).strip("_.")[:60] or default
+
+
+def profile_finish(profiler: SamplingProfiler, directory: str, request_id: str, label: str, min_duration: float) -> Optional[str]:
+    """Stop the sampler and save the profile if the request ran for at least min_duration seconds"""
+    profiler.stop()
+    if profiler.duration < min_duration or not profiler.samples:
+        return None
+    try:
+        path = profiler.save(directory, request_id, label)
+    except OSError as e:
+        logger.error("Failed to save request profile", error=str(e), request_id=request_id)
+        return None
+    logger.info(
+        "Request profile saved",
+        request_id=request_id,
+        path=path,
+        duration_ms=round(profiler.duration * 1000, 2),
+        samples=profiler.samples,
+        top_frames=profiler.summary()
+    )
+    return path
@@ -0,0 +1,128 @@
+from typing import Dict, Any, List, Optional, Callable
+from contextlib import contextmanager
+from contextvars import ContextVar
+from app.config.settings import settings
+from app.utils.logger import logger
+import functools
+import inspect
+import sys
+import time
+import uuid
+
+try:
+    from opentelemetry import trace
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+except ImportError:  # opentelemetry is optional; spans are still logged through structlog
+    trace = None
+
+# Innermost open span for the current task; asyncio copies context into child tasks
+_current_span: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_span", default=None)
+_listeners: List[Callable[[str, float, Dict[str, Any]], None]] = []
+
+
+def _configure_tracer():
+    """OpenTelemetry tracer writing to the console or a local file; None when disabled"""
+    exporter_name = (settings.otel_exporter or "").lower()
+    if not exporter_name:
+        return None
+    if trace is None:
+        logger.warning("OTEL_EXPORTER is set but opentelemetry-sdk is not installed; spans are only logged")
+        return None
+    if exporter_name == "console":
+        out = sys.stdout
+    elif exporter_name == "file":
+        out = open(settings.otel_file_path, "a", buffering=1)
+    else:
+        logger.warning("Unknown OTEL_EXPORTER; spans are only logged", exporter=exporter_name)
+        return None
+    provider = TracerProvider()
+    provider.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter(out=out)))
+    trace.set_tracer_provider(provider)
+    logger.info("OpenTelemetry span export enabled", exporter=exporter_name)
+    return trace.get_tracer("numeriq")
+
+
+_tracer = _configure_tracer()
+
+
+def add_span_listener(listener: Callable[[str, float, Dict[str, Any]], None]) -> None:
+    """Register a callback receiving (name, duration_seconds, attributes) for every finished span"""
+    _listeners.append(listener)
+
+
+def enclosing_span_name(skip_prefix: Optional[str] = None) -> Optional[str]:
+    """Name of the innermost open span, skipping spans whose name starts with skip_prefix"""
+    current = _current_span.get()
+    while current is not None and skip_prefix and current["name"].startswith(skip_prefix):
+        current = current["parent"]
+    return current["name"] if current is not None else None
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """
+    Time a block of work. Nested spans share the trace id of the outermost one, and the
+    yielded dict can take extra attributes (row counts, bytes) discovered inside the block.
+    """
+    parent = _current_span.get()
+    current = {
+        "name": name,
+        "span_id": uuid.uuid4().hex[:16],
+        "trace_id": parent["trace_id"] if parent else uuid.uuid4().hex,
+        "attributes": attributes,
+        "parent": parent
+    }
+    token = _current_span.set(current)
+    otel_span = _tracer.start_span(name) if _tracer is not None else None
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield current["attributes"]
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        _current_span.reset(token)
+        if otel_span is not None:
+            for key, value in current["attributes"].items():
+                if isinstance(value, (str, bool, int, float)):
+                    otel_span.set_attribute(key, value)
+            otel_span.set_attribute("status", status)
+            otel_span.end()
+        logger.info(
+            "Span finished",
+            span=name,
+            duration_ms=round(duration * 1000, 2),
+            status=status,
+            trace_id=current["trace_id"],
+            span_id=current["span_id"],
+            parent_span=parent["name"] if parent else None,
+            **current["attributes"]
+        )
+        for listener in _listeners:
+            try:
+                listener(name, duration, {**current["attributes"], "status": status})
+            except Exception as e:
+                logger.warning("Span listener failed", span=name, error=str(e))
+
+
+def timed(name: Optional[str] = None, **attributes: Any):
+    """Decorator form of span() for sync and async functions"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, **attributes):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
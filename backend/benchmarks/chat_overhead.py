@@ -0,0 +1,80 @@
+"""
+Per-message overhead of the chat services, without the LLM.
+
+Compares building and compiling the LangGraph workflow for every message (what process_chat
+used to do) with invoking the graph each service compiles once, and times a full
+process_chat call answered by a deterministic fast path.
+
+Run from backend/:
+    python -m benchmarks.chat_overhead
+    python -m benchmarks.chat_overhead --messages 2000 --rows 5000
+"""
+from typing import Dict, List, Optional
+import argparse
+import json
+import statistics
+import sys
+import time
+
+import benchmarks.run as bench  # Sets the settings environment before the services import
+from benchmarks.datasets import DOMAINS, generate_frame
+
+
+def per_message(func, messages: int) -> Dict[str, float]:
+    timings = []
+    for _ in range(messages):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return {
+        "median_us": round(statistics.median(timings) * 1e6, 1),
+        "p95_us": round(statistics.quantiles(timings, n=20)[-1] * 1e6, 1) if len(timings) >= 20 else None,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Chat per-message overhead")
+    parser.add_argument("--domains", default=",".join(DOMAINS))
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--rows", type=int, default=1000, help="Raw rows passed to the fast paths")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args(argv)
+
+    results = []
+    for domain in [d.strip() for d in args.domains.split(",") if d.strip()]:
+        service_class, questions = bench.CHAT_FAST_PATHS[domain]
+        service = service_class()
+        raw_data = json.loads(generate_frame(domain, args.rows).to_json(orient="records"))
+        analysis_data = {"insights": {}, "ai_insights": {}}
+        question = questions[0]
+
+        def invoke(graph):
+            state = {
+                "file_id": "bench", "user_id": "bench", "question": question,
+                "analysis_data": analysis_data, "raw_data": raw_data, "chat_history": [], "answer": ""
+            }
+            return bench._loop.run_until_complete(graph.ainvoke(state))
+
+        cases = {
+            "compile_per_message": lambda: invoke(service._build_graph()),
+            "compiled_once": lambda: invoke(service.graph),
+            "compile_only": service._build_graph,
+            "process_chat": lambda: bench._loop.run_until_complete(
+                service.process_chat("bench", "bench", question, analysis_data, raw_data, [])
+            ),
+        }
+        for name, func in cases.items():
+            func()  # Warm-up
+            timing = per_message(func, args.messages)
+            results.append({"domain": domain, "case": name, "rows": args.rows, **timing})
+            print(f"  {domain:<10} {name:<20} median={timing['median_us']:>10.1f}us p95={timing['p95_us']}us", flush=True)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as handle:
+            json.dump({"meta": {"commit": bench.git_commit(), "args": vars(args)}, "results": results}, handle, indent=2)
+        print(f"Wrote {len(results)} results to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
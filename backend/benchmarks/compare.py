@@ -0,0 +1,51 @@
+"""
+Compare two benchmark result files, e.g. the previous and current commit:
+    python -m benchmarks.compare benchmarks/results/abc1234.json benchmarks/results/def5678.json
+"""
+from typing import Dict, Any, Tuple
+import argparse
+import json
+import sys
+
+KEY_FIELDS = ("benchmark", "domain", "rows", "sheets", "width", "format", "sheet", "source", "question")
+
+
+def _key(entry: Dict[str, Any]) -> Tuple:
+    return tuple(entry.get(field) for field in KEY_FIELDS)
+
+
+def _load(path: str) -> Dict[Tuple, Dict[str, Any]]:
+    with open(path, encoding="utf-8") as handle:
+        return {_key(entry): entry for entry in json.load(handle)["results"]}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark runs by median time")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change reported as a regression or improvement")
+    args = parser.parse_args()
+
+    baseline, candidate = _load(args.baseline), _load(args.candidate)
+    regressions = 0
+    for key in sorted(set(baseline) & set(candidate), key=lambda k: tuple(str(v) for v in k)):
+        if not baseline[key]["seconds"] or not candidate[key]["seconds"]:
+            label = " ".join(str(v) for v in key if v is not None)
+            print(f"{label:<80} {'error' if not baseline[key]['seconds'] else 'ok'} -> {'error' if not candidate[key]['seconds'] else 'ok'}")
+            continue
+        before = baseline[key]["seconds"]["median"]
+        after = candidate[key]["seconds"]["median"]
+        change = (after - before) / before if before else 0.0
+        marker = "REGRESSION" if change > args.threshold else "improved" if change < -args.threshold else ""
+        regressions += marker == "REGRESSION"
+        label = " ".join(str(v) for v in key if v is not None)
+        print(f"{label:<80} {before:>10.4f}s -> {after:>10.4f}s {change:+7.1%} {marker}")
+
+    only_one = set(baseline) ^ set(candidate)
+    if only_one:
+        print(f"{len(only_one)} cases present in only one run were skipped")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
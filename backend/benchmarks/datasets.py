@@ -0,0 +1,206 @@
+"""
+Synthetic workbooks for the benchmarks. Column names follow the patterns the analysis
+services map, values carry a trend plus yearly seasonality, and a few injected outliers,
+so every analyzer branch does real work.
+"""
+from typing import Dict
+import io
+import numpy as np
+import pandas as pd
+
+DOMAINS = ["Sales", "Retail", "HR", "Finance", "Operations"]
+
+EXCEL_MAX_ROWS = 1_048_575  # Per sheet, excluding the header
+
+_REGIONS = ["North", "South", "East", "West", "Central"]
+_CITIES = ["Lagos", "Abuja", "Nairobi", "Accra", "Cairo", "Johannesburg", "Kigali", "Dakar"]
+
+
+def _names(prefix: str, count: int) -> np.ndarray:
+    return np.array([f"{prefix} {i + 1:03d}" for i in range(count)], dtype=object)
+
+
+def _dates(rng: np.random.Generator, rows: int, years: int = 3) -> pd.Series:
+    start = pd.Timestamp("2022-01-01")
+    offsets = np.sort(rng.integers(0, 365 * years, rows))
+    return pd.Series(start + pd.to_timedelta(offsets, unit="D"))
+
+
+def _seasonal(rng: np.random.Generator, dates: pd.Series, base: float, spread: float) -> np.ndarray:
+    """Lognormal noise around a base that grows ~10% a year and peaks in December"""
+    years = (dates - dates.min()).dt.days.to_numpy() / 365.0
+    month = dates.dt.month.to_numpy()
+    level = base * (1.1 ** years) * (1 + 0.25 * np.cos((month - 12) * np.pi / 6))
+    values = level * rng.lognormal(0, spread, len(dates))
+    # A handful of extreme values for the anomaly detectors
+    spikes = rng.choice(len(values), size=max(1, len(values) // 2000), replace=False)
+    values[spikes] *= 12
+    return np.round(values, 2)
+
+
+def _pick(rng: np.random.Generator, choices: np.ndarray, rows: int, skew: float = 1.2) -> np.ndarray:
+    """Zipf-like choice so a few categories dominate, as in real data"""
+    weights = 1.0 / np.arange(1, len(choices) + 1) ** skew
+    return rng.choice(choices, size=rows, p=weights / weights.sum())
+
+
+def sales_frame(rng: np.random.Generator, rows: int) -> pd.DataFrame:
+    dates = _dates(rng, rows)
+    quantity = rng.integers(1, 20, rows)
+    unit_price = _seasonal(rng, dates, 45.0, 0.5)
+    return pd.DataFrame({
+        "order_date": dates.dt.strftime("%Y-%m-%d"),
+        "sales_rep": _pick(rng, _names("Rep", 40), rows),
+        "product": _pick(rng, _names("Product", 200), rows),
+        "category": _pick(rng, np.array(["Electronics", "Furniture", "Office", "Apparel", "Grocery", "Toys"], dtype=object), rows),
+        "customer": _pick(rng, _names("Customer", 2000), rows, skew=0.8),
+        "region": _pick(rng, np.array(_REGIONS, dtype=object), rows, skew=0.5),
+        "quantity": quantity,
+        "unit_price": unit_price,
+        "total_price": np.round(quantity * unit_price, 2),
+    })
+
+
+def retail_frame(rng: np.random.Generator, rows: int) -> pd.DataFrame:
+    dates = _dates(rng, rows)
+    products = rng.integers(0, 500, rows)
+    price = np.round(5 + (products % 97) * 1.7 + rng.normal(0, 0.5, rows), 2)
+    cost = np.round(price * rng.uniform(0.45, 0.8, rows), 2)
+    quantity = np.maximum(1, _seasonal(rng, dates, 4.0, 0.6).astype(int))
+    return pd.DataFrame({
+        "date": dates.dt.strftime("%Y-%m-%d"),
+        "store": _pick(rng, _names("Store", 25), rows, skew=0.7),
+        "sku": np.char.add("SKU-", products.astype(str)).astype(object),
+        "product_name": np.array([f"Item {p:04d}" for p in products], dtype=object),
+        "category": _pick(rng, np.array(["Beverages", "Snacks", "Household", "Beauty", "Dairy", "Bakery"], dtype=object), rows),
+        "brand": _pick(rng, _names("Brand", 60), rows),
+        "price": price,
+        "cost": cost,
+        "quantity_sold": quantity,
+        "inventory_level": rng.integers(0, 400, rows),
+        "discount": np.round(rng.choice([0, 0, 0, 0.05, 0.1, 0.2], rows), 2),
+        "margin": np.round((price - cost) / price, 4),
+    })
+
+
+def hr_frame(rng: np.random.Generator, rows: int) -> pd.DataFrame:
+    hire = pd.Series(pd.Timestamp("2010-01-01") + pd.to_timedelta(rng.integers(0, 365 * 15, rows), unit="D"))
+    terminated = rng.random(rows) < 0.12
+    termination = (hire + pd.to_timedelta(rng.integers(90, 365 * 5, rows), unit="D")).where(terminated)
+    departments = np.array(["Engineering", "Sales", "Finance", "Operations", "HR", "Marketing", "Support"], dtype=object)
+    department = _pick(rng, departments, rows, skew=0.6)
+    base = np.array([95000, 60000, 70000, 55000, 50000, 65000, 45000], dtype=float)
+    salary = np.round(pd.Series(base, index=departments).loc[department].to_numpy() * rng.lognormal(0, 0.25, rows), -2)
+    return pd.DataFrame({
+        "employee_id": np.arange(1, rows + 1),
+        "name": np.array([f"Employee {i:06d}" for i in range(rows)], dtype=object),
+        "department": department,
+        "position": _pick(rng, np.array(["Associate", "Analyst", "Senior", "Lead", "Manager", "Director"], dtype=object), rows),
+        "salary": salary,
+        "hire_date": hire.dt.strftime("%Y-%m-%d"),
+        "termination_date": termination.dt.strftime("%Y-%m-%d"),
+        "employment_status": np.where(terminated, "Terminated", "Active").astype(object),
+        "manager": _pick(rng, _names("Manager", 80), rows),
+        "performance_rating": np.round(np.clip(rng.normal(3.4, 0.8, rows), 1, 5), 1),
+        "training_hours": rng.integers(0, 120, rows),
+        "location": _pick(rng, np.array(_CITIES, dtype=object), rows, skew=0.5),
+        "age": rng.integers(21, 65, rows),
+        "gender": rng.choice(np.array(["Female", "Male"], dtype=object), rows),
+        "overtime_hours": np.round(rng.gamma(1.5, 4, rows), 1),
+    })
+
+
+def finance_frame(rng: np.random.Generator, rows: int) -> pd.DataFrame:
+    dates = _dates(rng, rows)
+    is_income = rng.random(rows) < 0.35
+    amount = _seasonal(rng, dates, 1200.0, 0.9)
+    return pd.DataFrame({
+        "transaction_id": np.char.add("TXN-", np.arange(1, rows + 1).astype(str)).astype(object),
+        "date": dates.dt.strftime("%Y-%m-%d"),
+        "account": _pick(rng, np.array(["Operating", "Payroll", "Marketing", "Capital", "Receivables"], dtype=object), rows),
+        "category": np.where(is_income, _pick(rng, np.array(["Product Sales", "Services", "Licensing"], dtype=object), rows),
+                             _pick(rng, np.array(["Salaries", "Rent", "Utilities", "Travel", "Software", "Supplies"], dtype=object), rows)).astype(object),
+        "department": _pick(rng, np.array(["Engineering", "Sales", "Finance", "Operations", "Marketing"], dtype=object), rows),
+        "vendor": _pick(rng, _names("Vendor", 150), rows),
+        "payment_method": rng.choice(np.array(["Bank Transfer", "Card", "Cash", "Cheque"], dtype=object), rows),
+        "amount": amount,
+        "revenue": np.where(is_income, amount, 0.0),
+        "expense": np.where(is_income, 0.0, amount),
+    })
+
+
+def operations_frame(rng: np.random.Generator, rows: int) -> pd.DataFrame:
+    dates = _dates(rng, rows)
+    lead_time = np.maximum(1, rng.gamma(2.0, 2.5, rows).round()).astype(int)
+    delivered = dates + pd.to_timedelta(lead_time, unit="D")
+    return pd.DataFrame({
+        "order_id": np.char.add("ORD-", np.arange(1, rows + 1).astype(str)).astype(object),
+        "product_id": np.char.add("P-", rng.integers(0, 300, rows).astype(str)).astype(object),
+        "product_name": _pick(rng, _names("Part", 300), rows),
+        "quantity": np.maximum(1, _seasonal(rng, dates, 30.0, 0.7).astype(int)),
+        "order_date": dates.dt.strftime("%Y-%m-%d"),
+        "delivery_date": delivered.dt.strftime("%Y-%m-%d"),
+        "lead_time": lead_time,
+        "status": rng.choice(np.array(["Delivered", "Delivered", "Delivered", "In Transit", "Delayed", "Cancelled"], dtype=object), rows),
+        "priority": rng.choice(np.array(["Low", "Medium", "High"], dtype=object), rows),
+        "supplier": _pick(rng, _names("Supplier", 50), rows),
+        "warehouse": _pick(rng, np.array(["WH-Lagos", "WH-Abuja", "WH-Nairobi", "WH-Accra"], dtype=object), rows, skew=0.5),
+        "customer": _pick(rng, _names("Client", 800), rows, skew=0.8),
+        "region": _pick(rng, np.array(_REGIONS, dtype=object), rows, skew=0.5),
+        "defect_rate": np.round(rng.beta(1, 60, rows), 4),
+        "cost": _seasonal(rng, dates, 250.0, 0.5),
+    })
+
+
+_GENERATORS = {
+    "Sales": sales_frame,
+    "Retail": retail_frame,
+    "HR": hr_frame,
+    "Finance": finance_frame,
+    "Operations": operations_frame,
+}
+
+
+def widen(rng: np.random.Generator, df: pd.DataFrame, extra_columns: int = 40) -> pd.DataFrame:
+    """Append unmapped numeric and text columns, as exported ERP sheets tend to have"""
+    rows = len(df)
+    extra = {}
+    for i in range(extra_columns):
+        if i % 2 == 0:
+            extra[f"extra_metric_{i:02d}"] = np.round(rng.normal(100, 25, rows), 2)
+        else:
+            extra[f"extra_attr_{i:02d}"] = rng.choice(np.array([f"code_{k}" for k in range(30)], dtype=object), rows)
+    return pd.concat([df, pd.DataFrame(extra, index=df.index)], axis=1)
+
+
+def generate_frame(domain: str, rows: int, wide: bool = False, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = _GENERATORS[domain](rng, rows)
+    return widen(rng, df) if wide else df
+
+
+def generate_sheets(domain: str, rows: int, sheets: int = 1, wide: bool = False, seed: int = 0) -> Dict[str, pd.DataFrame]:
+    """rows split evenly across sheets named like a multi-period export"""
+    sizes = [rows // sheets + (1 if i < rows % sheets else 0) for i in range(sheets)]
+    return {
+        f"{domain}_{i + 1:02d}": generate_frame(domain, size, wide, seed + i)
+        for i, size in enumerate(sizes)
+        if size > 0
+    }
+
+
+def to_file_bytes(frames: Dict[str, pd.DataFrame], file_type: str) -> bytes:
+    buffer = io.BytesIO()
+    if file_type == "csv":
+        if len(frames) != 1:
+            raise ValueError("CSV holds a single sheet")
+        next(iter(frames.values())).to_csv(buffer, index=False)
+    elif file_type == "xlsx":
+        if any(len(df) > EXCEL_MAX_ROWS for df in frames.values()):
+            raise ValueError("Sheet exceeds the Excel row limit; use more sheets or CSV")
+        with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+            for name, df in frames.items():
+                df.to_excel(writer, sheet_name=name[:31], index=False)
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+    return buffer.getvalue()
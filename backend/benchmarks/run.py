@@ -0,0 +1,312 @@
+"""
+End-to-end benchmarks over synthetic workbooks for every domain.
+
+Times ParserService.parse_spreadsheet (with storage stubbed out), each compute_*_insights,
+each PDF exporter's generate_pdf, the chat fast paths and the chat row index (build and
+search), checks that chat dates rows stored as xlsx uploads store them (epoch milliseconds)
+in the right month, and writes the results to JSON so
+runs can be compared across commits with benchmarks.compare.
+
+Run from backend/:
+    python -m benchmarks.run
+    python -m benchmarks.run --scales 1000,100000,1000000 --sheets 1,20 --widths narrow,wide
+    python -m benchmarks.run --domains Sales,HR --only insights,chat --repeat 5
+
+Scales above --max-xlsx-rows are parsed from CSV, since writing and reading multi-million
+row Excel files would dominate the run; multi-sheet cases always use xlsx.
+"""
+from typing import Dict, Any, List, Callable, Optional
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+# Settings are required at import time; nothing here talks to Supabase or the LLM
+for _name, _value in {
+    "SUPABASE_URL": "http://localhost",
+    "SUPABASE_KEY": "benchmark",
+    "SUPABASE_JWT_SECRET": "benchmark",
+    "ALLOWED_FILE_TYPES": "csv,xls,xlsx",
+    "MAX_FILE_SIZE": "104857600",
+    "ALLOWED_ORIGINS": "http://localhost",
+    "TOGETHER_API_KEY": "benchmark",
+    "FLUTTERWAVE_SECRET_KEY": "benchmark",
+    "FLW_SECRET_HASH": "benchmark",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.datasets import DOMAINS, generate_sheets, to_file_bytes
+from app.services.parser_service import ParserService
+from app.services.sales_analysis_service import SalesAnalysisService
+from app.services.retail_analysis_service import RetailAnalysisService
+from app.services.hr_analysis_service import HRAnalysisService
+from app.services.finance_analysis_service import FinanceAnalysisService
+from app.services.operations_analysis_service import OperationsAnalysisService
+from app.services.pdf_export.sales_pdf_export_service import SalesPDFExporter
+from app.services.pdf_export.retail_pdf_export_service import RetailPDFExporter
+from app.services.pdf_export.hr_pdf_export_service import HRPDFExporter
+from app.services.pdf_export.finance_pdf_export_service import FinancePDFExporter
+from app.services.pdf_export.operations_pdf_export_service import OperationsPDFExporter
+from app.services.sales_chat_service import SalesChatService
+from app.services.retail_chat_service import RetailChatService
+from app.services.hr_chat_service import HRChatService
+from app.services.finance_chat_service import FinanceChatService
+from app.services.operations_chat_service import OperationsChatService
+from app.services.retrieval_index_service import retrieval_index_service
+from app.utils.dates import is_date_name
+
+ANALYZERS = {
+    "Sales": (SalesAnalysisService, "compute_sales_insights"),
+    "Retail": (RetailAnalysisService, "compute_retail_insights"),
+    "HR": (HRAnalysisService, "compute_hr_insights"),
+    "Finance": (FinanceAnalysisService, "compute_finance_insights"),
+    "Operations": (OperationsAnalysisService, "compute_operations_insights"),
+}
+
+PDF_EXPORTERS = {
+    "Sales": SalesPDFExporter,
+    "Retail": RetailPDFExporter,
+    "HR": HRPDFExporter,
+    "Finance": FinancePDFExporter,
+    "Operations": OperationsPDFExporter,
+}
+
+# Questions answered by each chat service's deterministic fast paths or query planner, without an LLM call
+CHAT_FAST_PATHS = {
+    "Sales": (SalesChatService, ["Who is the top sales rep?", "Top 5 products by revenue", "Average revenue per region"]),
+    "Retail": (RetailChatService, ["What is the top product?", "What is the total revenue?", "What is the average margin?", "Compare Beverages vs Snacks"]),
+    "HR": (HRChatService, ["Who is the highest paid employee?", "Which department has the most employees?", "Average salary per department"]),
+    "Finance": (FinanceChatService, ["What is the total revenue?", "What is the largest expense?", "What is the net profit?", "Total expense in June 2024"]),
+    "Operations": (OperationsChatService, ["How many orders are there?", "What is the fulfillment rate?", "What is the average lead time?", "Who is the top supplier?", "Top 3 suppliers by quantity"]),
+}
+
+BENCHMARKS = ["parse", "insights", "pdf", "chat", "index"]
+
+# One event loop for the whole run, as in the server; process-wide services bind asyncio primitives to it
+_loop = asyncio.new_event_loop()
+
+
+class _StubBucket:
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+
+    def list(self, folder: str) -> List[Dict[str, Any]]:
+        return [{"name": self.file_name}]
+
+    def create_signed_url(self, path: str, expires_in: int) -> Dict[str, str]:
+        return {"signedURL": f"https://storage.invalid/{path}"}
+
+
+class _StubStorage:
+    def __init__(self, file_name: str):
+        self.bucket = _StubBucket(file_name)
+
+    def from_(self, bucket: str) -> _StubBucket:
+        return self.bucket
+
+
+class _StubClient:
+    def __init__(self, file_name: str):
+        self.storage = _StubStorage(file_name)
+
+
+class StubStorageParserService(ParserService):
+    """ParserService reading the workbook from memory instead of Supabase storage"""
+
+    def __init__(self, file_name: str, content: bytes):
+        super().__init__(_StubClient(file_name))
+        self.content = content
+
+    async def _download(self, download_url: str) -> bytes:
+        return self.content
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        try:
+            result = func()
+        except Exception as e:
+            # Recorded rather than raised so one broken path does not hide the rest of the run
+            return {"seconds": None, "result": None, "error": f"{type(e).__name__}: {e}"[:300]}
+        timings.append(time.perf_counter() - started)
+    return {
+        "seconds": {
+            "min": round(min(timings), 6),
+            "median": round(statistics.median(timings), 6),
+            "mean": round(statistics.fmean(timings), 6),
+        },
+        "result": result,
+    }
+
+
+def check_epoch_dates(service_class: Any, df: pd.DataFrame) -> int:
+    """
+    Rows stored the way an xlsx upload stores them, with datetime cells as to_json epoch
+    milliseconds, must date to the same months in the chat frame as in the source. Returns the
+    number of dated rows; raises when a month differs.
+    """
+    chat_service = service_class()
+    dated = df.copy()
+    for col in dated.columns:
+        if is_date_name(col):
+            dated[col] = pd.to_datetime(dated[col], errors="coerce")
+    frame = chat_service.frame_for(json.loads(dated.to_json(orient="records")))
+    col = frame.column(*chat_service.date_concepts) if chat_service.date_concepts else None
+    if col is None:
+        return 0
+    expected, parsed = dated[col].dt.to_period("M"), frame.date_column(col).dt.to_period("M")
+    if not expected.equals(parsed):
+        raise AssertionError(f"{col} dates to the wrong months when read back from epoch milliseconds")
+    return int(parsed.notna().sum())
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def run_case(domain: str, rows: int, sheets: int, width: str, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    frames = generate_sheets(domain, rows, sheets=sheets, wide=(width == "wide"), seed=args.seed)
+    case = {"domain": domain, "rows": rows, "sheets": len(frames), "width": width, "columns": len(next(iter(frames.values())).columns)}
+    results = []
+
+    def record(benchmark: str, timing: Dict[str, Any], **extra: Any) -> None:
+        entry = {"benchmark": benchmark, **case, **extra, "seconds": timing["seconds"]}
+        label = f"  {benchmark:<9} {domain:<10} rows={rows:<8} sheets={len(frames):<3} {width:<6} {' '.join(f'{k}={v}' for k, v in extra.items()):<24}"
+        if "error" in timing:
+            entry["error"] = timing["error"]
+            print(f"{label} ERROR {timing['error']}", flush=True)
+        else:
+            if benchmark in ("parse", "insights") and timing["seconds"]["median"]:
+                entry["rows_per_second"] = round(rows / timing["seconds"]["median"])
+            print(f"{label} median={timing['seconds']['median']:.4f}s", flush=True)
+        results.append(entry)
+
+    if "parse" in args.only:
+        file_type = "xlsx" if sheets > 1 or rows <= args.max_xlsx_rows else "csv"
+        content = to_file_bytes(frames, file_type)
+        parser = StubStorageParserService(f"benchmark.{file_type}", content)
+        timing = measure(
+            lambda: _loop.run_until_complete(parser.parse_spreadsheet(f"bench/benchmark.{file_type}", file_type, domain, compute_insights=True)),
+            args.repeat
+        )
+        record("parse", timing, format=file_type, bytes=len(content))
+
+    insights_by_sheet = {}
+    if {"insights", "pdf", "chat"} & set(args.only):
+        service_class, method = ANALYZERS[domain]
+        service = service_class()
+        # Sheets come from one generator, so the first three characterise a many-sheet workbook
+        for name, df in list(frames.items())[:3]:
+            timing = measure(lambda: getattr(service, method)(df.copy()), args.repeat if "insights" in args.only else 1)
+            insights_by_sheet[name] = timing["result"]
+            if "insights" in args.only:
+                record("insights", timing, sheet=name)
+
+    first_insights = next(iter(insights_by_sheet.values()), {}) or {}
+
+    if "pdf" in args.only:
+        exporter = PDF_EXPORTERS[domain]()
+        timing = measure(lambda: exporter.generate_pdf(insights=first_insights), args.repeat)
+        record("pdf", timing, bytes=len(timing["result"] or b""))
+
+    raw_data = json.loads(next(iter(frames.values())).to_json(orient="records")) if {"chat", "index"} & set(args.only) else []
+
+    if "chat" in args.only:
+        service_class, questions = CHAT_FAST_PATHS[domain]
+        chat_service = service_class()
+        # /chat reuses the frame cached with the analysis, so it is built outside the timing
+        frame = chat_service.frame_for(raw_data)
+        for source, analysis_data in (("insights", {"insights": first_insights, "ai_insights": {}}), ("raw", {"insights": {}, "ai_insights": {}})):
+            for question in questions:
+                timing = measure(
+                    lambda: _loop.run_until_complete(chat_service.process_chat("bench", "bench", question, analysis_data, raw_data, [], frame=frame)),
+                    args.repeat
+                )
+                record("chat", timing, source=source, question=question)
+        timing = measure(lambda: check_epoch_dates(service_class, next(iter(frames.values()))), 1)
+        record("chat", timing, source="epoch_dates", dated_rows=timing["result"])
+
+    if "index" in args.only:
+        timing = measure(lambda: retrieval_index_service.build({"bench": raw_data}), args.repeat)
+        record("index", timing, op="build", bytes=len(json.dumps(timing["result"])) if timing["result"] else 0)
+        if timing["result"]:
+            row_index = retrieval_index_service.load(timing["result"]["bench"], raw_data)
+            # A row-level question naming the text values of a row from the middle of the sheet
+            question = " ".join(str(v) for v in raw_data[len(raw_data) // 2].values() if isinstance(v, str))
+            timing = measure(lambda: row_index.search(question, 20), args.repeat)
+            record("index", timing, op="search", matched=len(timing["result"] or []))
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Numeriq end-to-end benchmarks")
+    parser.add_argument("--domains", default=",".join(DOMAINS))
+    parser.add_argument("--scales", default="1000,10000,100000", help="Comma-separated row counts (1000 up to 5000000)")
+    parser.add_argument("--sheets", default="1,5", help="Comma-separated sheet counts (1 up to 20)")
+    parser.add_argument("--widths", default="narrow,wide")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help=f"Subset of {','.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-xlsx-rows", type=int, default=100_000)
+    parser.add_argument("--out", default=None, help="Defaults to benchmarks/results/<commit>.json")
+    args = parser.parse_args(argv)
+
+    args.only = [b.strip() for b in args.only.split(",") if b.strip()]
+    unknown = set(args.only) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+    domains = [d.strip() for d in args.domains.split(",") if d.strip()]
+    scales = [int(s) for s in args.scales.split(",")]
+    sheet_counts = [int(s) for s in args.sheets.split(",")]
+    widths = [w.strip() for w in args.widths.split(",")]
+
+    commit = git_commit()
+    out = args.out or os.path.join(os.path.dirname(__file__), "results", f"{commit or 'local'}.json")
+
+    results = []
+    started = time.perf_counter()
+    for domain in domains:
+        for rows in scales:
+            for sheets in sheet_counts:
+                if sheets > rows:
+                    continue
+                for width in widths:
+                    results.extend(run_case(domain, rows, sheets, width, args))
+
+    report = {
+        "meta": {
+            "commit": commit,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "args": {k: v for k, v in vars(args).items()},
+            "total_seconds": round(time.perf_counter() - started, 2),
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Wrote {len(results)} results to {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
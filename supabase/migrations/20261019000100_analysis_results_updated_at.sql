@@ -0,0 +1,5 @@
+-- Version of an analysis for the chat caches: the backend reads (id, updated_at) to tell whether
+-- a cached analysis is still current, and sets updated_at whenever the analysis or its AI
+-- insights are saved.
+alter table public.analysis_results
+    add column if not exists updated_at timestamptz not null default now();
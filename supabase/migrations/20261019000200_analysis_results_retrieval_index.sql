@@ -0,0 +1,4 @@
+-- BM25 row index per sheet, built by /full-analyze so chat can quote the rows a question is
+-- about. Null for analyses saved before it existed; chat builds the index from the rows then.
+alter table public.analysis_results
+    add column if not exists retrieval_index jsonb;
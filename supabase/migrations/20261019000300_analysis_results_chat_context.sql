@@ -0,0 +1,4 @@
+-- Chat context rendered from the insights when they are saved, so chat does not re-render it
+-- per question. Null for analyses saved before it existed; chat renders and stores it on first use.
+alter table public.analysis_results
+    add column if not exists chat_context jsonb;